@@ -1,17 +1,28 @@
 import pandas as pd
 import matplotlib.pyplot as plt
-import numpy as np
+from ihpquery import filter_frame, query
+from schema import dtypes_for
+from zonemap import load_zone_map, read_range
 from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
 
-# Load the CSV file
-def load_data(file_path):
-    df = pd.read_csv(file_path, parse_dates=['declarationDate'], low_memory=False)  # Parse declarationDate as datetime, avoid dtype warning
-    return df
+# Load the CSV file, or the matching rows from an ihpquery.py database
+def load_data(file_path, **filters):
+    if file_path.endswith('.sqlite'):
+        # Filters (e.g. incident_type='Typhoon', year=2021) and the column list are pushed down to the database
+        return query(file_path, columns=['declarationDate', 'ihpAmount'], order_by='declarationDate', **filters)
+    if load_zone_map(file_path) is not None:
+        # Clustered output from the enrichment stage: only blocks inside the date window are read, already sorted
+        dates = {key: filters.pop(key) for key in ('start_date', 'end_date', 'year') if key in filters}
+        # The zone map only covers dates, so any other filter is applied after reading
+        df = read_range(file_path, usecols=None if filters else ['ihpAmount'], dtype={'ihpAmount': 'float32'}, **dates)
+        return filter_frame(df, **filters)
+    df = pd.read_csv(file_path, parse_dates=['declarationDate'], dtype=dtypes_for(file_path, cleaned=True), low_memory=False)  # Parse declarationDate as datetime, avoid dtype warning
+    # A plain CSV is read whole, so the filters are applied to the rows afterwards
+    return filter_frame(df, **filters)
 
 # Perform linear regression
-def linear_regression_graph(file_path):
-    df = load_data(file_path)
+def linear_regression_graph(file_path, **filters):
+    df = load_data(file_path, **filters)
     
     # Ensure necessary columns exist
     if 'ihpAmount' not in df.columns or 'declarationDate' not in df.columns:
@@ -19,7 +30,8 @@ def linear_regression_graph(file_path):
     
     # Prepare the data
     df = df.dropna(subset=['ihpAmount', 'declarationDate'])  # Drop NaN values
-    df = df.sort_values(by='declarationDate')  # Sort by declarationDate to ensure correct order
+    if not df['declarationDate'].is_monotonic_increasing:  # Clustered output / database order is already sorted
+        df = df.sort_values(by='declarationDate')  # Sort by declarationDate to ensure correct order
     
     # Normalize dates by converting to float years
     min_date = df['declarationDate'].min()
@@ -46,4 +58,5 @@ def linear_regression_graph(file_path):
     plt.show()
 
 # 
-linear_regression_graph('Typhoon.csv')
\ No newline at end of file
+if __name__ == "__main__":
+    linear_regression_graph('Typhoon.csv')
@@ -1,22 +1,57 @@
 # This file was to merge disaster declarations summaries(col: declarationType, declarationTitle) into ihpvr with disaster number as a key.
+# The IHP-VR file is streamed in chunks and each chunk is joined against the small declarations table,
+# so peak memory is bounded by the chunk size instead of the full join.
 import pandas as pd
+from instrumentation import RunLog
+from schema import DECLARATIONS_DTYPES, IHP_VR_DTYPES, dtypes_for
 
-ihp_vr_path = "E:\\CIS590\\15.FEMA\\IndividualAssistance\\IndividualsAndHouseholdsProgramValidRegistrations.csv" #E:\CIS590\15.FEMA\IndividualAssistance
-declarations_path = "E:\\CIS590\\15.FEMA\\DisasterDeclarations\\DisasterDeclarationsSummaries.csv"
-output_path = "E:\\CIS590\\15.FEMA\\Merged_IHP_VR.csv"
+# Relative to the working directory, like the other scripts (the files used to live under E:\CIS590\15.FEMA)
+ihp_vr_path = "IndividualsAndHouseholdsProgramValidRegistrations.csv"
+declarations_path = "DisasterDeclarationsSummaries.csv"
+output_path = "Merged_IHP_VR.csv"
 
-dtype_dict = {
-    "disasterNumber": "int32",
-    "declarationType": "category",
-    "declarationTitle": "category"
-}
+# Optional column projection for IHP-VR (None keeps every registration column)
+ihp_vr_columns = None
+declarations_columns = ["disasterNumber", "declarationType", "declarationTitle"]
 
-IHP_VR = pd.read_csv(ihp_vr_path, usecols=["disasterNumber"], dtype={"disasterNumber": "int32"}, low_memory=True)
-Declarations = pd.read_csv(declarations_path, usecols=["disasterNumber", "declarationType", "declarationTitle"], dtype=dtype_dict)
+chunk_size = 100000
 
-merged_data = pd.merge(IHP_VR, Declarations, on="disasterNumber", how="left")
 
-chunk_size = 100000
-merged_data.to_csv(output_path, index=False, chunksize=chunk_size)
+def load_declarations(declarations_path, columns=declarations_columns):
+    """Load the declarations table indexed by disasterNumber, one row per disaster."""
+    declarations = pd.read_csv(declarations_path, usecols=columns, dtype=dtypes_for(declarations_path, DECLARATIONS_DTYPES, usecols=columns))
+    # The summaries have one row per designated area; type and title are the same for every area,
+    # so keeping one row per disaster stops the join from multiplying registrations.
+    declarations = declarations.drop_duplicates(subset="disasterNumber").set_index("disasterNumber")
+    return declarations
+
+
+def stream_merge(ihp_vr_path, declarations_path, output_path, chunk_size=chunk_size, usecols=ihp_vr_columns, run_log=None):
+    """Broadcast-join IHP-VR against the declarations chunk by chunk and append each merged chunk."""
+    run_log = run_log or RunLog("MergeDataset")
+    stage = run_log.stage("merge", input_path=ihp_vr_path, output_path=output_path)
+    declarations = load_declarations(declarations_path)
+    if usecols is not None and "disasterNumber" not in usecols:
+        usecols = ["disasterNumber"] + list(usecols)
+
+    total_rows = 0
+    reader = pd.read_csv(ihp_vr_path, usecols=usecols, chunksize=chunk_size, dtype=dtypes_for(ihp_vr_path, IHP_VR_DTYPES, usecols=usecols))
+    with reader:
+        for i, chunk in enumerate(stage.timed_chunks(reader)):
+            # Index lookup against the small table: no sort, no shuffle of the big side
+            merged_chunk = chunk.join(declarations, on="disasterNumber", how="left")
+            stage.lap("transform")
+            merged_chunk.to_csv(output_path, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+            stage.lap("write")
+            stage.end_chunk(merged_chunk)
+            total_rows += len(merged_chunk)
+            print(f"Merged chunk #{i + 1}: {total_rows:,} rows written")
+
+    stage.finish()
+    run_log.save()
+    return total_rows
+
 
-print("The new dataset saved to:", output_path)
+if __name__ == "__main__":
+    stream_merge(ihp_vr_path, declarations_path, output_path)
+    print("The new dataset saved to:", output_path)
@@ -1,5 +1,10 @@
 import pandas as pd
 from scipy.io import arff
+from geo import load_geo_index
+from rankcorr import frame_correlation
+
+# 'pearson', 'spearman' or 'kendall' (Kendall uses the O(n log n) merge-sort algorithm)
+correlation_method = 'pearson'
 
 # Load the ARFF file
 data, meta = arff.loadarff("Otherpersongeographiclocation.arff")
@@ -12,16 +17,25 @@ df = df.applymap(lambda x: x.decode('utf-8') if isinstance(x, bytes) else x)
 #df['declarationDate'] = pd.to_numeric(df['declarationDate'], errors='coerce')
 #df['county'] = pd.to_numeric(df['county'], errors='coerce')
 df['Declaration Date for Disaster'] = df['declarationDate'].astype('category').cat.codes
-df['County'] = df['county'].astype('category').cat.codes
-# Encode categorical columns
-df['Damaged State Abbreviation'] = df['damagedStateAbbreviation'].astype('category').cat.codes
-df['Damaged City Zip Code'] = df['damagedZipCode'].astype('category').cat.codes
+# Geographic columns get the stable keys of the zip -> county -> state index ('python geo.py' builds it),
+# so the same county has the same code in every file; without the index they fall back to per-file codes
+geo_index = load_geo_index()
+if geo_index is not None:
+    geo_keys = geo_index.encode(df)
+    df['County'] = geo_keys['countyKey']
+    df['Damaged State Abbreviation'] = geo_keys['stateKey']
+    df['Damaged City Zip Code'] = geo_keys['zipKey']
+else:
+    df['County'] = df['county'].astype('category').cat.codes
+    # Encode categorical columns
+    df['Damaged State Abbreviation'] = df['damagedStateAbbreviation'].astype('category').cat.codes
+    df['Damaged City Zip Code'] = df['damagedZipCode'].astype('category').cat.codes
 df.drop(columns='declarationDate', inplace=True)
 df.drop(columns='county', inplace=True)
 df.drop(columns='damagedStateAbbreviation', inplace=True)
 df.drop(columns='damagedZipCode', inplace=True)
 # Compute correlation matrix
-correlation_matrix = df.corr(method='pearson')
+correlation_matrix = frame_correlation(df, method=correlation_method)
 print(correlation_matrix)
 
 import seaborn as sns
@@ -34,6 +48,7 @@ plt.figure(figsize=(8, 6))
 sns.heatmap(correlation_matrix, annot=True, cmap="coolwarm", fmt=".2f", square=True, cbar_kws={"shrink": 0.75})
 
 # Add title and adjust layout
-plt.title("Geographical Correlation")
+plt.title("Geographical Correlation" if correlation_method == 'pearson'
+          else f"Geographical Correlation ({correlation_method.capitalize()})")
 plt.tight_layout()
 plt.show()
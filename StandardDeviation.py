@@ -1,14 +1,27 @@
 import pandas as pd
 import matplotlib.pyplot as plt
-
-# Load the CSV file
-def load_data(file_path):
-    df = pd.read_csv(file_path, parse_dates=['declarationDate'], low_memory=False)
-    return df
+from ihpquery import filter_frame, query
+from schema import dtypes_for
+from zonemap import load_zone_map, read_range
+
+# Load the CSV file, or the matching rows from an ihpquery.py database
+def load_data(file_path, **filters):
+    if file_path.endswith('.sqlite'):
+        # Filters (e.g. incident_type='Typhoon', year=2021) and the column list are pushed down to the database
+        return query(file_path, columns=['declarationDate', 'ihpAmount'], order_by='declarationDate', **filters)
+    if load_zone_map(file_path) is not None:
+        # Clustered output from the enrichment stage: only blocks inside the date window are read, already sorted
+        dates = {key: filters.pop(key) for key in ('start_date', 'end_date', 'year') if key in filters}
+        # The zone map only covers dates, so any other filter is applied after reading
+        df = read_range(file_path, usecols=None if filters else ['ihpAmount'], dtype={'ihpAmount': 'float32'}, **dates)
+        return filter_frame(df, **filters)
+    df = pd.read_csv(file_path, parse_dates=['declarationDate'], dtype=dtypes_for(file_path, cleaned=True), low_memory=False)
+    # A plain CSV is read whole, so the filters are applied to the rows afterwards
+    return filter_frame(df, **filters)
 
 # Compute and plot standard deviation
-def standard_deviation_graph(file_path, window=30):
-    df = load_data(file_path)
+def standard_deviation_graph(file_path, window=30, **filters):
+    df = load_data(file_path, **filters)
 
     # Ensure necessary columns exist
     if 'ihpAmount' not in df.columns or 'declarationDate' not in df.columns:
@@ -17,8 +30,9 @@ def standard_deviation_graph(file_path, window=30):
     # Drop NaN values
     df = df.dropna(subset=['ihpAmount', 'declarationDate'])
 
-    # Sort by declarationDate
-    df = df.sort_values(by='declarationDate')
+    # Sort by declarationDate, unless the file is already in date order (clustered output, database order)
+    if not df['declarationDate'].is_monotonic_increasing:
+        df = df.sort_values(by='declarationDate')
 
     # Compute rolling standard deviation
     df['rolling_std'] = df['ihpAmount'].rolling(window=window, min_periods=1).std()
@@ -34,4 +48,5 @@ def standard_deviation_graph(file_path, window=30):
     plt.show()
 
 # 
-standard_deviation_graph('data_03102025.csv', window=30)
+if __name__ == "__main__":
+    standard_deviation_graph('data_03102025.csv', window=30)
@@ -0,0 +1,124 @@
+# County-level join of IHP-VR registrations against DisasterDeclarationsSummaries.
+# The summaries have one row per designated area, so the disasterNumber-only lookups keep just one
+# area per disaster and lose the per-area fields. DesignatedAreaIndex is built once from the
+# summaries: state and designatedArea become codes into sorted arrays, the (disasterNumber, state,
+# area) triple becomes one int64 key, and the keys are sorted. Joining a chunk is a binary search of
+# the chunk's distinct states and counties followed by one np.searchsorted over the composite keys,
+# and the area fields are gathered with a single take() per column.
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from chunkio import read_chunks
+from geo import COUNTY_COLUMN, state_column
+from schema import DECLARATIONS_DTYPES, dtypes_for
+
+KEY_COLUMNS = ["disasterNumber", "state", "designatedArea"]
+# Designated-area fields attached to each registration
+AREA_COLUMNS = [
+    "incidentBeginDate", "incidentEndDate", "ihProgramDeclared", "iaProgramDeclared", "paProgramDeclared",
+    "hmProgramDeclared", "fipsStateCode", "fipsCountyCode", "placeCode",
+]
+
+
+def _codes(sorted_values, series):
+    """Position of each value of series in sorted_values, -1 where absent; only distinct values are searched."""
+    values = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype("category")
+    categories = values.cat.categories.astype(str).to_numpy(dtype=str)
+    category_codes = np.full(len(categories), -1, dtype=np.int64)
+    if len(sorted_values) and len(categories):
+        positions = np.searchsorted(sorted_values, categories).clip(max=len(sorted_values) - 1)
+        found = sorted_values[positions] == categories
+        category_codes[found] = positions[found]
+    row_codes = values.cat.codes.to_numpy()
+    codes = np.full(len(row_codes), -1, dtype=np.int64)
+    present = row_codes >= 0
+    codes[present] = category_codes[row_codes[present]]
+    return codes
+
+
+class DesignatedAreaIndex:
+    """Sorted (disasterNumber, state, designatedArea) keys with the area fields in key order."""
+
+    def __init__(self, declarations, columns=AREA_COLUMNS):
+        declarations = declarations.dropna(subset=KEY_COLUMNS).reset_index(drop=True)
+        self.columns = [col for col in columns if col in declarations.columns]
+        self.states = np.unique(declarations["state"].astype(str).to_numpy(dtype=str))
+        self.areas = np.unique(declarations["designatedArea"].astype(str).to_numpy(dtype=str))
+        keys = self._composite(declarations["disasterNumber"].to_numpy(),
+                               _codes(self.states, declarations["state"]),
+                               _codes(self.areas, declarations["designatedArea"]))
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        # An area listed twice for the same disaster keeps its first row
+        first = np.r_[True, keys[1:] != keys[:-1]]
+        self.keys = keys[first]
+        rows = order[first]
+        # Integer fields become nullable so unmatched registrations do not turn them into floats
+        self.fields = {col: self._nullable(declarations[col]).array.take(rows) for col in self.columns}
+
+    @staticmethod
+    def _nullable(series):
+        if pd.api.types.is_integer_dtype(series) and not pd.api.types.is_extension_array_dtype(series):
+            return series.astype(series.dtype.name.capitalize())
+        return series
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _composite(self, disaster_numbers, state_codes, area_codes):
+        keys = (disaster_numbers.astype(np.int64) * len(self.states) + state_codes) * len(self.areas) + area_codes
+        return np.where((state_codes >= 0) & (area_codes >= 0), keys, -1)
+
+    def lookup(self, chunk):
+        """Position of each registration's designated area in the index, -1 where it has none."""
+        state_col = state_column(chunk.columns)
+        if state_col is None or len(self.keys) == 0:
+            return np.full(len(chunk), -1, dtype=np.int64)
+        keys = self._composite(chunk["disasterNumber"].to_numpy(), _codes(self.states, chunk[state_col]),
+                               _codes(self.areas, chunk[COUNTY_COLUMN]))
+        positions = np.searchsorted(self.keys, keys).clip(max=len(self.keys) - 1)
+        return np.where((keys >= 0) & (self.keys[positions] == keys), positions, -1)
+
+    def join(self, chunk):
+        """chunk with the area fields attached; registrations without a designated area get missing values."""
+        positions = self.lookup(chunk)
+        for col in self.columns:
+            chunk[col] = pd.Series(self.fields[col].take(positions, allow_fill=True), index=chunk.index)
+        return chunk
+
+
+def load_area_index(declarations_path, columns=AREA_COLUMNS):
+    """Build the DesignatedAreaIndex from the declarations summaries, parsing only the needed columns."""
+    header = list(pd.read_csv(declarations_path, nrows=0).columns)
+    usecols = [col for col in KEY_COLUMNS + list(columns) if col in header]
+    declarations = pd.read_csv(declarations_path, usecols=usecols,
+                               dtype=dtypes_for(declarations_path, DECLARATIONS_DTYPES, usecols=usecols))
+    return DesignatedAreaIndex(declarations, columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Match registrations to their designated areas and report coverage.")
+    parser.add_argument("ihp_vr_path")
+    parser.add_argument("declarations_path")
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    args = parser.parse_args()
+
+    start_time = time.time()
+    area_index = load_area_index(args.declarations_path)
+    print(f"Indexed {len(area_index):,} designated areas in {time.time() - start_time:.2f}s")
+    usecols = ["disasterNumber", COUNTY_COLUMN, state_column(pd.read_csv(args.ihp_vr_path, nrows=0).columns)]
+    rows = matched = 0
+    start_time = time.time()
+    for chunk in read_chunks(args.ihp_vr_path, args.chunk_size, usecols=usecols,
+                             dtype=dtypes_for(args.ihp_vr_path, usecols=usecols)):
+        rows += len(chunk)
+        matched += int((area_index.lookup(chunk) >= 0).sum())
+    print(f"{matched:,} of {rows:,} registrations matched a designated area ({matched / max(rows, 1):.1%}) "
+          f"in {time.time() - start_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# Class-balanced training sets in one streaming pass, the Python counterpart of Weka's SpreadSubsample.
+# Every row gets a uniform random key and, per target class, only the max_per_class rows with the
+# smallest keys are kept (a bottom-k reservoir), which is a uniform sample of that class of any size
+# up to max_per_class. At the end of the file each class is cut to at most `spread` times the
+# smallest class, as distributionSpread does, and the kept rows are written in their original order.
+# Memory is bounded by classes x max_per_class rows per target, i.e. the largest output the
+# settings allow, whatever the input size.
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from chunkio import ChunkWriter, read_chunks
+from factorstats import as_numeric
+from instrumentation import RunLog
+from schema import FLAG_COLUMNS, dtypes_for
+
+DEFAULT_TARGETS = ["ihpEligible", "ihpAmount"]
+BALANCED_DIR = "balanced"
+DEFAULT_MAX_PER_CLASS = 100000
+# Reservoirs are cut back to max_per_class once this many times that size has been buffered
+COMPACT_FACTOR = 2
+
+
+def balanced_path(csv_path, target, output_dir=BALANCED_DIR):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(output_dir, f"{name}_{target}.csv")
+
+
+def class_labels(values, target):
+    """Class of each row for target: flags as True/False, amounts as received (> 0) or not; NaN if unknown."""
+    if target in FLAG_COLUMNS:
+        flags = as_numeric(values)
+        return flags.map({1.0: "True", 0.0: "False"})
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        amounts = values.astype("float64")
+        return pd.Series(np.where(amounts > 0, "received", "not received"), index=values.index).where(amounts.notna())
+    return values.astype(object).where(values.notna())
+
+
+class ClassReservoirs:
+    """Uniform samples of at most max_per_class rows per class, kept as the rows with the smallest random keys."""
+
+    def __init__(self, target, max_per_class=DEFAULT_MAX_PER_CLASS, seed=42):
+        self.target = target
+        self.max_per_class = max_per_class
+        self.rng = np.random.default_rng(seed)
+        self.counts = {}    # class -> rows seen
+        self._buffers = {}  # class -> list of (rows, keys, row numbers)
+        self._sizes = {}    # class -> rows buffered
+        self.rows = 0
+
+    def update(self, chunk):
+        labels = class_labels(chunk[self.target], self.target)
+        keys = self.rng.random(len(chunk))
+        row_numbers = np.arange(self.rows, self.rows + len(chunk))
+        self.rows += len(chunk)
+        known = labels.notna().to_numpy()
+        for label, positions in pd.Series(labels.to_numpy()[known]).groupby(
+                labels.to_numpy()[known], sort=False).indices.items():
+            positions = np.flatnonzero(known)[positions]
+            self.counts[label] = self.counts.get(label, 0) + len(positions)
+            self._buffers.setdefault(label, []).append(
+                (chunk.iloc[positions], keys[positions], row_numbers[positions]))
+            self._sizes[label] = self._sizes.get(label, 0) + len(positions)
+            if self._sizes[label] > COMPACT_FACTOR * self.max_per_class:
+                self._compact(label, self.max_per_class)
+        return self
+
+    def _compact(self, label, size):
+        """Merge the class's buffered rows and keep the `size` smallest keys."""
+        parts = self._buffers[label]
+        rows = pd.concat([part[0] for part in parts]) if len(parts) > 1 else parts[0][0]
+        keys = np.concatenate([part[1] for part in parts])
+        row_numbers = np.concatenate([part[2] for part in parts])
+        if len(keys) > size:
+            keep = np.argpartition(keys, size - 1)[:size]
+            rows, keys, row_numbers = rows.iloc[keep], keys[keep], row_numbers[keep]
+        self._buffers[label] = [(rows, keys, row_numbers)]
+        self._sizes[label] = len(keys)
+
+    def class_sizes(self, spread=1.0):
+        """Rows each class keeps: all of it up to max_per_class, and at most spread x the smallest class."""
+        sizes = {label: min(count, self.max_per_class) for label, count in self.counts.items()}
+        if spread and sizes:
+            limit = int(spread * min(sizes.values()))
+            sizes = {label: min(size, limit) for label, size in sizes.items()}
+        return sizes
+
+    def sample(self, spread=1.0):
+        """The balanced rows, in input order."""
+        parts = []
+        for label, size in self.class_sizes(spread).items():
+            self._compact(label, size)
+            rows, _, row_numbers = self._buffers[label][0]
+            parts.append((rows, row_numbers))
+        if not parts:
+            return pd.DataFrame()
+        order = np.argsort(np.concatenate([row_numbers for _, row_numbers in parts]), kind="stable")
+        return pd.concat([rows for rows, _ in parts], ignore_index=True).iloc[order].reset_index(drop=True)
+
+
+def balance_file(csv_path, targets=DEFAULT_TARGETS, spread=1.0, max_per_class=DEFAULT_MAX_PER_CLASS,
+                 output_dir=BALANCED_DIR, chunk_size=100000, seed=42):
+    """Write one class-balanced sample of csv_path per target; returns {target: output path}."""
+    header = list(pd.read_csv(csv_path, nrows=0).columns)
+    missing = [target for target in targets if target not in header]
+    if missing:
+        print(f"Skipping targets not in {csv_path}: {missing}")
+    # Each target samples with its own generator so adding a target does not change the others' samples
+    reservoirs = [ClassReservoirs(target, max_per_class, seed + i)
+                  for i, target in enumerate(targets) if target in header]
+    if not reservoirs:
+        return {}
+
+    run_log = RunLog("balancing")
+    stage = run_log.stage("balance", input_path=csv_path)
+    chunks = stage.timed_chunks(read_chunks(csv_path, chunk_size, dtype=dtypes_for(csv_path, cleaned=True)))
+    for chunk in chunks:
+        for reservoir in reservoirs:
+            reservoir.update(chunk)
+        stage.lap("transform")
+        stage.end_chunk(chunk)
+        print(f"Sampled {reservoirs[0].rows:,} rows", end="\r")
+    print()
+
+    os.makedirs(output_dir, exist_ok=True)
+    outputs, writers = {}, []
+    with stage.phase("write"):
+        for reservoir in reservoirs:
+            output_path = balanced_path(csv_path, reservoir.target, output_dir)
+            sizes = reservoir.class_sizes(spread)
+            with ChunkWriter(output_path) as writer:
+                writer.write(reservoir.sample(spread))
+            writers.append(writer)
+            outputs[reservoir.target] = output_path
+            seen = ", ".join(f"{label} {count:,} -> {sizes[label]:,}" for label, count in reservoir.counts.items())
+            print(f"{reservoir.target}: {seen}; saved to {output_path}")
+    stage.finish(writers=writers)
+    run_log.save()
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Class-balanced subsamples of incident files (like SpreadSubsample).")
+    parser.add_argument("csv_paths", nargs="+", help="Incident files, e.g. Fire.csv Flood.csv")
+    parser.add_argument("--targets", nargs="+", default=DEFAULT_TARGETS,
+                        help="Class columns; amounts are balanced on received (> 0) vs not")
+    parser.add_argument("--spread", type=float, default=1.0,
+                        help="Max ratio between the largest and smallest class (1 = uniform, 0 = no limit)")
+    parser.add_argument("--max-per-class", type=int, default=DEFAULT_MAX_PER_CLASS)
+    parser.add_argument("--output-dir", default=BALANCED_DIR)
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for csv_path in args.csv_paths:
+        balance_file(csv_path, args.targets, args.spread, args.max_per_class, args.output_dir,
+                     args.chunk_size, args.seed)
+
+
+if __name__ == "__main__":
+    main()
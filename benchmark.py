@@ -0,0 +1,298 @@
+# Benchmark suite for the IHP-VR pipeline on synthetic data from synthetic.py.
+# Each stage (join, clean, split, rollup, encode, correlation, model) runs in its own Python process inside a
+# work directory, so wall time and peak memory are measured per stage. Results are appended to
+# benchmark_results.csv together with the git commit, so runs of different versions can be compared.
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGES = ["join", "clean", "split", "rollup", "encode", "correlation", "model"]
+RESULTS_FILE = "benchmark_results.csv"
+RESULT_FIELDS = ["timestamp", "commit", "stage", "rows", "seconds", "rows_per_second", "peak_rss_mb",
+                 "input_mb", "output_mb", "chunk_size", "status"]
+
+IHP_VR_FILE = "IndividualsAndHouseholdsProgramValidRegistrations.csv"
+DECLARATIONS_FILE = "DisasterDeclarationsSummaries.csv"
+MERGED_FILE = "Merged_IHP_VR.csv"
+CLEANED_FILE = "cleaned_fema_filtered.csv"
+SPLIT_DIR = "split_by_incidentType"
+CORRELATION_FILE = "Fire.csv"  # pearsoncorrelation11.py
+MODEL_FILE = "Other.csv"  # zeroR.py
+
+
+def _size_mb(*paths):
+    sizes = [os.path.getsize(path) for path in paths if os.path.exists(path)]
+    return round(sum(sizes) / 1e6, 2) if sizes else None
+
+
+def _count_rows(path):
+    with open(path, "rb") as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+def _split_files():
+    return [os.path.join(SPLIT_DIR, name) for name in sorted(os.listdir(SPLIT_DIR))
+            if name.endswith(".csv") and not name.endswith(("_encoded.csv", "_encoding.csv"))]
+
+
+# Stage bodies. They run in a child process with the work directory as cwd and return
+# (rows processed, input paths, output paths).
+
+def _stage_join(chunk_size):
+    from MergeDataset import stream_merge
+    from instrumentation import RunLog
+
+    rows = stream_merge(IHP_VR_FILE, DECLARATIONS_FILE, MERGED_FILE, chunk_size,
+                        None, run_log=RunLog("benchmark_join"))
+    return rows, [IHP_VR_FILE], [MERGED_FILE]
+
+
+def _stage_clean(chunk_size):
+    from cleaning import clean_fused
+
+    clean_fused(IHP_VR_FILE, DECLARATIONS_FILE, CLEANED_FILE, chunk_size)
+    return _count_rows(IHP_VR_FILE), [IHP_VR_FILE], [CLEANED_FILE]
+
+
+def _stage_split(chunk_size):
+    import runpy
+
+    # The script appends to the per-incident files, so start from an empty directory
+    if os.path.isdir(SPLIT_DIR):
+        for name in os.listdir(SPLIT_DIR):
+            os.remove(os.path.join(SPLIT_DIR, name))
+    runpy.run_path(os.path.join(REPO_DIR, "splitbyincidenttype.py"), run_name="__main__")
+    return _count_rows(CLEANED_FILE), [CLEANED_FILE], _split_files()
+
+
+def _stage_rollup(chunk_size):
+    from rollup import LEVELS, ROLLUP_DIR, build_rollups, rollup_path
+
+    accumulator = build_rollups(CLEANED_FILE, ROLLUP_DIR, chunk_size)
+    return accumulator.rows, [CLEANED_FILE], [rollup_path(level, ROLLUP_DIR) for level in LEVELS]
+
+
+def _stage_encode(chunk_size):
+    import runpy
+
+    inputs = _split_files()
+    os.chdir(SPLIT_DIR)
+    runpy.run_path(os.path.join(REPO_DIR, "encoding.py"), run_name="__main__")
+    os.chdir("..")
+    outputs = [path.replace(".csv", "_encoded.csv") for path in inputs]
+    return sum(_count_rows(path) for path in inputs), inputs, outputs
+
+
+def _stage_correlation(chunk_size):
+    import pearsoncorrelation11
+
+    os.chdir(SPLIT_DIR)
+    pearsoncorrelation11.main()
+    os.chdir("..")
+    path = os.path.join(SPLIT_DIR, CORRELATION_FILE)
+    return _count_rows(path), [path], []
+
+
+def _stage_model(chunk_size, max_rows=100_000):
+    # zeroR.py fits every row and shows its plot, so the same three models are fitted here on a sample
+    import numpy as np
+    import pandas as pd
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.metrics import mean_absolute_error
+    from sklearn.model_selection import train_test_split
+    from sklearn.tree import DecisionTreeRegressor
+
+    from schema import dtypes_for
+
+    path = os.path.join(SPLIT_DIR, MODEL_FILE)
+    df = pd.read_csv(path, dtype=dtypes_for(path, cleaned=True))
+    if len(df) > max_rows:
+        df = df.sample(max_rows, random_state=42)
+    # Unique ids and free-text columns would turn into one dummy column per row
+    low_cardinality = [col for col in df.select_dtypes(include="category").columns
+                       if df[col].nunique() <= 50]
+    features = df.select_dtypes(include="number").columns.drop("ihpAmount").tolist() + low_cardinality
+    X = pd.get_dummies(df[features]).fillna(0)
+    y = df["ihpAmount"].fillna(0)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    maes = {"ZeroR": mean_absolute_error(y_test, np.full(len(y_test), y_train.mean()))}
+    for name, model in [("Random Tree", DecisionTreeRegressor(random_state=42)),
+                        ("Random Forest", RandomForestRegressor(n_estimators=100, random_state=42))]:
+        model.fit(X_train, y_train)
+        maes[name] = mean_absolute_error(y_test, model.predict(X_test))
+    print("MAE:", {name: round(mae, 2) for name, mae in maes.items()})
+    return len(df), [path], []
+
+
+STAGE_FUNCTIONS = {
+    "join": _stage_join,
+    "clean": _stage_clean,
+    "split": _stage_split,
+    "rollup": _stage_rollup,
+    "encode": _stage_encode,
+    "correlation": _stage_correlation,
+    "model": _stage_model,
+}
+
+
+def _run_stage_child(stage, chunk_size, result_path):
+    """Entry point of the child process: run one stage and write its result JSON."""
+    started = time.perf_counter()
+    rows, inputs, outputs = STAGE_FUNCTIONS[stage](chunk_size)
+    seconds = time.perf_counter() - started
+    with open(result_path, "w") as f:
+        json.dump({"rows": rows, "seconds": seconds,
+                   "input_mb": _size_mb(*inputs), "output_mb": _size_mb(*outputs)}, f)
+
+
+def _spawn_stage(stage, work_dir, chunk_size, log_path):
+    """Run one stage in a fresh interpreter; returns (result dict, peak RSS in MB or None)."""
+    result_path = os.path.join(work_dir, f".benchmark_{stage}.json")
+    if os.path.exists(result_path):
+        os.remove(result_path)
+    env = dict(os.environ, MPLBACKEND="Agg",
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])))
+    command = [sys.executable, os.path.abspath(__file__), "--child-stage", stage,
+               "--chunk-size", str(chunk_size), "--result", result_path]
+
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(command, cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        peak_rss_mb = None
+        if hasattr(os, "wait4"):
+            # wait4 reports the child's own peak RSS, unlike RUSAGE_CHILDREN which is cumulative
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            scale = 1 if sys.platform == "darwin" else 1024
+            peak_rss_mb = round(usage.ru_maxrss * scale / 1e6, 1)
+        else:
+            process.wait()
+
+    if process.returncode != 0 or not os.path.exists(result_path):
+        return None, peak_rss_mb
+    with open(result_path) as f:
+        return json.load(f), peak_rss_mb
+
+
+def _generate(work_dir, rows, seed, n_disasters, n_counties, missing_rate):
+    # A separate process as well: a child inherits the parent's peak RSS at fork time, so the
+    # parent must never hold the generated data or the stage numbers would all start from it
+    command = [sys.executable, os.path.join(REPO_DIR, "synthetic.py"), "--out-dir", work_dir,
+               "--rows", str(rows), "--seed", str(seed),
+               "--disasters", str(n_disasters), "--counties", str(n_counties), "--missing-rate", str(missing_rate)]
+    subprocess.run(command, check=True)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _previous_results(results_path):
+    """Last recorded successful result per (stage, rows), for comparing against this run."""
+    previous = {}
+    if os.path.exists(results_path):
+        with open(results_path, newline="") as f:
+            for row in csv.DictReader(f):
+                if row["status"] == "ok":
+                    previous[(row["stage"], row["rows"])] = row
+    return previous
+
+
+def run_benchmark(work_dir="benchmark_data", rows=1_000_000, stages=STAGES, chunk_size=100_000,
+                  results_path=RESULTS_FILE, reuse_data=False, seed=42, n_disasters=500, n_counties=2000,
+                  missing_rate=0.02):
+    """Generate the synthetic inputs (unless reused), run the stages in order and append the results."""
+    os.makedirs(work_dir, exist_ok=True)
+    work_dir = os.path.abspath(work_dir)
+    if not (reuse_data and os.path.exists(os.path.join(work_dir, IHP_VR_FILE))):
+        print(f"Generating {rows:,} synthetic registrations in '{work_dir}'...")
+        _generate(work_dir, rows, seed, n_disasters, n_counties, missing_rate)
+
+    previous = _previous_results(results_path)
+    commit = _git_commit()
+    timestamp = datetime.now().isoformat(timespec="seconds")
+    log_dir = os.path.join(work_dir, "benchmark_logs")
+    os.makedirs(log_dir, exist_ok=True)
+
+    results = []
+    for stage in stages:
+        print(f"Running stage '{stage}'...", flush=True)
+        log_path = os.path.join(log_dir, f"{stage}.log")
+        outcome, peak_rss_mb = _spawn_stage(stage, work_dir, chunk_size, log_path)
+        if outcome is None:
+            print(f"  Stage '{stage}' failed; see {log_path}")
+            results.append({"timestamp": timestamp, "commit": commit, "stage": stage, "rows": None,
+                            "seconds": None, "rows_per_second": None, "peak_rss_mb": peak_rss_mb,
+                            "input_mb": None, "output_mb": None, "chunk_size": chunk_size, "status": "failed"})
+            continue
+
+        seconds = outcome["seconds"]
+        result = {
+            "timestamp": timestamp,
+            "commit": commit,
+            "stage": stage,
+            "rows": outcome["rows"],
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(outcome["rows"] / seconds, 1) if seconds > 0 else None,
+            "peak_rss_mb": peak_rss_mb,
+            "input_mb": outcome["input_mb"],
+            "output_mb": outcome["output_mb"],
+            "chunk_size": chunk_size,
+            "status": "ok",
+        }
+        results.append(result)
+
+        message = (f"  {result['rows']:,} rows in {result['seconds']}s "
+                   f"({result['rows_per_second']:,} rows/s), peak RSS {peak_rss_mb} MB")
+        before = previous.get((stage, str(result["rows"])))
+        if before is not None and float(before["seconds"]) > 0:
+            change = 100 * (seconds - float(before["seconds"])) / float(before["seconds"])
+            message += f"; {change:+.1f}% time vs {before['commit']}"
+        print(message)
+
+    write_header = not os.path.exists(results_path) or os.path.getsize(results_path) == 0
+    with open(results_path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        if write_header:
+            writer.writeheader()
+        writer.writerows(results)
+    print(f"Benchmark results appended to '{results_path}'")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IHP-VR pipeline stages on synthetic data.")
+    parser.add_argument("--work-dir", default="benchmark_data")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--results", default=RESULTS_FILE)
+    parser.add_argument("--reuse-data", action="store_true", help="Keep existing synthetic input files")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--disasters", type=int, default=500)
+    parser.add_argument("--counties", type=int, default=2000)
+    parser.add_argument("--missing-rate", type=float, default=0.02)
+    parser.add_argument("--child-stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_stage:
+        _run_stage_child(args.child_stage, args.chunk_size, args.result)
+        return
+
+    run_benchmark(args.work_dir, args.rows, args.stages, args.chunk_size, args.results, args.reuse_data,
+                  args.seed, args.disasters, args.counties, args.missing_rate)
+
+
+if __name__ == "__main__":
+    main()
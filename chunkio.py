@@ -0,0 +1,281 @@
+# Chunked CSV reading and writing shared by the pipeline scripts.
+# read_chunks() parses with either the pandas C parser or the multi-threaded pyarrow CSV reader
+# (Parquet files are read batch by batch with pyarrow), and parses the next chunk on a background
+# thread while the caller processes the current one.
+# ChunkWriter does the same for output: chunks are formatted and written on a background thread.
+import gzip
+import io
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+import pandas as pd
+
+from schema import is_parquet
+
+DEFAULT_PREFETCH = 2  # Chunks parsed ahead of the consumer
+
+
+def pyarrow_available():
+    try:
+        import pyarrow.csv  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_engine(engine="auto"):
+    """'auto' picks pyarrow when it is installed and falls back to the pandas C parser."""
+    if engine == "auto":
+        return "pyarrow" if pyarrow_available() else "c"
+    if engine not in ("c", "pyarrow"):
+        raise ValueError(f"Unknown CSV engine '{engine}' (expected 'auto', 'c' or 'pyarrow')")
+    return engine
+
+
+def _arrow_type(dtype):
+    """Translate a schema.py dtype string into the pyarrow type the CSV reader should produce."""
+    import pyarrow as pa
+
+    arrow_types = {
+        "int16": pa.int16(), "Int16": pa.int16(),
+        "int32": pa.int32(), "Int32": pa.int32(),
+        "float32": pa.float32(),
+        "boolean": pa.bool_(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "str": pa.string(), "string": pa.string(), "object": pa.string(),
+    }
+    if dtype is str:
+        return pa.string()
+    return arrow_types.get(str(dtype))
+
+
+def _pandas_types_mapper():
+    """Keep nullable ints and flags as the pandas extension dtypes schema.py asks for."""
+    import pyarrow as pa
+
+    mapping = {pa.int16(): pd.Int16Dtype(), pa.bool_(): pd.BooleanDtype()}
+    return mapping.get
+
+
+def _read_chunks_pyarrow(file_path, chunksize, dtype=None, usecols=None):
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    column_types = {}
+    if dtype is not None:
+        columns = list(usecols) if usecols is not None else list(pd.read_csv(file_path, nrows=0).columns)
+        if isinstance(dtype, defaultdict):
+            # A defaultdict covers every column, so the header decides which ones exist
+            dtype = {col: dtype[col] for col in columns}
+        # Columns outside the schema are read as strings: inferring their type from the first block
+        # fails on a column that is empty for the first rows and filled later
+        column_types = {col: pa.string() for col in columns}
+        for col, col_dtype in dtype.items():
+            arrow_type = _arrow_type(col_dtype)
+            if arrow_type is not None:
+                column_types[col] = arrow_type
+
+    reader = pacsv.open_csv(
+        file_path,
+        read_options=pacsv.ReadOptions(use_threads=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types=column_types,
+            include_columns=list(usecols) if usecols is not None else None,
+            strings_can_be_null=True,
+            timestamp_parsers=[],  # Dates stay strings, as with the C parser
+        ),
+    )
+    types_mapper = _pandas_types_mapper()
+
+    pending = []
+    pending_rows = 0
+    for batch in reader:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= chunksize:
+            table = pa.Table.from_batches(pending).unify_dictionaries()
+            yield table.slice(0, chunksize).to_pandas(types_mapper=types_mapper)
+            rest = table.slice(chunksize)
+            pending = rest.to_batches()
+            pending_rows = rest.num_rows
+    if pending_rows:
+        table = pa.Table.from_batches(pending).unify_dictionaries()
+        yield table.to_pandas(types_mapper=types_mapper)
+
+
+def _read_chunks_parquet(file_path, chunksize, dtype=None, usecols=None):
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(file_path)
+    columns = list(usecols) if usecols is not None else None
+    for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+        chunk = batch.to_pandas(types_mapper=_pandas_types_mapper())
+        if dtype is not None:
+            # Parquet already carries types; only cast where the schema asks for something else
+            casts = {col: dtype[col] for col in chunk.columns
+                     if col in dtype and str(chunk[col].dtype) != str(dtype[col])}
+            if casts:
+                chunk = chunk.astype(casts)
+        yield chunk
+
+
+def _read_chunks_c(file_path, chunksize, dtype=None, usecols=None):
+    with pd.read_csv(file_path, chunksize=chunksize, dtype=dtype, usecols=usecols, low_memory=False) as reader:
+        yield from reader
+
+
+def _prefetch(chunks, depth):
+    """Run the parser on a background thread and hand chunks over through a bounded queue."""
+    done = object()
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for chunk in chunks:
+                # Blocks while the queue is full, so at most `depth` parsed chunks are held
+                while not stop.is_set():
+                    try:
+                        buffer.put(chunk, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    break
+        except BaseException as exc:  # Re-raised on the consumer side
+            buffer.put(exc)
+        else:
+            buffer.put(done)
+        finally:
+            chunks.close()
+
+    worker = threading.Thread(target=produce, name="csv-prefetch", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # Drain so a producer blocked on put() can see the stop flag and exit
+        while worker.is_alive():
+            try:
+                buffer.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        worker.join()
+
+
+def read_chunks(file_path, chunksize, dtype=None, usecols=None, engine="c", prefetch=DEFAULT_PREFETCH):
+    """Yield DataFrame chunks of file_path.
+
+    engine is 'c', 'pyarrow' or 'auto' (ignored for .parquet files, which always use pyarrow). The C
+    parser is the default; pyarrow is faster on wide files but infers the type of columns the schema
+    does not cover when no dtype is given.
+    With prefetch > 0 the next chunks are parsed on a background thread while the caller works
+    on the current one.
+    """
+    engine = resolve_engine(engine)
+    if is_parquet(file_path):
+        chunks = _read_chunks_parquet(file_path, chunksize, dtype=dtype, usecols=usecols)
+    elif engine == "pyarrow":
+        chunks = _read_chunks_pyarrow(file_path, chunksize, dtype=dtype, usecols=usecols)
+    else:
+        chunks = _read_chunks_c(file_path, chunksize, dtype=dtype, usecols=usecols)
+
+    if prefetch and prefetch > 0:
+        return _prefetch(chunks, prefetch)
+    return chunks
+
+
+def _open_output(file_path, mode, compression):
+    """Open a text handle for file_path, optionally through a fast compressor."""
+    if compression is None:
+        return open(file_path, mode, newline="")
+    if compression == "gzip":
+        # Level 1 trades ratio for speed; the writer thread should never be the bottleneck
+        return gzip.open(file_path, mode + "t", compresslevel=1, newline="")
+    if compression == "zstd":
+        import zstandard
+
+        raw = open(file_path, mode + "b")
+        return io.TextIOWrapper(zstandard.ZstdCompressor(level=1).stream_writer(raw), newline="")
+    raise ValueError(f"Unknown compression '{compression}' (expected None, 'gzip' or 'zstd')")
+
+
+class ChunkWriter:
+    """Append DataFrame chunks to one CSV from a background thread.
+
+    write() returns as soon as the chunk is queued; once queue_size chunks are waiting it blocks,
+    which keeps memory bounded when the disk is slower than the pipeline. The header is written
+    with the first chunk unless mode='a' is appending to a non-empty file. The file is fsynced
+    once, on close(). na_rep is the token written for missing values (e.g. '?' for WEKA).
+    """
+
+    def __init__(self, file_path, mode="w", compression=None, queue_size=DEFAULT_PREFETCH, na_rep=""):
+        if mode not in ("w", "a"):
+            raise ValueError(f"Unknown mode '{mode}' (expected 'w' or 'a')")
+        self.file_path = file_path
+        self.na_rep = na_rep
+        self.rows_written = 0
+        self.busy_seconds = 0.0  # Time the writer thread spent formatting and writing
+        self._header = not (mode == "a" and os.path.exists(file_path) and os.path.getsize(file_path) > 0)
+        self._handle = _open_output(file_path, mode, compression)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._closed = False
+        self._worker = threading.Thread(target=self._drain, name="csv-writer", daemon=True)
+        self._worker.start()
+
+    def _drain(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                break
+            if self._error is not None:
+                continue  # Keep draining so write() never blocks after a failure
+            started = time.perf_counter()
+            try:
+                chunk.to_csv(self._handle, header=self._header, index=False, na_rep=self.na_rep)
+                self._header = False
+                self.rows_written += len(chunk)
+            except BaseException as exc:
+                self._error = exc
+            self.busy_seconds += time.perf_counter() - started
+
+    def _raise_pending_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def write(self, chunk):
+        self._raise_pending_error()
+        if self._closed:
+            raise ValueError(f"ChunkWriter for {self.file_path} is already closed")
+        self._queue.put(chunk)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+        self._handle.close()
+        if self._error is None:
+            # One fsync for the whole file, after any compressor trailer has been written
+            with open(self.file_path, "rb+") as synced:
+                os.fsync(synced.fileno())
+        self._raise_pending_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,238 @@
+# Cleaning transforms for the IHP-VR pipeline.
+# databasecreation.py (enrich + fill), droppedcolumns.py (Unknown filter) and imputevaluesscript.py
+# (mode/median imputation) all use these per-chunk functions. clean_fused() runs them in a single
+# streaming pass so a record is read and written once instead of three or four times.
+import json
+import time
+
+import pandas as pd
+
+from chunkio import ChunkWriter, read_chunks
+from instrumentation import RunLog
+from schema import DECLARATIONS_DTYPES, dtypes_for, read_header
+
+DECLARATION_COLUMNS = ['disasterNumber', 'declarationType', 'declarationTitle']
+
+# Rows with "Unknown" in any of these are dropped (droppedcolumns.py)
+FILTER_COLUMNS = ["ihpEligible", "applicantAge", "ownRent"]
+
+# 'Unknown' is replaced by the mode, 0 by the chunk median (imputevaluesscript.py)
+CATEGORICAL_IMPUTE_COLUMNS = ["applicantAge", "homeOwnersInsurance", "floodInsurance", "renterDamageLevel"]
+NUMERICAL_IMPUTE_COLUMNS = ["floodDamageAmount", "foundationDamageAmount", "roofDamageAmount"]
+
+
+def load_declaration_lookup(declarations_path):
+    """Return {disasterNumber: declarationType} and {disasterNumber: declarationTitle}."""
+    declarations = pd.read_csv(declarations_path,
+                               usecols=DECLARATION_COLUMNS,
+                               dtype=dtypes_for(declarations_path, DECLARATIONS_DTYPES, usecols=DECLARATION_COLUMNS))
+    disaster_type_dict = dict(zip(declarations['disasterNumber'], declarations['declarationType']))
+    disaster_title_dict = dict(zip(declarations['disasterNumber'], declarations['declarationTitle']))
+    return disaster_type_dict, disaster_title_dict
+
+
+def remove_duplicates(chunk):
+    """Drop duplicate rows within the chunk; returns (chunk, number removed)."""
+    original_size = len(chunk)
+    chunk = chunk.drop_duplicates()
+    return chunk, original_size - len(chunk)
+
+
+def _fill_value(col, dtype):
+    """Placeholder for one column, from its dtype and name."""
+    name = col.lower()
+    if pd.api.types.is_bool_dtype(dtype):
+        # Nullable boolean flags from the schema: a missing flag is treated as not set
+        return False
+    if pd.api.types.is_numeric_dtype(dtype):
+        # For numeric columns, use 0 or -1 depending on if it might be an ID
+        return -1 if name.endswith('id') or 'number' in name else 0
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        # For date columns, use a default date (1900-01-01)
+        return pd.Timestamp('1900-01-01')
+    # For string/object and categorical columns
+    if 'date' in name:
+        return '1900-01-01'
+    if 'flag' in name:
+        return 'N'
+    if 'state' in name:
+        return 'NA'
+    if 'zip' in name:
+        return '00000'
+    return 'Unknown'
+
+
+def header_dtypes(file_path, cleaned=False):
+    """Schema dtype of every column in file_path's header; columns the schema does not cover are strings.
+
+    Unlike a chunk's inferred dtypes this does not depend on the data, so a column that is empty in
+    the first chunk still gets the plan of its real type.
+    """
+    dtypes = dtypes_for(file_path, cleaned=cleaned)
+    return {col: pd.api.types.pandas_dtype(dtypes.get(col, "object")) for col in read_header(file_path)}
+
+
+def compile_fill_plan(dtypes, skip_columns=('declarationType', 'declarationTitle')):
+    """Build the {column: fill value} plan once from the column dtypes (e.g. header_dtypes(file_path))."""
+    return {col: _fill_value(col, dtype) for col, dtype in dtypes.items() if col not in skip_columns}
+
+
+def save_fill_plan(fill_plan, file_path):
+    """Write the plan as JSON so a run's fill values can be inspected or reused."""
+    artifact = {
+        "fill_values": {col: (value.isoformat() if isinstance(value, pd.Timestamp) else value)
+                        for col, value in fill_plan.items()},
+        "datetime_columns": [col for col, value in fill_plan.items() if isinstance(value, pd.Timestamp)],
+    }
+    with open(file_path, "w") as f:
+        json.dump(artifact, f, indent=2)
+
+
+def load_fill_plan(file_path):
+    with open(file_path) as f:
+        artifact = json.load(f)
+    fill_plan = artifact["fill_values"]
+    for col in artifact["datetime_columns"]:
+        fill_plan[col] = pd.Timestamp(fill_plan[col])
+    return fill_plan
+
+
+def apply_fill_plan(chunk, fill_plan):
+    """Fill every planned column with a single fillna(dict) call."""
+    fill_plan = {col: value for col, value in fill_plan.items() if col in chunk.columns}
+    # Categorical columns only accept fill values that are already categories
+    for col in chunk.select_dtypes(include="category").columns:
+        if col in fill_plan and fill_plan[col] not in chunk[col].cat.categories:
+            chunk[col] = chunk[col].cat.add_categories([fill_plan[col]])
+    return chunk.fillna(fill_plan)
+
+
+def fill_missing(chunk, fill_plan=None):
+    """Fill empty values in every column with a type-appropriate placeholder."""
+    if fill_plan is None:
+        fill_plan = compile_fill_plan(chunk.dtypes)
+    return apply_fill_plan(chunk, fill_plan)
+
+
+def enrich(chunk, disaster_type_dict, disaster_title_dict):
+    """Attach declarationType / declarationTitle by disasterNumber, with defaults for unknown disasters."""
+    chunk['declarationType'] = chunk['disasterNumber'].map(disaster_type_dict).astype(object).fillna('Unknown Type')
+    chunk['declarationTitle'] = chunk['disasterNumber'].map(disaster_title_dict).astype(object).fillna('No Title Available')
+    return chunk
+
+
+def drop_unknown(chunk, filter_columns=FILTER_COLUMNS):
+    """Remove rows where any of the filter_columns have "Unknown"."""
+    filter_columns = [col for col in filter_columns if col in chunk.columns]
+    return chunk[~chunk[filter_columns].isin(["Unknown"]).any(axis=1)]
+
+
+def compute_categorical_modes(file_path, chunk_size=100000, categorical_cols=CATEGORICAL_IMPUTE_COLUMNS,
+                              dtype=None, prepare=None):
+    """Most frequent non-"Unknown" value per column, counted over the whole file.
+
+    Only the needed columns are parsed. prepare, if given, is applied to each chunk before
+    counting (clean_fused uses it to count the rows that survive fill + filter).
+    """
+    header = list(pd.read_csv(file_path, nrows=0).columns)
+    # The filter columns are only needed when prepare drops the Unknown rows
+    wanted = list(categorical_cols) + (FILTER_COLUMNS if prepare is not None else [])
+    needed = [col for col in dict.fromkeys(wanted) if col in header]
+    if dtype is None:
+        dtype = dtypes_for(file_path, usecols=needed, cleaned=True)
+    dtype = {col: col_dtype for col, col_dtype in dtype.items() if col in needed}
+
+    counts = {col: None for col in categorical_cols if col in needed}
+    for chunk in read_chunks(file_path, chunk_size, dtype=dtype, usecols=needed):
+        if prepare is not None:
+            chunk = prepare(chunk)
+        for col in counts:
+            values = chunk[col].astype(object)
+            chunk_counts = values[values != "Unknown"].value_counts()
+            counts[col] = chunk_counts if counts[col] is None else counts[col].add(chunk_counts, fill_value=0)
+
+    return {col: col_counts.idxmax() for col, col_counts in counts.items()
+            if col_counts is not None and not col_counts.empty}
+
+
+def impute(chunk, categorical_modes, numerical_cols=NUMERICAL_IMPUTE_COLUMNS):
+    """Replace 'Unknown' with the precomputed mode and 0 with the chunk median."""
+    for col, mode_value in categorical_modes.items():
+        # Boolean flags can't hold 'Unknown'; only string/categorical columns need replacing
+        if col not in chunk.columns or pd.api.types.is_bool_dtype(chunk[col]):
+            continue
+        values = chunk[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Swap the category, not the rows, so the chunk reaches the writer still categorical
+            if "Unknown" not in values.cat.categories:
+                continue
+            if mode_value in values.cat.categories:
+                chunk[col] = values.where(values != "Unknown", mode_value).cat.remove_categories("Unknown")
+            else:
+                chunk[col] = values.cat.rename_categories({"Unknown": mode_value})
+        else:
+            chunk[col] = values.astype(object).replace("Unknown", mode_value)
+
+    for col in numerical_cols:
+        if col in chunk.columns:
+            median_value = chunk[col].median()
+            chunk[col] = chunk[col].replace(0, median_value)
+    return chunk
+
+
+def clean_fused(ihp_vr_path, declarations_path, output_path, chunk_size=100000, compression=None,
+                fill_plan_path='ihp_vr_fill_plan.json'):
+    """Enrich, fill, filter and impute IHP-VR in one streaming pass and write the result once.
+
+    The imputation modes come from a cheap pre-pass that parses only the imputed and filter columns.
+    The fill plan is compiled from the header and schema, used for every chunk and saved to fill_plan_path.
+    """
+    start_time = time.time()
+    run_log = RunLog("clean_fused")
+    disaster_type_dict, disaster_title_dict = load_declaration_lookup(declarations_path)
+    ihp_vr_dtypes = dtypes_for(ihp_vr_path)
+    fill_plan = compile_fill_plan(header_dtypes(ihp_vr_path))
+    if fill_plan_path:
+        save_fill_plan(fill_plan, fill_plan_path)
+
+    print("Pre-pass: computing imputation modes...")
+    mode_stage = run_log.stage("mode_prepass", input_path=ihp_vr_path)
+    categorical_modes = compute_categorical_modes(
+        ihp_vr_path, chunk_size, dtype=ihp_vr_dtypes,
+        prepare=lambda chunk: drop_unknown(fill_missing(chunk, fill_plan)))
+    mode_stage.finish()
+    print(f"  Modes: {categorical_modes}")
+
+    total_rows = 0
+    duplicate_count = 0
+    dropped_count = 0
+    stage = run_log.stage("clean", input_path=ihp_vr_path, output_path=output_path)
+    with ChunkWriter(output_path, compression=compression) as writer:
+        chunks = stage.timed_chunks(read_chunks(ihp_vr_path, chunk_size, dtype=ihp_vr_dtypes))
+        for chunk_count, chunk in enumerate(chunks, start=1):
+            chunk, duplicates = remove_duplicates(chunk)
+            chunk = enrich(chunk, disaster_type_dict, disaster_title_dict)
+            chunk = apply_fill_plan(chunk, fill_plan)
+            filtered_chunk = drop_unknown(chunk)
+            dropped_count += len(chunk) - len(filtered_chunk)
+            filtered_chunk = impute(filtered_chunk.copy(), categorical_modes)
+            stage.lap("transform")
+            writer.write(filtered_chunk)
+            stage.lap("write")
+            stage.end_chunk(filtered_chunk)
+
+            duplicate_count += duplicates
+            total_rows += len(filtered_chunk)
+            print(f"Chunk #{chunk_count}: {total_rows:,} rows written, "
+                  f"{duplicate_count:,} duplicates and {dropped_count:,} Unknown rows removed")
+
+    stage.finish(writers=[writer])
+    run_log.save()
+    print(f"Fused cleaning saved to '{output_path}' in {(time.time() - start_time)/60:.2f} minutes")
+    return total_rows
+
+
+if __name__ == "__main__":
+    clean_fused('IndividualsAndHouseholdsProgramValidRegistrations.csv',
+                'DisasterDeclarationsSummaries.csv',
+                'cleaned_fema_filtered.csv')
@@ -2,15 +2,23 @@ import pandas as pd
 import numpy as np
 import time
 import gc  # For garbage collection
+from chunkio import ChunkWriter, read_chunks
+from cleaning import apply_fill_plan, compile_fill_plan, enrich, header_dtypes, save_fill_plan
+from instrumentation import RunLog
+from schema import DECLARATIONS_DTYPES, dtypes_for
+from zonemap import ClusteredWriter
 
 start_time = time.time()
 
 print("Loading the disaster declarations dataset...")
-disaster_declarations = pd.read_csv('DisasterDeclarationsSummaries.csv')
+declarations_path = 'DisasterDeclarationsSummaries.csv'
+declarations_columns = ['disasterNumber', 'declarationType', 'declarationTitle']
+disaster_declarations = pd.read_csv(declarations_path,
+                                    usecols=declarations_columns,
+                                    dtype=dtypes_for(declarations_path, DECLARATIONS_DTYPES, usecols=declarations_columns))
 
-# Select only the columns we need from disaster declarations
-disaster_columns = disaster_declarations[['disasterNumber', 'declarationType', 'declarationTitle']].copy()
-disaster_columns['disasterNumber'] = disaster_columns['disasterNumber'].astype(str)
+# Select only the columns we need from disaster declarations (disasterNumber stays int32)
+disaster_columns = disaster_declarations[declarations_columns].copy()
 
 # Free up memory
 del disaster_declarations
@@ -29,16 +37,42 @@ print("Lookup dictionaries created for quick joining")
 # Process the large file in chunks
 chunk_size = 100000  # Reduced chunk size for better progress visibility
 output_file = 'ihp_vr_enriched.csv'
-first_chunk = True
+output_compression = None  # 'gzip' or 'zstd' to compress the output (rename output_file to match)
+# Write the output sorted by declarationDate with per-block min/max dates in ihp_vr_enriched.zonemap.json,
+# so time-window analyses can skip blocks and skip sorting. Off by default: the clustered output is written
+# uncompressed on close() instead of on the background writer, so output_compression only applies when False
+cluster_by_date = False
+fill_plan_file = 'ihp_vr_fill_plan.json'  # {column: fill value}, compiled once from the header and schema
 total_rows = 0
 duplicate_count = 0
 chunk_count = 0
+# The per-chunk gc.collect() is timed separately in the run log, so its cost can be compared with
+# the RSS it saves; set to False to skip it
+collect_garbage_every_chunk = True
 
 print(f"Processing IHP-VR dataset in chunks of {chunk_size} rows...")
 
-for chunk in pd.read_csv('IndividualsAndHouseholdsProgramValidRegistrations.csv', 
-                         chunksize=chunk_size, 
-                         low_memory=False):
+ihp_vr_path = 'IndividualsAndHouseholdsProgramValidRegistrations.csv'
+
+# Fill empty values in all columns with type-appropriate values.
+# The plan is derived from the column names and schema dtypes once and applied as one fillna(dict) per chunk.
+fill_plan = compile_fill_plan(header_dtypes(ihp_vr_path))
+save_fill_plan(fill_plan, fill_plan_file)
+print(f"Fill plan for {len(fill_plan)} columns saved to '{fill_plan_file}'")
+
+# Parse / transform / write / gc time, rows/sec and peak RSS go to run_logs/
+run_log = RunLog('databasecreation')
+stage = run_log.stage('enrich', input_path=ihp_vr_path, output_path=output_file)
+
+if cluster_by_date:
+    # Chunks are spilled per declarationDate and assembled in date order when the writer is closed
+    writer = ClusteredWriter(output_file, block_rows=chunk_size)
+else:
+    # Chunks are formatted and written on a background thread while the next one is processed
+    writer = ChunkWriter(output_file, compression=output_compression)
+
+# Parsing runs on a background thread while this loop transforms
+for chunk in stage.timed_chunks(read_chunks(ihp_vr_path, chunk_size, dtype=dtypes_for(ihp_vr_path))):
     
     chunk_start_time = time.time()
     chunk_count += 1
@@ -55,78 +89,18 @@ for chunk in pd.read_csv('IndividualsAndHouseholdsProgramValidRegistrations.csv'
     if current_chunk_duplicates > 0:
         print(f"  Removed {current_chunk_duplicates} duplicates in this chunk")
     
-    # Ensure disasterNumber is a string
-    chunk['disasterNumber'] = chunk['disasterNumber'].astype(str)
+    # Fill empty values with the precompiled plan
+    chunk = apply_fill_plan(chunk, fill_plan)
     
-    # Add new columns with default values
-    chunk['declarationType'] = 'Unknown Type'
-    chunk['declarationTitle'] = 'No Title Available'
+    # Vectorized lookup of declarationType / declarationTitle by disasterNumber
+    print(f"  Joining {chunk['disasterNumber'].nunique()} unique disaster numbers")
+    chunk = enrich(chunk, disaster_type_dict, disaster_title_dict)
     
-    # Fill empty values in all columns with type-appropriate values
-    print("  Filling missing values in all columns...")
-    
-    # Process in batches to show progress
-    for col in chunk.columns:
-        # Skip the newly added columns as we'll handle those separately
-        if col in ['declarationType', 'declarationTitle']:
-            continue
-            
-        # Determine the data type and fill accordingly
-        if pd.api.types.is_numeric_dtype(chunk[col]):
-            # For numeric columns, use 0 or -1 depending on if it might be an ID
-            if col.lower().endswith('id') or 'number' in col.lower():
-                chunk[col].fillna(-1, inplace=True)
-            else:
-                chunk[col].fillna(0, inplace=True)
-                
-        elif pd.api.types.is_datetime64_dtype(chunk[col]):
-            # For date columns, use a default date (1900-01-01)
-            chunk[col].fillna(pd.Timestamp('1900-01-01'), inplace=True)
-            
-        else:
-            # For string/object columns
-            if col.lower().endswith('date') or 'date' in col.lower():
-                # Date-like string columns
-                chunk[col].fillna('1900-01-01', inplace=True)
-            elif col.lower().endswith('flag') or 'flag' in col.lower():
-                # Flag columns
-                chunk[col].fillna('N', inplace=True)
-            elif 'state' in col.lower():
-                # State columns
-                chunk[col].fillna('NA', inplace=True)
-            elif 'zip' in col.lower():
-                # Zip code columns
-                chunk[col].fillna('00000', inplace=True)
-            else:
-                # General string columns
-                chunk[col].fillna('Unknown', inplace=True)
-    
-    # Use vectorized operations for joining
-    # Get unique disaster numbers in this chunk for faster processing
-    unique_disaster_nums = chunk['disasterNumber'].unique()
-    print(f"  Processing {len(unique_disaster_nums)} unique disaster numbers")
-    
-    # Process in small batches to show progress
-    batch_size = max(1, len(unique_disaster_nums) // 10)
-    for i in range(0, len(unique_disaster_nums), batch_size):
-        batch = unique_disaster_nums[i:i+batch_size]
-        for disaster_num in batch:
-            # Update all matching rows at once
-            mask = chunk['disasterNumber'] == disaster_num
-            if disaster_num in disaster_type_dict:
-                chunk.loc[mask, 'declarationType'] = disaster_type_dict[disaster_num]
-            if disaster_num in disaster_title_dict:
-                chunk.loc[mask, 'declarationTitle'] = disaster_title_dict[disaster_num]
-        
-        if i % (batch_size * 5) == 0 and i > 0:
-            print(f"    Processed {i}/{len(unique_disaster_nums)} disaster numbers...")
+    stage.lap('transform')
     
     # Write to CSV
-    if first_chunk:
-        chunk.to_csv(output_file, index=False)
-        first_chunk = False
-    else:
-        chunk.to_csv(output_file, mode='a', header=False, index=False)
+    writer.write(chunk)
+    stage.lap('write')
     
     total_rows += len(chunk)
     chunk_time = time.time() - chunk_start_time
@@ -134,9 +108,14 @@ for chunk in pd.read_csv('IndividualsAndHouseholdsProgramValidRegistrations.csv'
     print(f"Total progress: {total_rows:,} rows processed, {duplicate_count:,} duplicates removed")
     print(f"Elapsed time: {(time.time() - start_time)/60:.2f} minutes")
     
-    # Force garbage collection to free memory
+    # Record the chunk (optionally forcing garbage collection to free memory)
+    stage.end_chunk(chunk, collect_garbage=collect_garbage_every_chunk)
     del chunk
-    gc.collect()
+
+# Flush the queued chunks (or assemble the clustered file) and fsync the output once
+writer.close()
+stage.finish(writers=[writer])
+run_log.save()
 
 print(f"\nJoin completed successfully. New dataset saved as '{output_file}'")
 print(f"Total rows in final dataset: {total_rows:,}")
@@ -1,105 +1,135 @@
 import pandas as pd
-import numpy as np
 import time
 import gc  # For garbage collection
+from chunkio import ChunkWriter, read_chunks
+from areajoin import load_area_index
+from cleaning import enrich
+from instrumentation import RunLog
+from schema import DECLARATIONS_DTYPES, dtypes_for
+from zonemap import ClusteredWriter
 
-start_time = time.time()
+# File paths
+ihp_vr_path = 'IndividualsAndHouseholdsProgramValidRegistrations.csv'
+declarations_path = 'DisasterDeclarationsSummaries.csv'
+output_file = 'ihp_vr_enriched.csv'
+declarations_columns = ['disasterNumber', 'declarationType', 'declarationTitle']
 
-print("Loading the disaster declarations dataset...")
-disaster_declarations = pd.read_csv('DisasterDeclarationsSummaries.csv')
+# The declarationType / declarationTitle lookups are per disaster; the designated-area fields (incident dates,
+# program flags, FIPS codes) differ per county, so they are joined on (disasterNumber, state, county) against
+# a sorted key index
+attach_area_fields = True
 
-# Select only the columns we need from disaster declarations
-disaster_columns = disaster_declarations[['disasterNumber', 'declarationType', 'declarationTitle']].copy()
-disaster_columns['disasterNumber'] = disaster_columns['disasterNumber'].astype(str)
+# Process the large file in chunks
+chunk_size = 100000  # Reduced chunk size for better progress visibility
+output_compression = None  # 'gzip' or 'zstd' to compress the output (rename output_file to match)
+# Write the output sorted by declarationDate with per-block min/max dates in ihp_vr_enriched.zonemap.json,
+# so time-window analyses can skip blocks and skip sorting. Off by default: the clustered output is written
+# uncompressed on close() instead of on the background writer, so output_compression only applies when False
+cluster_by_date = False
+# The per-chunk gc.collect() is timed separately in the run log, so its cost can be compared with
+# the RSS it saves; set to False to skip it
+collect_garbage_every_chunk = True
 
-# Free up memory
-del disaster_declarations
-gc.collect()  # Force garbage collection
-print(f"Disaster declarations processed: {len(disaster_columns)} rows")
 
-# Convert to dictionary for faster lookups
-disaster_type_dict = dict(zip(disaster_columns['disasterNumber'], disaster_columns['declarationType']))
-disaster_title_dict = dict(zip(disaster_columns['disasterNumber'], disaster_columns['declarationTitle']))
+def enrich_file(ihp_vr_path=ihp_vr_path, declarations_path=declarations_path, output_file=output_file,
+                chunk_size=chunk_size, attach_area_fields=attach_area_fields, cluster_by_date=cluster_by_date):
+    """Join the declarations (and designated areas) onto IHP-VR chunk by chunk; returns the rows written."""
+    start_time = time.time()
 
-# Free up more memory
-del disaster_columns
-gc.collect()
-print("Lookup dictionaries created for quick joining")
+    print("Loading the disaster declarations dataset...")
+    disaster_declarations = pd.read_csv(declarations_path,
+                                        usecols=declarations_columns,
+                                        dtype=dtypes_for(declarations_path, DECLARATIONS_DTYPES, usecols=declarations_columns))
 
-# Process the large file in chunks
-chunk_size = 100000  # Reduced chunk size for better progress visibility
-output_file = 'ihp_vr_enriched.csv'
-first_chunk = True
-total_rows = 0
-duplicate_count = 0
-chunk_count = 0
-
-print(f"Processing IHP-VR dataset in chunks of {chunk_size} rows...")
-
-for chunk in pd.read_csv('IndividualsAndHouseholdsProgramValidRegistrations.csv', 
-                         chunksize=chunk_size, 
-                         low_memory=False):
-    
-    chunk_start_time = time.time()
-    chunk_count += 1
-    print(f"Processing chunk #{chunk_count}...")
-    
-    # Track original chunk size
-    original_size = len(chunk)
-    
-    # Remove duplicates in the chunk
-    chunk.drop_duplicates(inplace=True)
-    current_chunk_duplicates = original_size - len(chunk)
-    duplicate_count += current_chunk_duplicates
-    
-    if current_chunk_duplicates > 0:
-        print(f"  Removed {current_chunk_duplicates} duplicates in this chunk")
-    
-    # Ensure disasterNumber is a string
-    chunk['disasterNumber'] = chunk['disasterNumber'].astype(str)
-    
-    # Add new columns with default values
-    chunk['declarationType'] = 'Unknown Type'
-    chunk['declarationTitle'] = 'No Title Available'
-    
-    # Use vectorized operations instead of row-by-row processing
-    # Get unique disaster numbers in this chunk for faster processing
-    unique_disaster_nums = chunk['disasterNumber'].unique()
-    print(f"  Processing {len(unique_disaster_nums)} unique disaster numbers")
-    
-    # Process in small batches to show progress
-    batch_size = max(1, len(unique_disaster_nums) // 10)
-    for i in range(0, len(unique_disaster_nums), batch_size):
-        batch = unique_disaster_nums[i:i+batch_size]
-        for disaster_num in batch:
-            # Update all matching rows at once
-            mask = chunk['disasterNumber'] == disaster_num
-            if disaster_num in disaster_type_dict:
-                chunk.loc[mask, 'declarationType'] = disaster_type_dict[disaster_num]
-            if disaster_num in disaster_title_dict:
-                chunk.loc[mask, 'declarationTitle'] = disaster_title_dict[disaster_num]
-        
-        if i % (batch_size * 5) == 0 and i > 0:
-            print(f"    Processed {i}/{len(unique_disaster_nums)} disaster numbers...")
-    
-    # Write to CSV
-    if first_chunk:
-        chunk.to_csv(output_file, index=False)
-        first_chunk = False
-    else:
-        chunk.to_csv(output_file, mode='a', header=False, index=False)
-    
-    total_rows += len(chunk)
-    chunk_time = time.time() - chunk_start_time
-    print(f"Chunk #{chunk_count} completed in {chunk_time:.2f} seconds")
-    print(f"Total progress: {total_rows:,} rows processed, {duplicate_count:,} duplicates removed")
-    print(f"Elapsed time: {(time.time() - start_time)/60:.2f} minutes")
-    
-    # Force garbage collection to free memory
-    del chunk
+    # Select only the columns we need from disaster declarations (disasterNumber stays int32)
+    disaster_columns = disaster_declarations[declarations_columns].copy()
+
+    # Free up memory
+    del disaster_declarations
+    gc.collect()  # Force garbage collection
+    print(f"Disaster declarations processed: {len(disaster_columns)} rows")
+
+    # Convert to dictionary for faster lookups
+    disaster_type_dict = dict(zip(disaster_columns['disasterNumber'], disaster_columns['declarationType']))
+    disaster_title_dict = dict(zip(disaster_columns['disasterNumber'], disaster_columns['declarationTitle']))
+
+    # Free up more memory
+    del disaster_columns
     gc.collect()
+    print("Lookup dictionaries created for quick joining")
+
+    if attach_area_fields:
+        area_index = load_area_index(declarations_path)
+        print(f"Designated-area index built: {len(area_index)} areas")
+
+    total_rows = 0
+    duplicate_count = 0
+    chunk_count = 0
+
+    print(f"Processing IHP-VR dataset in chunks of {chunk_size} rows...")
+
+    # Parse / transform / write / gc time, rows/sec and peak RSS go to run_logs/
+    run_log = RunLog('databasemaker')
+    stage = run_log.stage('enrich', input_path=ihp_vr_path, output_path=output_file)
+
+    if cluster_by_date:
+        # Chunks are spilled per declarationDate and assembled in date order when the writer is closed
+        writer = ClusteredWriter(output_file, block_rows=chunk_size)
+    else:
+        # Chunks are formatted and written on a background thread while the next one is processed
+        writer = ChunkWriter(output_file, compression=output_compression)
+
+    # Parsing runs on a background thread while this loop transforms
+    for chunk in stage.timed_chunks(read_chunks(ihp_vr_path, chunk_size, dtype=dtypes_for(ihp_vr_path))):
+
+        chunk_start_time = time.time()
+        chunk_count += 1
+        print(f"Processing chunk #{chunk_count}...")
+
+        # Track original chunk size
+        original_size = len(chunk)
+
+        # Remove duplicates in the chunk
+        chunk.drop_duplicates(inplace=True)
+        current_chunk_duplicates = original_size - len(chunk)
+        duplicate_count += current_chunk_duplicates
+
+        if current_chunk_duplicates > 0:
+            print(f"  Removed {current_chunk_duplicates} duplicates in this chunk")
+
+        # Vectorized lookup of declarationType / declarationTitle by disasterNumber
+        print(f"  Joining {chunk['disasterNumber'].nunique()} unique disaster numbers")
+        chunk = enrich(chunk, disaster_type_dict, disaster_title_dict)
+        if attach_area_fields:
+            chunk = area_index.join(chunk)
+
+        stage.lap('transform')
+
+        # Write to CSV
+        writer.write(chunk)
+        stage.lap('write')
+
+        total_rows += len(chunk)
+        chunk_time = time.time() - chunk_start_time
+        print(f"Chunk #{chunk_count} completed in {chunk_time:.2f} seconds")
+        print(f"Total progress: {total_rows:,} rows processed, {duplicate_count:,} duplicates removed")
+        print(f"Elapsed time: {(time.time() - start_time)/60:.2f} minutes")
+
+        # Record the chunk (optionally forcing garbage collection to free memory)
+        stage.end_chunk(chunk, collect_garbage=collect_garbage_every_chunk)
+        del chunk
+
+    # Flush the queued chunks (or assemble the clustered file) and fsync the output once
+    writer.close()
+    stage.finish(writers=[writer])
+    run_log.save()
+
+    print(f"\nJoin completed successfully. New dataset saved as '{output_file}'")
+    print(f"Total rows in final dataset: {total_rows:,}")
+    print(f"Total duplicates removed: {duplicate_count:,}")
+    print(f"Total processing time: {(time.time() - start_time)/60:.2f} minutes")
+    return total_rows
+
 
-print(f"\nJoin completed successfully. New dataset saved as '{output_file}'")
-print(f"Total rows in final dataset: {total_rows:,}")
-print(f"Total duplicates removed: {duplicate_count:,}")
-print(f"Total processing time: {(time.time() - start_time)/60:.2f} minutes")
\ No newline at end of file
+if __name__ == "__main__":
+    enrich_file()
@@ -1,4 +1,8 @@
 import pandas as pd
+from chunkio import ChunkWriter, read_chunks
+from cleaning import drop_unknown
+from instrumentation import RunLog
+from schema import dtypes_for
 
 # File paths
 input_file_path = "Cleaned IHPVR Disaster Summaries.csv"  # Update this with actual file path
@@ -10,17 +14,33 @@ chunk_size = 100000  # Adjust based on system capabilities
 # Columns to filter out "Unknown" values
 filter_columns = ["ihpEligible", "applicantAge", "ownRent"]
 
-# Open a new file for writing filtered data
-with pd.read_csv(input_file_path, chunksize=chunk_size) as reader:
-    for i, chunk in enumerate(reader):
-        # Remove rows where any of the filter_columns have "Unknown"
-        filtered_chunk = chunk[~chunk[filter_columns].isin(["Unknown"]).any(axis=1)]
+def filter_unknown(input_file_path=input_file_path, output_file_path=output_file_path, chunk_size=chunk_size,
+                   filter_columns=filter_columns):
+    """Write the rows of input_file_path with no "Unknown" in filter_columns to output_file_path."""
+    # Open a new file for writing filtered data
+    # Filtered chunks are written on a background thread (header only with the first chunk)
+    run_log = RunLog("droppedcolumns")
+    stage = run_log.stage("filter_unknown", input_path=input_file_path, output_path=output_file_path)
+    with ChunkWriter(output_file_path) as writer:
+        for chunk in stage.timed_chunks(read_chunks(input_file_path, chunk_size, dtype=dtypes_for(input_file_path, cleaned=True))):
+            # Remove rows where any of the filter_columns have "Unknown"
+            filtered_chunk = drop_unknown(chunk, filter_columns)
+            stage.lap("transform")
 
-        # Append to output file (write header only for the first chunk)
-        filtered_chunk.to_csv(output_file_path, mode='a', header=(i == 0), index=False)
+            # Queue for the output file
+            writer.write(filtered_chunk)
+            stage.lap("write")
+            stage.end_chunk(filtered_chunk)
+    stage.finish(writers=[writer])
+    run_log.save()
+    return output_file_path
 
-# Display first few rows of cleaned dataset
-import ace_tools as tools
-tools.display_dataframe_to_user(name="Filtered FEMA Dataset", dataframe=pd.read_csv(output_file_path, nrows=100))
 
-print(f"Download your cleaned dataset here: {output_file_path}")
+if __name__ == "__main__":
+    filter_unknown()
+
+    # Display first few rows of cleaned dataset
+    import ace_tools as tools
+    tools.display_dataframe_to_user(name="Filtered FEMA Dataset", dataframe=pd.read_csv(output_file_path, nrows=100))
+
+    print(f"Download your cleaned dataset here: {output_file_path}")
@@ -1,5 +1,10 @@
 import pandas as pd
-import numpy as np
+from collections import defaultdict
+from chunkio import read_chunks
+from encodingstore import ENCODED_COLUMNS, MISSING_CODE, CodeArrayWriter, EncodingStore, code_array_dir
+from instrumentation import RunLog
+from schema import dtypes_for
+from weka import ArffWriter, weka_csv_writer
 
 # Suppress dtype warnings
 pd.options.mode.chained_assignment = None  
@@ -31,59 +36,63 @@ output_files = [
 ]
 
 chunk_size = 100000  # Adjust chunk size as needed
-
-for input_path, output_path in zip(input_files, output_files):
-    processed_chunks = []
-
-    # Create a separate encoding map for each file
-    encoding_maps = {col: {} for col in ['residenceType', 'damageCity', 'county', 'applicantAge', 'ownRent', 'haStatus']}
-
-    for chunk in pd.read_csv(input_path, chunksize=chunk_size, dtype=str, low_memory=False):
-        # Drop 'highWaterLocation' column if it exists
-        chunk.drop(columns=['highWaterLocation'], errors='ignore', inplace=True)
-
-        # Handle missing (NaN) values by replacing them with '?'
-        chunk.fillna('?', inplace=True)  # Use '?' as WEKA's representation for missing values
-
-        # Encode categorical columns
-        for col in encoding_maps.keys():
-            if col in chunk.columns:
-                unique_values = chunk[col].unique()
-                # Filter out the '?' placeholder before encoding
-                valid_values = [val for val in unique_values if val != '?']
-                for val in valid_values:
-                    if val not in encoding_maps[col]:
-                        encoding_maps[col][val] = len(encoding_maps[col])
-                # Map the values, and set '?' as the value for missing data
-                chunk[col] = chunk[col].map(encoding_maps[col]).fillna('?')
-
-        processed_chunks.append(chunk)
-
-    # Concatenate the processed chunks
-    processed_df = pd.concat(processed_chunks, ignore_index=True)
-
-    # Double-check and handle any remaining NaN values
-    processed_df = processed_df.replace(np.nan, '?')  # Ensure any NaN values are replaced by '?'
-
-    # Check for any remaining NaN values before saving
-    if processed_df.isnull().values.any():
-        print(f"Warning: Found null values in {input_path}. Replacing with '?'")
-        processed_df = processed_df.fillna('?')  # Replace any remaining NaN values with '?'
-
-    # Ensure all columns are properly encoded for WEKA
-    processed_df.to_csv(output_path, index=False)
-
-    # Save encoding mappings for this file
-    mapping_df = []
-    for col, mapping in encoding_maps.items():
-        for string_val, int_val in mapping.items():
-            mapping_df.append([col, string_val, int_val])
-
-    mapping_df = pd.DataFrame(mapping_df, columns=['Column', 'Original_Value', 'Encoded_Value'])
-    mapping_file = output_path.replace("_encoded.csv", "_encoding.csv")
-    mapping_df.to_csv(mapping_file, index=False)
+output_format = "csv"  # 'csv' (WEKA CSV) or 'arff'
+
+def encode_file(input_path, encoded_path, run_log, chunk_size=chunk_size, output_format=output_format):
+    """Encode input_path into encoded_path (.arff instead of .csv for output_format='arff'); returns the output path."""
+    output_path = encoded_path.replace(".csv", ".arff") if output_format == "arff" else encoded_path
+    stage = run_log.stage(f"encode:{input_path}", input_path=input_path, output_path=output_path)
+
+    # Each file keeps its own encoding maps; existing codes are loaded from the mapping file
+    # and only values not seen in earlier runs get new codes
+    mapping_file = encoded_path.replace("_encoded.csv", "_encoding.csv")
+    encoding_store = EncodingStore(mapping_file)
+    code_arrays = CodeArrayWriter(code_array_dir(encoded_path))
+
+    # Columns keep their schema types (numbers stay numeric, nulls stay nulls); columns the
+    # schema doesn't know are read as strings. '?' is only written by the WEKA writer.
+    read_dtypes = defaultdict(lambda: str, dtypes_for(input_path, cleaned=True))
+
+    if output_format == "arff":
+        writer = ArffWriter(output_path, relation=input_path.replace(".csv", ""))
+    else:
+        writer = weka_csv_writer(output_path)
+
+    with writer:
+        for chunk in stage.timed_chunks(read_chunks(input_path, chunk_size, dtype=read_dtypes)):
+            # Drop 'highWaterLocation' column if it exists
+            chunk.drop(columns=['highWaterLocation'], errors='ignore', inplace=True)
+
+            # Encode categorical columns as int32 codes; the null mask marks missing values
+            chunk_codes = {}
+            for col in ENCODED_COLUMNS:
+                if col in chunk.columns:
+                    codes = encoding_store.encode(col, chunk[col])
+                    chunk_codes[col] = codes
+                    chunk[col] = pd.arrays.IntegerArray(codes, codes == MISSING_CODE)
+            code_arrays.write(chunk_codes)
+
+            stage.lap("transform")
+            writer.write(chunk)
+            stage.lap("write")
+            stage.end_chunk(chunk)
+
+    with stage.phase("write"):
+        code_arrays.close()
+    stage.finish(writers=[writer])
+
+    # Save encoding mappings for this file, including any newly assigned codes
+    encoding_store.save()
 
     print(f"Processed: {input_path} → {output_path}")
-    print(f"Encoding mapping saved to: {mapping_file}")
+    print(f"Encoding mapping saved to: {mapping_file} ({encoding_store.new_values} new values)")
+    print(f"Code arrays saved to: {code_array_dir(encoded_path)}")
+    return output_path
+
 
-print("All files processed successfully.")
+if __name__ == "__main__":
+    run_log = RunLog("encoding")
+    for input_path, encoded_path in zip(input_files, output_files):
+        encode_file(input_path, encoded_path, run_log)
+    run_log.save()
+    print("All files processed successfully.")
@@ -0,0 +1,157 @@
+# Persistent encoding dictionaries and memory-mapped code arrays for encoding.py.
+# Each input file keeps its value -> code dictionaries in its *_encoding.csv mapping file; a rerun loads
+# them and only assigns codes to values it has not seen, so codes stay stable between data refreshes.
+# The encoded columns are also written as raw int32 arrays that the modelling scripts can open with
+# np.memmap (load_code_arrays, read_csv_with_codes) instead of reparsing those text columns.
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+ENCODED_COLUMNS = ['residenceType', 'damageCity', 'county', 'applicantAge', 'ownRent', 'haStatus']
+MISSING_CODE = -1  # Code array value for a missing (or '?') entry
+CODE_DTYPE = np.int32
+MANIFEST_FILE = "manifest.json"
+
+
+class EncodingStore:
+    """Value -> code dictionaries for one file, backed by its mapping CSV (Column, Original_Value, Encoded_Value)."""
+
+    def __init__(self, mapping_file, columns=ENCODED_COLUMNS):
+        self.mapping_file = mapping_file
+        self.maps = {col: {} for col in columns}
+        self.new_values = 0
+        if os.path.exists(mapping_file):
+            # keep_default_na=False so values like 'NA' stay strings instead of turning into NaN
+            existing = pd.read_csv(mapping_file, dtype={'Column': str, 'Original_Value': str},
+                                   keep_default_na=False)
+            for col, value, code in existing[['Column', 'Original_Value', 'Encoded_Value']].itertuples(index=False):
+                self.maps.setdefault(col, {})[value] = int(code)
+        self._next_code = {col: max(mapping.values(), default=-1) + 1 for col, mapping in self.maps.items()}
+
+    def encode(self, col, series):
+        """int32 codes for series, assigning new codes to unseen values; missing and '?' map to MISSING_CODE."""
+        mapping = self.maps.setdefault(col, {})
+        self._next_code.setdefault(col, 0)
+        values = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype('category')
+        categories = values.cat.categories
+
+        # Only the distinct values need a dictionary lookup; the rows are mapped through their category codes
+        category_codes = np.empty(len(categories), dtype=CODE_DTYPE)
+        for i, value in enumerate(categories.astype(str)):
+            if value == '?':
+                category_codes[i] = MISSING_CODE
+                continue
+            if value not in mapping:
+                mapping[value] = self._next_code[col]
+                self._next_code[col] += 1
+                self.new_values += 1
+            category_codes[i] = mapping[value]
+
+        row_codes = values.cat.codes.to_numpy()
+        codes = np.full(len(row_codes), MISSING_CODE, dtype=CODE_DTYPE)
+        present = row_codes >= 0
+        codes[present] = category_codes[row_codes[present]]
+        return codes
+
+    def decode(self, col):
+        """Array indexed by code giving the original value (for turning codes back into labels)."""
+        mapping = self.maps[col]
+        labels = np.empty(max(mapping.values(), default=-1) + 1, dtype=object)
+        for value, code in mapping.items():
+            labels[code] = value
+        return labels
+
+    def save(self):
+        rows = [[col, value, code] for col, mapping in self.maps.items()
+                for value, code in sorted(mapping.items(), key=lambda item: item[1])]
+        pd.DataFrame(rows, columns=['Column', 'Original_Value', 'Encoded_Value']).to_csv(self.mapping_file, index=False)
+
+
+class CodeArrayWriter:
+    """Append each column's int32 codes chunk by chunk to <directory>/<column>.int32."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.rows = 0
+        self._handles = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, codes_by_column):
+        """Append one chunk; every column must have the same number of rows."""
+        lengths = {len(codes) for codes in codes_by_column.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Code arrays in one chunk have different lengths: {sorted(lengths)}")
+        for col, codes in codes_by_column.items():
+            if col not in self._handles:
+                if self.rows:
+                    raise ValueError(f"Column '{col}' first appeared after {self.rows:,} rows were written")
+                self._handles[col] = open(os.path.join(self.directory, f"{col}.int32"), "wb")
+            self._handles[col].write(np.ascontiguousarray(codes, dtype=CODE_DTYPE).tobytes())
+        self.rows += lengths.pop() if lengths else 0
+
+    def close(self):
+        for handle in self._handles.values():
+            handle.close()
+        manifest = {"rows": self.rows, "dtype": np.dtype(CODE_DTYPE).name, "missing_code": MISSING_CODE,
+                    "columns": list(self._handles)}
+        with open(os.path.join(self.directory, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def code_array_dir(encoded_path):
+    """Directory holding the code arrays for an *_encoded.csv output."""
+    return encoded_path.replace("_encoded.csv", "_codes")
+
+
+def load_code_arrays(directory, columns=None):
+    """Open the code arrays read-only as np.memmap, without copying them into memory."""
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    columns = manifest["columns"] if columns is None else columns
+    if manifest["rows"] == 0:
+        # mmap cannot map an empty file
+        return {col: np.empty(0, dtype=manifest["dtype"]) for col in columns}
+    return {col: np.memmap(os.path.join(directory, f"{col}.int32"), dtype=manifest["dtype"], mode="r",
+                           shape=(manifest["rows"],))
+            for col in columns}
+
+
+def read_csv_with_codes(csv_path, dtype=None):
+    """pd.read_csv(csv_path) with the encoded columns rebuilt from its code arrays instead of parsed.
+
+    encoding.py writes <name>_codes/ with one code per row of <name>.csv. When those arrays are newer
+    than the CSV, the text columns they cover are skipped by the parser and rebuilt as categoricals
+    over the memory-mapped codes, with the categories sorted as read_csv would sort them. Otherwise the
+    whole file is parsed.
+    """
+    encoded_path = os.path.splitext(csv_path)[0] + "_encoded.csv"
+    directory = code_array_dir(encoded_path)
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    mapping_file = encoded_path.replace("_encoded.csv", "_encoding.csv")
+    if (not os.path.exists(manifest_path) or not os.path.exists(mapping_file)
+            or os.path.getmtime(manifest_path) < os.path.getmtime(csv_path)):
+        return pd.read_csv(csv_path, dtype=dtype)
+
+    code_arrays = load_code_arrays(directory)
+    header = list(pd.read_csv(csv_path, nrows=0).columns)
+    coded = [col for col in header if col in code_arrays]
+    df = pd.read_csv(csv_path, dtype=dtype, usecols=[col for col in header if col not in coded])
+    if len(df) != len(code_arrays[coded[0]] if coded else df):
+        # The CSV no longer has the rows the arrays were written for
+        return pd.read_csv(csv_path, dtype=dtype)
+
+    encoding_store = EncodingStore(mapping_file, columns=coded)
+    for col in coded:
+        values = pd.Categorical.from_codes(np.asarray(code_arrays[col]), categories=encoding_store.decode(col))
+        values = values.remove_unused_categories()
+        df[col] = values.reorder_categories(sorted(values.categories))
+    return df[header]
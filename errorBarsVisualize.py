@@ -5,6 +5,15 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from matplotlib.colors import LinearSegmentedColormap
+from schema import dtypes_for
+from rollup import CROSSTAB_TABLE, crosstab, load_rollup
+from sketches import load_sketches
+
+# Draw the age and income distributions from Fire.sketches.npz (see sketches.py) when it exists:
+# they then cover the whole file rather than the rows read below
+use_sketches = True
+# Directory written by rollup.py; the ownership-by-age crosstab is read from it (all Fire rows) when it exists
+rollup_dir = "rollups"
 
 # Force immediate printing of messages
 def print_status(message):
@@ -19,7 +28,7 @@ def read_csv_safely(file_path, max_rows=None):
     if max_rows:
         try:
             print_status(f"Trying direct read with {max_rows} row limit...")
-            df = pd.read_csv(file_path, nrows=max_rows)
+            df = pd.read_csv(file_path, nrows=max_rows, dtype=dtypes_for(file_path, cleaned=True))
             print_status(f"Success! Read {len(df)} rows directly")
             return df
         except Exception as e:
@@ -32,7 +41,7 @@ def read_csv_safely(file_path, max_rows=None):
         chunk_size = 5000  # Use a small chunk size
         total_rows = 0
         
-        for i, chunk in enumerate(pd.read_csv(file_path, chunksize=chunk_size)):
+        for i, chunk in enumerate(pd.read_csv(file_path, chunksize=chunk_size, dtype=dtypes_for(file_path, cleaned=True))):
             print_status(f"Reading chunk {i+1} with {len(chunk)} rows")
             chunks.append(chunk)
             total_rows += len(chunk)
@@ -86,7 +95,7 @@ def read_csv_safely(file_path, max_rows=None):
                 out_f.writelines(sample_lines)
             
             print_status(f"Created sample with {len(sample_lines)} lines")
-            df = pd.read_csv(temp_file)
+            df = pd.read_csv(temp_file, dtype=dtypes_for(temp_file, cleaned=True))
             print_status(f"Success! Read {len(df)} rows from sample file")
             
             # Clean up temp file
@@ -130,7 +139,7 @@ def main():
             '50-64': 57,
             '65+': 75
         }
-        df['applicantAgeNumeric'] = df['applicantAge'].map(age_mapping)
+        df['applicantAgeNumeric'] = df['applicantAge'].map(age_mapping).astype('float32')
         print_status(f"Age conversion complete. Null values: {df['applicantAgeNumeric'].isna().sum()}")
     else:
         print_status("Warning: 'applicantAge' column not found")
@@ -138,11 +147,15 @@ def main():
     # Convert ownRent to binary
     if 'ownRent' in df.columns:
         print_status("Converting ownership status to binary")
-        df['ownRentNumeric'] = df['ownRent'].apply(lambda x: 1 if x == 'Owner' else 0)
+        df['ownRentNumeric'] = (df['ownRent'] == 'Owner').astype('int8')
         print_status("Ownership conversion complete")
     else:
         print_status("Warning: 'ownRent' column not found")
     
+    sketches = load_sketches('Fire.csv') if use_sketches else None
+    if sketches is not None:
+        print_status(f"Using sketches of all {sketches.rows:,} rows for the age and income distributions")
+
     # Create correlation matrix
     print_status("\n=== CREATING VISUALIZATIONS ===")
     print_status("1. Creating Pearson correlation matrix")
@@ -208,7 +221,13 @@ def main():
         plt.figure(figsize=(10, 6))
         
         # Count age groups
-        age_counts = df['applicantAge'].value_counts().sort_index()
+        if sketches is not None and 'applicantAge' in sketches.frequencies:
+            age_sketch = sketches.frequencies['applicantAge']
+            age_counts = age_sketch.top(age_sketch.capacity).sort_index()
+            age_note = f" (approximate, +{age_sketch.error_bound():.0f} at most)"
+        else:
+            age_counts = df['applicantAge'].value_counts().sort_index()
+            age_note = ""
         print_status(f"Age counts: {dict(age_counts)}")
         
         # Define custom order if possible
@@ -219,7 +238,7 @@ def main():
             # Create bar plot
             sns.barplot(x=ordered_counts.index, y=ordered_counts.values, palette='viridis')
             
-            plt.title('Distribution of Applicant Age Groups', fontsize=16)
+            plt.title(f'Distribution of Applicant Age Groups{age_note}', fontsize=16)
             plt.xlabel('Age Group')
             plt.ylabel('Count')
             plt.tight_layout()
@@ -268,15 +287,26 @@ def main():
         try:
             plt.figure(figsize=(10, 6))
             
-            # Count income categories
-            income_counts = df['grossIncome'].value_counts().sort_index()
-            print_status(f"Income category counts: {dict(income_counts)}")
-            
-            # Create bar plot
-            sns.barplot(x=income_counts.index, y=income_counts.values, palette='Blues_r')
-            
-            plt.title('Distribution of Gross Income Categories', fontsize=16)
-            plt.xlabel('Income Category')
+            if sketches is not None and 'grossIncome' in sketches.quantiles:
+                # The quantile sketch keeps no exact values to count, so income is binned instead
+                income_sketch = sketches.quantiles['grossIncome']
+                income_counts, edges = income_sketch.histogram(30)
+                print_status(f"Income bin counts: {income_counts.round().astype(int).tolist()}")
+                plt.bar(edges[:-1], income_counts, width=np.diff(edges), align='edge',
+                        color=sns.color_palette('Blues_r')[0])
+                plt.title(f'Distribution of Gross Income (approximate, ±{income_sketch.rank_error():.1%} rank error)',
+                          fontsize=16)
+                plt.xlabel('Gross Income')
+            else:
+                # Count income categories
+                income_counts = df['grossIncome'].value_counts().sort_index()
+                print_status(f"Income category counts: {dict(income_counts)}")
+
+                # Create bar plot
+                sns.barplot(x=income_counts.index, y=income_counts.values, palette='Blues_r')
+
+                plt.title('Distribution of Gross Income Categories', fontsize=16)
+                plt.xlabel('Income Category')
             plt.ylabel('Count')
             plt.tight_layout()
             
@@ -295,7 +325,11 @@ def main():
             plt.figure(figsize=(10, 6))
             
             # Create crosstab
-            ct = pd.crosstab(df['applicantAge'], df['ownRent'])
+            rollup = load_rollup(CROSSTAB_TABLE, rollup_dir, incident_type='Fire') if rollup_dir else None
+            if rollup is not None:
+                ct = crosstab(rollup, 'applicantAge', 'ownRent')
+            else:
+                ct = pd.crosstab(df['applicantAge'], df['ownRent'])
             print_status("Ownership by age crosstab:")
             print(ct)
             
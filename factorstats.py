@@ -0,0 +1,172 @@
+# Streaming factor statistics for graphs.py and ihpvr.py.
+# One pass over the enriched IHP-VR file accumulates, per group (all rows, or per incidentType),
+# the sums needed for the Pearson correlation of each factor with ihpAmount and the counts behind
+# the "received IHP" rates for eligible / non-eligible applicants. Each chunk costs one groupby().sum().
+import numpy as np
+import pandas as pd
+
+from chunkio import read_chunks
+from instrumentation import RunLog
+from schema import dtypes_for
+
+TARGET = "ihpAmount"
+GROUP_COLUMN = "incidentType"
+ALL_ROWS = "All"
+
+CORRELATION_FACTORS = [
+    "replacementAmount", "replacementAssistanceEligible", "rentalAssistanceAmount",
+    "personalPropertyAmount", "ppfvl", "rentalAssistanceEligible", "rpfvl",
+    "destroyed", "repairAmount", "personalPropertyEligible"
+]
+
+ELIGIBILITY_FACTORS = [
+    "ihpEligible", "personalPropertyEligible", "rentalAssistanceEligible",
+    "repairAssistanceEligible", "replacementAssistanceEligible", "destroyed"
+]
+
+# Flags arrive as booleans (raw file) or as strings (cleaned files read them as category)
+_FLAG_STRINGS = {"True": 1.0, "False": 0.0, "true": 1.0, "false": 0.0, "1": 1.0, "0": 0.0,
+                 "1.0": 1.0, "0.0": 0.0, "Y": 1.0, "N": 0.0}
+
+
+def as_numeric(series):
+    """Float view of an amount or flag column; anything unparseable ('Unknown') becomes NaN."""
+    if pd.api.types.is_bool_dtype(series):
+        return series.astype("float64")
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype("float64")
+    values = series.astype(object)
+    mapped = values.map(_FLAG_STRINGS)
+    return mapped.fillna(pd.to_numeric(values, errors="coerce")).astype("float64")
+
+
+class FactorAccumulator:
+    """Running sums for factor/ihpAmount correlations and eligibility rates, per group."""
+
+    def __init__(self, correlation_factors=CORRELATION_FACTORS, eligibility_factors=ELIGIBILITY_FACTORS,
+                 by_incident=False):
+        self.correlation_factors = list(correlation_factors)
+        self.eligibility_factors = list(eligibility_factors)
+        self.by_incident = by_incident
+        self.totals = None
+        self.rows = 0
+        self._shift = None  # Per-column offsets from the first chunk, to keep the raw sums well conditioned
+
+    def columns(self):
+        """Columns update() reads from each chunk."""
+        needed = [TARGET] + self.correlation_factors + self.eligibility_factors
+        if self.by_incident:
+            needed.append(GROUP_COLUMN)
+        return list(dict.fromkeys(needed))
+
+    def update(self, chunk):
+        values = {col: as_numeric(chunk[col]) for col in self.columns() if col in chunk.columns and col != GROUP_COLUMN}
+        target = values[TARGET]
+        if self._shift is None:
+            self._shift = {col: float(np.nan_to_num(series.mean())) for col, series in values.items()}
+
+        sums = {}
+        y = target - self._shift[TARGET]
+        for factor in self.correlation_factors:
+            if factor not in values:
+                continue
+            x = values[factor] - self._shift[factor]
+            valid = x.notna() & y.notna()
+            xv = x.where(valid, 0.0)
+            yv = y.where(valid, 0.0)
+            sums[f"{factor}|n"] = valid.astype("float64")
+            sums[f"{factor}|x"] = xv
+            sums[f"{factor}|y"] = yv
+            sums[f"{factor}|xx"] = xv * xv
+            sums[f"{factor}|yy"] = yv * yv
+            sums[f"{factor}|xy"] = xv * yv
+
+        received = target > 0
+        for factor in self.eligibility_factors:
+            if factor not in values:
+                continue
+            eligible = values[factor] == 1
+            non_eligible = values[factor] == 0
+            sums[f"{factor}|eligible"] = eligible.astype("int64")
+            sums[f"{factor}|eligible_received"] = (eligible & received).astype("int64")
+            sums[f"{factor}|non_eligible"] = non_eligible.astype("int64")
+            sums[f"{factor}|non_eligible_received"] = (non_eligible & received).astype("int64")
+
+        frame = pd.DataFrame(sums)
+        if self.by_incident:
+            keys = chunk[GROUP_COLUMN].astype(object).fillna("Unknown").to_numpy()
+            chunk_totals = frame.groupby(keys, sort=False).sum()
+        else:
+            chunk_totals = frame.sum().to_frame(ALL_ROWS).T
+        self.totals = chunk_totals if self.totals is None else self.totals.add(chunk_totals, fill_value=0)
+        self.rows += len(chunk)
+        return self
+
+    def groups(self):
+        """ALL_ROWS first, then each incidentType when the accumulator splits by incident."""
+        if self.totals is None:
+            return []
+        if not self.by_incident:
+            return [ALL_ROWS]
+        return [ALL_ROWS] + sorted(self.totals.index)
+
+    def _group_totals(self, group):
+        # The sums are additive, so the overall totals are just the sum over the incident groups
+        if group == ALL_ROWS and self.by_incident:
+            return self.totals.sum()
+        return self.totals.loc[group]
+
+    def correlations(self, group=ALL_ROWS):
+        """Pearson correlation of each factor with ihpAmount, sorted descending (like corrwith)."""
+        totals = self._group_totals(group)
+        result = {}
+        for factor in self.correlation_factors:
+            if f"{factor}|n" not in totals:
+                continue
+            n = totals[f"{factor}|n"]
+            sx, sy = totals[f"{factor}|x"], totals[f"{factor}|y"]
+            cov = totals[f"{factor}|xy"] - sx * sy / n if n else np.nan
+            var_x = totals[f"{factor}|xx"] - sx * sx / n if n else np.nan
+            var_y = totals[f"{factor}|yy"] - sy * sy / n if n else np.nan
+            denominator = np.sqrt(var_x * var_y)
+            result[factor] = cov / denominator if n > 1 and denominator > 0 else np.nan
+        return pd.Series(result, dtype="float64").sort_values(ascending=False)
+
+    def eligibility_rates(self, group=ALL_ROWS):
+        """Percent receiving IHP among eligible / non-eligible applicants, one row per factor."""
+        totals = self._group_totals(group)
+        rows = []
+        for factor in self.eligibility_factors:
+            if f"{factor}|eligible" not in totals:
+                continue
+            eligible = totals[f"{factor}|eligible"]
+            non_eligible = totals[f"{factor}|non_eligible"]
+            percentage_eligible = 100 * totals[f"{factor}|eligible_received"] / eligible if eligible > 0 else 0
+            percentage_non_eligible = (100 * totals[f"{factor}|non_eligible_received"] / non_eligible
+                                       if non_eligible > 0 else 0)
+            rows.append([factor, percentage_eligible, percentage_non_eligible])
+        return pd.DataFrame(rows, columns=["Factor", "Eligible", "Non-Eligible"])
+
+
+def stream_factor_stats(file_path, chunk_size=100000, by_incident=False, cleaned=True,
+                        eligibility_factors=ELIGIBILITY_FACTORS):
+    """Accumulate factor statistics over file_path in one streaming pass, reading only the needed columns."""
+    accumulator = FactorAccumulator(eligibility_factors=eligibility_factors, by_incident=by_incident)
+    header = list(pd.read_csv(file_path, nrows=0).columns)
+    usecols = [col for col in accumulator.columns() if col in header]
+    if TARGET not in usecols:
+        raise ValueError(f"'{file_path}' has no '{TARGET}' column")
+
+    run_log = RunLog("factorstats")
+    stage = run_log.stage("factor_stats", input_path=file_path)
+    chunks = stage.timed_chunks(read_chunks(file_path, chunk_size, usecols=usecols,
+                                            dtype=dtypes_for(file_path, usecols=usecols, cleaned=cleaned)))
+    for chunk in chunks:
+        accumulator.update(chunk)
+        stage.lap("transform")
+        stage.end_chunk(chunk)
+        print(f"Accumulated {accumulator.rows:,} rows", end="\r")
+    print()
+    stage.finish()
+    run_log.save()
+    return accumulator
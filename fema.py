@@ -0,0 +1,253 @@
+# Single command line for the IHP-VR pipeline: python fema.py <command> [options].
+# The stage scripts keep working on their own with their hardcoded defaults; here every path is an
+# argument. Only argparse is imported up front: each command imports the script it runs (and with
+# it pandas, matplotlib, seaborn or sklearn) inside its handler, so 'fema.py split' never loads
+# sklearn and 'fema.py --help' loads none of them.
+import argparse
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+CORRELATION_METHODS = ["pearson", "spearman", "kendall"]  # rankcorr.METHODS
+
+
+def _given(**options):
+    """The options that were set on the command line, so the scripts' own defaults apply to the rest."""
+    return {name: value for name, value in options.items() if value is not None}
+
+
+def _date_filters(args):
+    return _given(incident_type=args.incident_type, start_date=args.start_date, end_date=args.end_date,
+                  year=args.year)
+
+
+def _run_script(script, argv):
+    """Run a script whose argument parsing happens at import time (graphs.py, ihpvr.py) with argv."""
+    import runpy
+
+    saved_argv = sys.argv
+    sys.argv = [script] + argv
+    try:
+        runpy.run_path(os.path.join(REPO_DIR, script), run_name="__main__")
+    finally:
+        sys.argv = saved_argv
+
+
+def enrich(args):
+    if args.fused:
+        from cleaning import clean_fused
+
+        clean_fused(args.ihp_vr_path, args.declarations_path, args.output or "cleaned_fema_filtered.csv",
+                    **_given(chunk_size=args.chunk_size))
+        return
+    from databasemaker import enrich_file
+
+    enrich_file(args.ihp_vr_path, args.declarations_path,
+                **_given(output_file=args.output, chunk_size=args.chunk_size,
+                         attach_area_fields=False if args.no_area_fields else None,
+                         cluster_by_date=True if args.cluster else None))
+
+
+def filter_unknown(args):
+    from droppedcolumns import filter_unknown
+
+    output_path = filter_unknown(args.input, **_given(output_file_path=args.output, chunk_size=args.chunk_size,
+                                                      filter_columns=args.columns))
+    print(f"Filtered dataset saved to {output_path}")
+
+
+def impute(args):
+    from imputevaluesscript import impute_file
+
+    output_path = impute_file(args.input, **_given(output_file_path=args.output, chunk_size=args.chunk_size))
+    print(f"Imputed dataset saved to {output_path}")
+
+
+def split(args):
+    from splitbyincidenttype import split_by_incident_type
+
+    file_paths = split_by_incident_type(args.input, **_given(
+        output_dir=args.output_dir, chunk_size=args.chunk_size, build_sketches=False if args.no_sketches else None))
+    print(f"Split into {len(file_paths)} files: {', '.join(sorted(file_paths))}")
+
+
+def encode(args):
+    from encoding import encode_file
+    from instrumentation import RunLog
+
+    run_log = RunLog("encoding")
+    for csv_path in args.csv_paths:
+        encode_file(csv_path, os.path.splitext(csv_path)[0] + "_encoded.csv", run_log,
+                    **_given(chunk_size=args.chunk_size, output_format=args.format))
+    run_log.save()
+
+
+def correlate(args):
+    import pearsoncorrelation11
+
+    pearsoncorrelation11.main(args.csv_path, **_given(method=args.method, output_dir=args.output_dir,
+                                                      replicates=args.bootstrap))
+
+
+def regress(args):
+    from LinearRegression import linear_regression_graph
+
+    linear_regression_graph(args.csv_path, **_date_filters(args))
+
+
+def compare_models(args):
+    if args.chunk_size:
+        from visualizeData import absolute_accuracy
+
+        options = {"chunksize": args.chunk_size}
+    else:
+        from zeroR import absolute_accuracy
+
+        options = {}
+    for csv_path in args.csv_paths:
+        absolute_accuracy(csv_path, args.target, **options)
+
+
+def visualize_error_bars(args):
+    os.chdir(args.data_dir)
+    import visualizeFire
+
+    if args.bootstrap is not None:
+        visualizeFire.bootstrap_replicates = args.bootstrap
+    visualizeFire.main()
+
+
+def visualize_fire(args):
+    os.chdir(args.data_dir)
+    import errorBarsVisualize
+
+    errorBarsVisualize.main()
+
+
+def visualize_factors(args):
+    argv = ([args.input] if args.input else []) + (["--by-incident"] if args.by_incident else [])
+    argv += ["--chunk-size", str(args.chunk_size)] + (["--rollups", args.rollups] if args.rollups else [])
+    # ihpvr.py saves the same charts to files instead of showing them
+    _run_script("ihpvr.py" if args.save else "graphs.py", argv)
+
+
+def visualize_sketches(args):
+    from visualizeData import visualize_sketches
+
+    visualize_sketches(args.csv_path, args.target, **_given(top_column=args.top_column, bins=args.bins))
+
+
+def visualize_std_dev(args):
+    from StandardDeviation import standard_deviation_graph
+
+    standard_deviation_graph(args.csv_path, args.window, **_date_filters(args))
+
+
+def _add_date_filters(parser):
+    parser.add_argument("--year", type=int)
+    parser.add_argument("--start-date", help="Inclusive, YYYY-MM-DD")
+    parser.add_argument("--end-date", help="Exclusive, YYYY-MM-DD")
+    parser.add_argument("--incident-type", help="e.g. Fire")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="fema", description="Run the FEMA IHP-VR pipeline stages and analyses.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    command = subparsers.add_parser("enrich", help="Join the declarations and designated areas onto IHP-VR")
+    command.add_argument("ihp_vr_path")
+    command.add_argument("declarations_path")
+    command.add_argument("--output", help="Default: ihp_vr_enriched.csv (cleaned_fema_filtered.csv with --fused)")
+    command.add_argument("--chunk-size", type=int)
+    command.add_argument("--no-area-fields", action="store_true", help="Skip the designated-area join")
+    command.add_argument("--cluster", action="store_true",
+                         help="Sort the output by declarationDate and write a zone map (uncompressed)")
+    command.add_argument("--fused", action="store_true", help="Enrich, fill, filter and impute in one pass")
+    command.set_defaults(handler=enrich)
+
+    command = subparsers.add_parser("filter", help="Drop rows with 'Unknown' in the filter columns")
+    command.add_argument("input")
+    command.add_argument("--output", help="Default: cleaned_fema_filtered.csv")
+    command.add_argument("--columns", nargs="+", help="Default: ihpEligible applicantAge ownRent")
+    command.add_argument("--chunk-size", type=int)
+    command.set_defaults(handler=filter_unknown)
+
+    command = subparsers.add_parser("impute", help="Replace 'Unknown' with the mode and 0 damage with the median")
+    command.add_argument("input")
+    command.add_argument("--output", help="Default: cleaned_fema_dataset.csv")
+    command.add_argument("--chunk-size", type=int)
+    command.set_defaults(handler=impute)
+
+    command = subparsers.add_parser("split", help="Split a cleaned file into one CSV per incidentType")
+    command.add_argument("input", nargs="?", default="cleaned_fema_filtered.csv")
+    command.add_argument("--output-dir", help="Default: split_by_incidentType")
+    command.add_argument("--chunk-size", type=int)
+    command.add_argument("--no-sketches", action="store_true", help="Skip the approximate-query sketches")
+    command.set_defaults(handler=split)
+
+    command = subparsers.add_parser("encode", help="Encode incident files for WEKA (<name>_encoded.csv)")
+    command.add_argument("csv_paths", nargs="+")
+    command.add_argument("--format", choices=["csv", "arff"])
+    command.add_argument("--chunk-size", type=int)
+    command.set_defaults(handler=encode)
+
+    command = subparsers.add_parser("correlate", help="Correlation heatmaps of an incident file")
+    command.add_argument("csv_path", nargs="?", default="Fire.csv")
+    command.add_argument("--method", choices=CORRELATION_METHODS)
+    command.add_argument("--output-dir", help="Default: output")
+    command.add_argument("--bootstrap", type=int, help="Bootstrap replicates for the intervals (0 = none)")
+    command.set_defaults(handler=correlate)
+
+    command = subparsers.add_parser("regress", help="Linear regression of ihpAmount over declarationDate")
+    command.add_argument("csv_path", help="CSV, clustered enriched file or .sqlite database")
+    _add_date_filters(command)
+    command.set_defaults(handler=regress)
+
+    command = subparsers.add_parser("compare-models", help="MAE of ZeroR, a tree and a forest on ihpAmount")
+    command.add_argument("csv_paths", nargs="+")
+    command.add_argument("--target", default="ihpAmount")
+    command.add_argument("--chunk-size", type=int, help="Fit per chunk of this many rows (visualizeData.py)")
+    command.set_defaults(handler=compare_models)
+
+    command = subparsers.add_parser("visualize", help="Charts; see 'fema visualize --help'")
+    charts = command.add_subparsers(dest="chart", required=True)
+
+    chart = charts.add_parser("error-bars", help="Fire means with 95%% intervals (visualizeFire.py)")
+    chart.add_argument("--data-dir", default=".", help="Directory holding Fire.csv; charts are written there")
+    chart.add_argument("--bootstrap", type=int, help="Bootstrap replicates (0 = mean +- 1.96 SE)")
+    chart.set_defaults(handler=visualize_error_bars)
+
+    chart = charts.add_parser("fire", help="Fire distributions and crosstabs (errorBarsVisualize.py)")
+    chart.add_argument("--data-dir", default=".", help="Directory holding Fire.csv; charts are written there")
+    chart.set_defaults(handler=visualize_fire)
+
+    chart = charts.add_parser("factors", help="Factors behind IHP amount and eligibility (graphs.py)")
+    chart.add_argument("input", nargs="?", help="Enriched IHP-VR CSV; simulated data if omitted")
+    chart.add_argument("--by-incident", action="store_true")
+    chart.add_argument("--chunk-size", type=int, default=100000)
+    chart.add_argument("--rollups", help="Directory written by rollup.py")
+    chart.add_argument("--save", action="store_true", help="Save the charts to files (ihpvr.py)")
+    chart.set_defaults(handler=visualize_factors)
+
+    chart = charts.add_parser("sketches", help="Approximate distribution charts from saved sketches")
+    chart.add_argument("csv_path")
+    chart.add_argument("--target", default="ihpAmount")
+    chart.add_argument("--top-column")
+    chart.add_argument("--bins", type=int)
+    chart.set_defaults(handler=visualize_sketches)
+
+    chart = charts.add_parser("std-dev", help="Rolling standard deviation of ihpAmount")
+    chart.add_argument("csv_path", help="CSV, clustered enriched file or .sqlite database")
+    chart.add_argument("--window", type=int, default=30)
+    _add_date_filters(chart)
+    chart.set_defaults(handler=visualize_std_dev)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# Geographic dimension: integer keys for states, counties and zip codes, with the zip -> county -> state
+# hierarchy between them. Each level is stored as a sorted array of values with a parallel array of
+# keys, so a lookup is a binary search (np.searchsorted) over the distinct values of a chunk, and
+# parent arrays indexed by key give a zip's county and a county's state. Keys are assigned once and
+# kept when the index is rebuilt on newer data; new values get the next free key, so the same county
+# has the same key in every file and every run.
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from chunkio import read_chunks
+from ihpquery import STATE_COLUMNS
+from instrumentation import RunLog
+
+GEO_INDEX = "geo_index.npz"
+DEFAULT_INPUT = "cleaned_fema_filtered.csv"
+COUNTY_COLUMN = "county"
+ZIP_COLUMN = "damagedZipCode"
+GEO_KEY_COLUMNS = ["stateKey", "countyKey", "zipKey"]
+MISSING_KEY = -1
+_SEPARATOR = "|"  # Joins state and county into the composite county lookup value
+
+
+def _search(sorted_values, keys, values):
+    """Key of each value found in sorted_values by binary search, MISSING_KEY where absent."""
+    if len(sorted_values) == 0:
+        return np.full(len(values), MISSING_KEY, dtype=keys.dtype)
+    positions = np.searchsorted(sorted_values, values).clip(max=len(sorted_values) - 1)
+    return np.where(sorted_values[positions] == values, keys[positions], MISSING_KEY).astype(keys.dtype)
+
+
+def _zip_codes(values):
+    """Zip codes as integers; blanks, '?' and other non-numeric entries become -1."""
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+
+
+def _by_category(series, lookup):
+    """Apply lookup to the distinct values of series only and map the rows through their category codes."""
+    values = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype("category")
+    category_keys = lookup(values.cat.categories.to_numpy())
+    row_codes = values.cat.codes.to_numpy()
+    keys = np.full(len(row_codes), MISSING_KEY, dtype=category_keys.dtype)
+    present = row_codes >= 0
+    keys[present] = category_keys[row_codes[present]]
+    return keys
+
+
+def state_column(columns):
+    return next((col for col in STATE_COLUMNS if col in columns), None)
+
+
+class GeoIndex:
+    """Sorted state / county / zip lookup arrays with stable keys and the parent of each key."""
+
+    def __init__(self, arrays=None):
+        arrays = arrays or {}
+        self.states = arrays.get("states", np.array([], dtype=str))            # sorted state abbreviations
+        self.state_keys = arrays.get("state_keys", np.array([], dtype=np.int16))
+        self.counties = arrays.get("counties", np.array([], dtype=str))        # sorted "STATE|county"
+        self.county_keys = arrays.get("county_keys", np.array([], dtype=np.int32))
+        self.zips = arrays.get("zips", np.array([], dtype=np.int64))            # sorted zip codes
+        self.zip_keys = arrays.get("zip_keys", np.array([], dtype=np.int32))
+        self.county_state = arrays.get("county_state", np.array([], dtype=np.int16))  # by county key
+        self.zip_county = arrays.get("zip_county", np.array([], dtype=np.int32))      # by zip key
+
+    def __repr__(self):
+        return f"GeoIndex({len(self.states)} states, {len(self.counties)} counties, {len(self.zips)} zip codes)"
+
+    @staticmethod
+    def _add(sorted_values, keys, new_values):
+        """Append keys for the values not indexed yet and re-sort; returns (values, keys, first new key)."""
+        new_values = np.setdiff1d(new_values, sorted_values)
+        first_new = len(keys)
+        values = np.concatenate([sorted_values, new_values])
+        keys = np.concatenate([keys, np.arange(first_new, first_new + len(new_values), dtype=keys.dtype)])
+        order = np.argsort(values, kind="stable")
+        return values[order], keys[order], first_new
+
+    def extend(self, places):
+        """Index the (state, county, zip, rows) combinations in places, keeping every existing key.
+
+        A zip code that spans counties is filed under the county most of its rows are in.
+        """
+        places = places[places["state"].notna() & places["county"].notna()]
+        states = places["state"].astype(str)
+        self.states, self.state_keys, _ = self._add(self.states, self.state_keys, states.unique().astype(str))
+
+        composite = (states + _SEPARATOR + places["county"].astype(str)).to_numpy(dtype=str)
+        self.counties, self.county_keys, first_new = self._add(self.counties, self.county_keys, np.unique(composite))
+        new_counties = self.labels("county")[first_new:]
+        new_states = np.array([name.split(_SEPARATOR, 1)[0] for name in new_counties], dtype=str)
+        self.county_state = np.concatenate([self.county_state, _search(self.states, self.state_keys, new_states)])
+
+        places = pd.DataFrame({"zip": _zip_codes(places["zip"].to_numpy()),
+                               "countyKey": _search(self.counties, self.county_keys, composite),
+                               "rows": places["rows"].to_numpy()})
+        rows = places[places["zip"] >= 0].groupby(["zip", "countyKey"])["rows"].sum()
+        modal_county = rows.sort_values(ascending=False, kind="stable").reset_index().drop_duplicates("zip")
+        modal_county = modal_county.set_index("zip")["countyKey"]
+        self.zips, self.zip_keys, first_new = self._add(self.zips, self.zip_keys, modal_county.index.to_numpy())
+        new_zips = self.labels("zip")[first_new:]
+        self.zip_county = np.concatenate([self.zip_county,
+                                          modal_county.loc[new_zips].to_numpy(dtype=self.zip_county.dtype)])
+        return self
+
+    def encode(self, chunk):
+        """stateKey / countyKey / zipKey for every row of chunk (MISSING_KEY where unknown).
+
+        A row with a known zip code but no known county (or a county but no state) gets them from the hierarchy.
+        """
+        state_col = state_column(chunk.columns)
+        n = len(chunk)
+        state_keys = np.full(n, MISSING_KEY, dtype=self.state_keys.dtype)
+        county_keys = np.full(n, MISSING_KEY, dtype=self.county_keys.dtype)
+        zip_keys = np.full(n, MISSING_KEY, dtype=self.zip_keys.dtype)
+
+        if state_col is not None:
+            state_keys = _by_category(chunk[state_col], lambda values: _search(
+                self.states, self.state_keys, values.astype(str)))
+            if COUNTY_COLUMN in chunk.columns:
+                # Only the distinct (state, county) pairs are joined into lookup strings
+                pairs = pd.MultiIndex.from_arrays([chunk[state_col].astype(object), chunk[COUNTY_COLUMN].astype(object)])
+                row_codes, uniques = pairs.factorize()
+                composite = np.array([f"{state}{_SEPARATOR}{county}" for state, county in uniques], dtype=str)
+                pair_keys = _search(self.counties, self.county_keys, composite)
+                county_keys = pair_keys[row_codes]
+        if ZIP_COLUMN in chunk.columns:
+            zip_keys = _by_category(chunk[ZIP_COLUMN], lambda values: _search(
+                self.zips, self.zip_keys, _zip_codes(values)))
+
+        missing = (county_keys == MISSING_KEY) & (zip_keys != MISSING_KEY)
+        county_keys[missing] = self.zip_county[zip_keys[missing]]
+        missing = (state_keys == MISSING_KEY) & (county_keys != MISSING_KEY)
+        state_keys[missing] = self.county_state[county_keys[missing]]
+        return pd.DataFrame({"stateKey": state_keys, "countyKey": county_keys, "zipKey": zip_keys},
+                            index=chunk.index)
+
+    def labels(self, level):
+        """Array indexed by key giving the value: the state, 'STATE|county' or zip code."""
+        values, keys = {"state": (self.states, self.state_keys), "county": (self.counties, self.county_keys),
+                        "zip": (self.zips, self.zip_keys)}[level]
+        labels = np.empty(len(keys), dtype=values.dtype)
+        labels[keys] = values
+        return labels
+
+    def save(self, path=GEO_INDEX):
+        np.savez(path, states=self.states, state_keys=self.state_keys, counties=self.counties,
+                 county_keys=self.county_keys, zips=self.zips, zip_keys=self.zip_keys,
+                 county_state=self.county_state, zip_county=self.zip_county)
+
+    @classmethod
+    def load(cls, path=GEO_INDEX):
+        with np.load(path) as arrays:
+            return cls({name: arrays[name] for name in arrays.files})
+
+
+def load_geo_index(path=GEO_INDEX):
+    """The saved GeoIndex, or None if it has not been built."""
+    return GeoIndex.load(path) if os.path.exists(path) else None
+
+
+def attach_geo_keys(chunk, geo_index):
+    """chunk with the stateKey / countyKey / zipKey columns added."""
+    return pd.concat([chunk, geo_index.encode(chunk)], axis=1)
+
+
+def build_geo_index(file_path=DEFAULT_INPUT, index_path=GEO_INDEX, chunk_size=100000):
+    """Add every (state, county, zip) in file_path to the index at index_path, keeping its existing keys."""
+    header = list(pd.read_csv(file_path, nrows=0).columns)
+    state_col = state_column(header)
+    if state_col is None or COUNTY_COLUMN not in header:
+        raise ValueError(f"{file_path} needs a state column ({STATE_COLUMNS}) and '{COUNTY_COLUMN}'")
+    usecols = [state_col, COUNTY_COLUMN] + ([ZIP_COLUMN] if ZIP_COLUMN in header else [])
+
+    run_log = RunLog("geo_index")
+    stage = run_log.stage("geo_index", input_path=file_path, output_path=index_path)
+    places = None
+    for chunk in stage.timed_chunks(read_chunks(file_path, chunk_size, usecols=usecols,
+                                                dtype={col: "category" for col in usecols})):
+        counts = chunk.groupby(usecols, observed=True, sort=False, dropna=False).size()
+        places = counts if places is None else places.add(counts, fill_value=0)
+        stage.lap("transform")
+        stage.end_chunk(chunk)
+
+    places = places.rename("rows").reset_index()
+    places.columns = ["state", "county"] + (["zip"] if ZIP_COLUMN in header else []) + ["rows"]
+    if "zip" not in places.columns:
+        places["zip"] = -1
+    geo_index = load_geo_index(index_path) or GeoIndex()
+    with stage.phase("write"):
+        geo_index.extend(places).save(index_path)
+    stage.finish()
+    run_log.save()
+    print(f"Saved {geo_index} to {index_path}")
+    return geo_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the zip -> county -> state key index.")
+    parser.add_argument("input", nargs="?", default=DEFAULT_INPUT, help="Cleaned or enriched IHP-VR CSV")
+    parser.add_argument("--index", default=GEO_INDEX)
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    args = parser.parse_args()
+    build_geo_index(args.input, args.index, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
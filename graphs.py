@@ -1,80 +1,91 @@
 # Re-import necessary libraries after execution state reset
+import argparse
+import re
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-# Simulating dataset since the uploaded file was lost in the reset
-np.random.seed(42)
-size = 500
+from factorstats import ALL_ROWS, ELIGIBILITY_FACTORS, FactorAccumulator, stream_factor_stats
+from rollup import eligibility_rates, load_rollup
+
+parser = argparse.ArgumentParser(description="Charts of the factors behind IHP amount and eligibility.")
+parser.add_argument("input", nargs="?", help="Enriched IHP-VR CSV (e.g. ihp_vr_enriched.csv); simulated data if omitted")
+parser.add_argument("--by-incident", action="store_true", help="Also chart each incidentType separately")
+parser.add_argument("--chunk-size", type=int, default=100000)
+parser.add_argument("--rollups", help="Directory written by rollup.py; eligibility rates are read from its tables")
+args = parser.parse_args()
 
-df = pd.DataFrame({
-    "replacementAmount": np.random.randint(1000, 20000, size),
-    "replacementAssistanceEligible": np.random.choice([0, 1], size),
-    "rentalAssistanceAmount": np.random.randint(500, 15000, size),
-    "personalPropertyAmount": np.random.randint(0, 10000, size),
-    "ppfvl": np.random.randint(0, 5, size),
-    "rentalAssistanceEligible": np.random.choice([0, 1], size),
-    "rpfvl": np.random.randint(0, 5, size),
-    "destroyed": np.random.choice([0, 1], size),
-    "repairAmount": np.random.randint(500, 25000, size),
-    "personalPropertyEligible": np.random.choice([0, 1], size),
-    "ihpAmount": np.random.randint(500, 30000, size),
-    "ihpEligible": np.random.choice([0, 1], size)
-})
+rollup = None
+if args.rollups:
+    rollup = load_rollup("disaster", args.rollups)
+    if rollup is None:
+        parser.error(f"No rollup tables in '{args.rollups}'; run 'python rollup.py' first")
 
-# Calculate Correlations with IHP Amount
-correlation_factors = [
-    "replacementAmount", "replacementAssistanceEligible", "rentalAssistanceAmount",
-    "personalPropertyAmount", "ppfvl", "rentalAssistanceEligible", "rpfvl",
-    "destroyed", "repairAmount", "personalPropertyEligible"
-]
+if args.input:
+    # Real data: one streaming pass accumulates the correlations and eligibility counts
+    # (with --rollups only the correlations need the pass)
+    stats = stream_factor_stats(args.input, args.chunk_size, by_incident=args.by_incident,
+                                eligibility_factors=[] if rollup is not None else ELIGIBILITY_FACTORS)
+else:
+    # Simulating dataset since the uploaded file was lost in the reset
+    np.random.seed(42)
+    size = 500
 
-correlation_values = df[correlation_factors].corrwith(df["ihpAmount"]).sort_values(ascending=False)
+    df = pd.DataFrame({
+        "replacementAmount": np.random.randint(1000, 20000, size),
+        "replacementAssistanceEligible": np.random.choice([0, 1], size),
+        "rentalAssistanceAmount": np.random.randint(500, 15000, size),
+        "personalPropertyAmount": np.random.randint(0, 10000, size),
+        "ppfvl": np.random.randint(0, 5, size),
+        "rentalAssistanceEligible": np.random.choice([0, 1], size),
+        "rpfvl": np.random.randint(0, 5, size),
+        "destroyed": np.random.choice([0, 1], size),
+        "repairAmount": np.random.randint(500, 25000, size),
+        "personalPropertyEligible": np.random.choice([0, 1], size),
+        "ihpAmount": np.random.randint(500, 30000, size),
+        "ihpEligible": np.random.choice([0, 1], size)
+    })
+    stats = FactorAccumulator().update(df)
 
-# Plot Correlation Chart
-plt.figure(figsize=(10, 6))
-sns.barplot(y=correlation_values.index, x=correlation_values.values, palette="coolwarm")
-plt.xlabel("Correlation with IHP Amount")
-plt.ylabel("Factors")
-plt.title("Factors Correlated with IHP Amount")
-plt.grid(axis="x", linestyle="--", alpha=0.7)
+for group in stats.groups():
+    suffix = "" if group == ALL_ROWS else "_" + re.sub(r'[^a-zA-Z0-9]', '_', group)
+    title_suffix = "" if group == ALL_ROWS else f" ({group})"
 
-# Save the correlation graph
-correlation_graph_path = "correlation_with_ihp_amount.png"
-plt.savefig(correlation_graph_path)
-plt.show()
+    # Calculate Correlations with IHP Amount
+    correlation_values = stats.correlations(group)
 
-# Eligibility Factors: Calculate the percentage of people receiving IHP when eligible
-eligibility_factors = [
-    "ihpEligible", "personalPropertyEligible", "rentalAssistanceEligible",
-    "repairAssistanceEligible", "replacementAssistanceEligible", "destroyed"
-]
+    # Plot Correlation Chart
+    plt.figure(figsize=(10, 6))
+    sns.barplot(y=correlation_values.index, x=correlation_values.values, palette="coolwarm")
+    plt.xlabel("Correlation with IHP Amount")
+    plt.ylabel("Factors")
+    plt.title("Factors Correlated with IHP Amount" + title_suffix)
+    plt.grid(axis="x", linestyle="--", alpha=0.7)
 
-eligibility_data = []
-for factor in eligibility_factors:
-    eligible_cases = df[df[factor] == 1]
-    non_eligible_cases = df[df[factor] == 0]
-    
-    percentage_eligible = (eligible_cases["ihpAmount"] > 0).mean() * 100
-    percentage_non_eligible = (non_eligible_cases["ihpAmount"] > 0).mean() * 100
-    
-    eligibility_data.append([factor, percentage_eligible, percentage_non_eligible])
+    # Save the correlation graph
+    correlation_graph_path = f"correlation_with_ihp_amount{suffix}.png"
+    plt.savefig(correlation_graph_path)
+    plt.show()
 
-eligibility_df = pd.DataFrame(eligibility_data, columns=["Factor", "Eligible", "Non-Eligible"])
+    # Eligibility Factors: Calculate the percentage of people receiving IHP when eligible
+    if rollup is not None:
+        eligibility_df = eligibility_rates(rollup if group == ALL_ROWS else rollup[rollup["incidentType"] == group])
+    else:
+        eligibility_df = stats.eligibility_rates(group)
 
-# Plot Eligibility Factor Influence
-fig, ax = plt.subplots(figsize=(10, 6))
-eligibility_df.set_index("Factor")[["Eligible", "Non-Eligible"]].plot(kind="barh", ax=ax, color=["blue", "red"])
-plt.xlabel("Percentage Receiving IHP")
-plt.ylabel("Factors")
-plt.title("IHP Eligibility by Factor")
-plt.grid(axis="x", linestyle="--", alpha=0.7)
+    # Plot Eligibility Factor Influence
+    fig, ax = plt.subplots(figsize=(10, 6))
+    eligibility_df.set_index("Factor")[["Eligible", "Non-Eligible"]].plot(kind="barh", ax=ax, color=["blue", "red"])
+    plt.xlabel("Percentage Receiving IHP")
+    plt.ylabel("Factors")
+    plt.title("IHP Eligibility by Factor" + title_suffix)
+    plt.grid(axis="x", linestyle="--", alpha=0.7)
 
-# Save the eligibility graph
-eligibility_graph_path = "ihp_eligibility_factors.png"
-plt.savefig(eligibility_graph_path)
-plt.show()
+    # Save the eligibility graph
+    eligibility_graph_path = f"ihp_eligibility_factors{suffix}.png"
+    plt.savefig(eligibility_graph_path)
+    plt.show()
 
-# Return paths to download the images
-correlation_graph_path, eligibility_graph_path
+    print(f"Saved {correlation_graph_path} and {eligibility_graph_path}")
@@ -0,0 +1,215 @@
+# Index-backed query layer over the enriched IHP-VR data.
+# build_database() loads the enriched CSV once into a SQLite file with indexes on disasterNumber,
+# incidentType, state, county and declarationDate; query() then pushes the filters and the column
+# list down to SQLite, so questions like "ihpAmount for Fire in CA in 2021" read only matching rows.
+# DuckDB would be the columnar choice, but sqlite3 ships with Python and needs no extra install.
+import argparse
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import pandas as pd
+
+from chunkio import read_chunks
+from schema import dtypes_for
+
+TABLE = "registrations"
+DEFAULT_DB = "ihp_vr.sqlite"
+DATE_COLUMN = "declarationDate"
+# The declarations summaries call it 'state'; IHP-VR itself only has damagedStateAbbreviation
+STATE_COLUMNS = ["state", "damagedStateAbbreviation"]
+INDEXED_COLUMNS = ["disasterNumber", "incidentType", "county", DATE_COLUMN]
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def connect(db_path=DEFAULT_DB):
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"No query database at '{db_path}'; run 'python ihpquery.py build <csv>' first")
+    return sqlite3.connect(db_path)
+
+
+def _table_columns(conn):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({TABLE})")]
+
+
+def _state_column(columns):
+    return next((col for col in STATE_COLUMNS if col in columns), None)
+
+
+def _state_filter_column(columns):
+    col = _state_column(columns)
+    if col is None:
+        raise ValueError(f"A state filter needs one of the columns {STATE_COLUMNS}")
+    return col
+
+
+def build_database(csv_path, db_path=DEFAULT_DB, chunk_size=100000):
+    """Load csv_path into db_path (replacing it) and index the filter columns; returns the row count."""
+    start_time = time.time()
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    # A one-off bulk load: no journal, no fsync per transaction
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+
+    # SQLite stores REAL as float64; parsing amounts as float32 first would store 618.23999 for 618.24
+    dtypes = {col: "float64" if dtype == "float32" else dtype for col, dtype in dtypes_for(csv_path, cleaned=True).items()}
+    total_rows = 0
+    for chunk in read_chunks(csv_path, chunk_size, dtype=dtypes):
+        # Category columns go in as their string values
+        for col in chunk.select_dtypes(include="category").columns:
+            chunk[col] = chunk[col].astype(object)
+        if DATE_COLUMN in chunk.columns:
+            # ISO text sorts chronologically, so range filters work on the string column; a missing date
+            # stays NULL, which every range comparison skips, instead of the text 'nan'
+            chunk[DATE_COLUMN] = chunk[DATE_COLUMN].astype(str).where(chunk[DATE_COLUMN].notna())
+        chunk.to_sql(TABLE, conn, if_exists="append", index=False)
+        total_rows += len(chunk)
+        print(f"Loaded {total_rows:,} rows", end="\r")
+    print()
+
+    # Indexes are built after the load, which is much faster than maintaining them per insert
+    columns = _table_columns(conn)
+    for col in INDEXED_COLUMNS + [_state_column(columns)]:
+        if col in columns:
+            conn.execute(f"CREATE INDEX {_quote('idx_' + col)} ON {TABLE} ({_quote(col)})")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    print(f"Query database saved to '{db_path}' in {(time.time() - start_time)/60:.2f} minutes")
+    return total_rows
+
+
+def _in_clause(column, values, clauses, params):
+    values = [values] if isinstance(values, (str, int)) else list(values)
+    clauses.append(f"{_quote(column)} IN ({', '.join('?' * len(values))})")
+    params.extend(values)
+
+
+def query(db_path=DEFAULT_DB, columns=None, incident_type=None, state=None, county=None, disaster_number=None,
+          start_date=None, end_date=None, year=None, order_by=None, limit=None):
+    """Rows matching the filters as a DataFrame.
+
+    incident_type, state, county and disaster_number take one value or a list. start_date is
+    inclusive and end_date exclusive ('YYYY-MM-DD'); year is a shortcut for one calendar year.
+    """
+    with closing(connect(db_path)) as conn:
+        table_columns = _table_columns(conn)
+        clauses, params = [], []
+        if incident_type is not None:
+            _in_clause("incidentType", incident_type, clauses, params)
+        if state is not None:
+            _in_clause(_state_filter_column(table_columns), state, clauses, params)
+        if county is not None:
+            _in_clause("county", county, clauses, params)
+        if disaster_number is not None:
+            _in_clause("disasterNumber", disaster_number, clauses, params)
+        if year is not None:
+            start_date, end_date = f"{int(year)}-01-01", f"{int(year) + 1}-01-01"
+        if start_date is not None:
+            clauses.append(f"{_quote(DATE_COLUMN)} >= ?")
+            params.append(str(start_date))
+        if end_date is not None:
+            clauses.append(f"{_quote(DATE_COLUMN)} < ?")
+            params.append(str(end_date))
+
+        missing = [col for col in (columns or []) if col not in table_columns]
+        if missing:
+            raise ValueError(f"Unknown columns: {missing}")
+        select = ", ".join(_quote(col) for col in columns) if columns else "*"
+        statement = f"SELECT {select} FROM {TABLE}"
+        if clauses:
+            statement += " WHERE " + " AND ".join(clauses)
+        if order_by:
+            statement += f" ORDER BY {_quote(order_by)}"
+        if limit:
+            statement += f" LIMIT {int(limit)}"
+        df = pd.read_sql_query(statement, conn, params=params)
+
+    if DATE_COLUMN in df.columns:
+        df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN], utc=True, format="ISO8601", errors="coerce").dt.tz_localize(None)
+    return df
+
+
+def filter_frame(df, incident_type=None, state=None, county=None, disaster_number=None, start_date=None,
+                 end_date=None, year=None):
+    """query()'s filters applied to rows already read from a CSV, with the same meaning."""
+    mask = pd.Series(True, index=df.index)
+    for col, values in (("incidentType", incident_type), ("state", state), ("county", county),
+                        ("disasterNumber", disaster_number)):
+        if values is not None:
+            if col == "state":
+                col = _state_filter_column(df.columns)
+            mask &= df[col].isin([values] if isinstance(values, (str, int)) else list(values))
+    if year is not None:
+        start_date, end_date = f"{int(year)}-01-01", f"{int(year) + 1}-01-01"
+    if start_date is not None or end_date is not None:
+        dates = pd.to_datetime(df[DATE_COLUMN], utc=True, format="ISO8601", errors="coerce").dt.tz_localize(None)
+        if start_date is not None:
+            mask &= dates >= pd.Timestamp(start_date)
+        if end_date is not None:
+            mask &= dates < pd.Timestamp(end_date)
+    return df if mask.all() else df[mask]
+
+
+def sql(text, db_path=DEFAULT_DB, params=()):
+    """Run an arbitrary read query, e.g. an aggregate, against the registrations table."""
+    with closing(connect(db_path)) as conn:
+        return pd.read_sql_query(text, conn, params=params)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the indexed IHP-VR database.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Load an enriched IHP-VR CSV into the query database")
+    build.add_argument("csv_path")
+    build.add_argument("--db", default=DEFAULT_DB)
+    build.add_argument("--chunk-size", type=int, default=100000)
+
+    ask = subparsers.add_parser("query", help="Filter rows; prints them or writes --output")
+    ask.add_argument("--db", default=DEFAULT_DB)
+    ask.add_argument("--columns", nargs="+")
+    ask.add_argument("--incident-type", nargs="+")
+    ask.add_argument("--state", nargs="+")
+    ask.add_argument("--county", nargs="+")
+    ask.add_argument("--disaster-number", nargs="+", type=int)
+    ask.add_argument("--start-date")
+    ask.add_argument("--end-date")
+    ask.add_argument("--year", type=int)
+    ask.add_argument("--order-by")
+    ask.add_argument("--limit", type=int)
+    ask.add_argument("--describe", action="store_true", help="Print summary statistics instead of rows")
+    ask.add_argument("--output", help="Write the result to this CSV")
+
+    raw = subparsers.add_parser("sql", help="Run a SQL statement against the registrations table")
+    raw.add_argument("statement")
+    raw.add_argument("--db", default=DEFAULT_DB)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        build_database(args.csv_path, args.db, args.chunk_size)
+        return
+    if args.command == "sql":
+        print(sql(args.statement, args.db).to_string(index=False))
+        return
+
+    result = query(args.db, args.columns, args.incident_type, args.state, args.county, args.disaster_number,
+                   args.start_date, args.end_date, args.year, args.order_by, args.limit)
+    if args.output:
+        result.to_csv(args.output, index=False)
+        print(f"{len(result):,} rows saved to '{args.output}'")
+    elif args.describe:
+        print(result.describe(include="all").to_string())
+    else:
+        print(result.to_string(index=False, max_rows=50))
+        print(f"{len(result):,} rows")
+
+
+if __name__ == "__main__":
+    main()
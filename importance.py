@@ -0,0 +1,158 @@
+# Permutation importance of the IHP amount factors for the zeroR.py tree and forest.
+# graphs.py ranks factors by their linear correlation with ihpAmount; this asks the fitted models
+# instead. Each factor's holdout columns (all one-hot columns of a categorical factor together) are
+# shuffled and the rise in mean absolute error over the unshuffled holdout is its importance,
+# averaged over n_repeats shuffles. Factors are split across worker processes; joblib memory-maps
+# the holdout matrix into the workers read-only instead of copying it into each one. Only the
+# scoring.py features are factors, and the models are fitted on them alone: with haAmount and
+# onaAmount in the matrix (ihpAmount is largely their sum) the ranking would only say that.
+# The fitted models are cached in the ModelStore, so they are only fitted once.
+import argparse
+import os
+import re
+import time
+import warnings
+
+import joblib
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error
+from sklearn.tree import DecisionTreeRegressor
+
+from modelstore import ModelStore
+from schema import read_header
+from scoring import is_feature
+from tuning import TARGET, load_best_params, load_training_data
+
+MODELS = ["Random Tree", "Random Forest"]
+
+
+def build_model(csv_path, model_name):
+    """The estimator zeroR.py fits for model_name, with any hyperparameters saved by tuning.py."""
+    if model_name == "Random Tree":
+        return DecisionTreeRegressor(random_state=42, **load_best_params(csv_path, "Random Tree"))
+    forest_params = {"n_estimators": 100, **load_best_params(csv_path, "Random Forest")}
+    return RandomForestRegressor(random_state=42, **forest_params)
+
+
+def factor_groups(factors, columns):
+    """{factor: positions of its columns in the get_dummies() matrix}, in factor order."""
+    positions = {col: i for i, col in enumerate(columns)}
+    groups = {factor: [positions[factor]] for factor in factors if factor in positions}
+    # Longest names first, so a factor whose name prefixes another's never claims its dummies
+    assigned = set(groups)
+    for factor in sorted((f for f in factors if f not in positions), key=len, reverse=True):
+        dummies = [col for col in columns if col.startswith(factor + "_") and col not in assigned]
+        if dummies:
+            groups[factor] = [positions[col] for col in dummies]
+            assigned.update(dummies)
+    return {factor: groups[factor] for factor in factors if factor in groups}
+
+
+def _permuted_errors(model, X, y, groups, n_repeats, seed):
+    """MAE after shuffling each group's columns n_repeats times; runs in a worker process."""
+    # X arrives as a read-only memory map; the worker shuffles its own copy one group at a time
+    X_work = np.array(X)
+    errors = {}
+    with warnings.catch_warnings():
+        # The models were fitted on DataFrames; the matrix has the same columns without the names
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        for index, factor, columns in groups:
+            rng = np.random.default_rng([seed, index])  # Same shuffles however factors are split across workers
+            original = X_work[:, columns].copy()
+            scores = []
+            for _ in range(n_repeats):
+                X_work[:, columns] = original[rng.permutation(len(original))]
+                scores.append(mean_absolute_error(y, model.predict(X_work)))
+            X_work[:, columns] = original
+            errors[factor] = scores
+    return errors
+
+
+def permutation_importance(model, X_test, y_test, groups, n_repeats=5, n_jobs=-1, seed=42):
+    """Mean and std rise in MAE per factor, highest first."""
+    X = X_test.to_numpy(dtype=np.float32)
+    y = np.asarray(y_test, dtype=np.float64)
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        baseline = mean_absolute_error(y, model.predict(X))
+
+    tasks = [(index, factor, columns) for index, (factor, columns) in enumerate(groups.items())]
+    n_workers = min(joblib.effective_n_jobs(n_jobs), len(tasks))
+    # One batch per worker, so each worker unpickles the model once
+    batches = [tasks[i::n_workers] for i in range(n_workers)]
+    results = joblib.Parallel(n_jobs=n_workers, mmap_mode="r")(
+        joblib.delayed(_permuted_errors)(model, X, y, batch, n_repeats, seed) for batch in batches)
+
+    errors = {factor: scores for batch in results for factor, scores in batch.items()}
+    rows = [[factor, np.mean(scores) - baseline, np.std(scores)] for factor, scores in errors.items()]
+    importance = pd.DataFrame(rows, columns=["Factor", "importance", "std"]).set_index("Factor")
+    importance.attrs["baseline_mae"] = baseline
+    return importance.sort_values("importance", ascending=False)
+
+
+def plot_importance(importance, model_name, csv_path, top=20):
+    """Ranked bar chart of the top factors, drawn like graphs.py's correlation chart."""
+    shown = importance.head(top)
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    plt.figure(figsize=(10, 6))
+    sns.barplot(y=shown.index, x=shown["importance"].values, hue=shown.index, palette="coolwarm", legend=False)
+    plt.errorbar(shown["importance"].values, np.arange(len(shown)), xerr=shown["std"].values, fmt="none",
+                 ecolor="black", capsize=3)
+    plt.xlabel("Increase in MAE When Shuffled ($)")
+    plt.ylabel("Factors")
+    plt.title(f"Factors Driving IHP Amount ({model_name}, {name})")
+    plt.grid(axis="x", linestyle="--", alpha=0.7)
+    plt.tight_layout()
+
+    graph_path = f"permutation_importance_{name}_{re.sub(r'[^a-zA-Z0-9]', '_', model_name)}.png"
+    plt.savefig(graph_path)
+    plt.show()
+    return graph_path
+
+
+def factor_importance(csv_path, models=MODELS, n_repeats=5, n_jobs=-1, seed=42, top=20, model_store=None):
+    """Permutation importance on the zeroR.py holdout for each model; returns {model name: DataFrame}."""
+    model_store = model_store or ModelStore()
+    X_train, X_test, y_train, y_test = load_training_data(csv_path, TARGET)
+    factors = [col for col in read_header(csv_path) if col != TARGET and is_feature(col)]
+    feature_columns = [X_test.columns[i] for columns in factor_groups(factors, list(X_test.columns)).values()
+                       for i in columns]
+    X_train, X_test = X_train[feature_columns], X_test[feature_columns]
+    groups = factor_groups(factors, feature_columns)
+    print(f"{csv_path}: {len(groups)} factors, {len(X_test):,} holdout rows")
+
+    results = {}
+    for model_name in models:
+        model, _ = model_store.fit_predict(build_model(csv_path, model_name), X_train, y_train, X_test)
+        start_time = time.time()
+        importance = permutation_importance(model, X_test, y_test, groups, n_repeats, n_jobs, seed)
+        print(f"{model_name}: baseline MAE {importance.attrs['baseline_mae']:.2f}, "
+              f"{len(groups) * n_repeats} shuffles in {time.time() - start_time:.2f}s")
+        print(importance.head(top))
+        graph_path = plot_importance(importance, model_name, csv_path, top)
+        print(f"Saved chart to {graph_path}")
+        results[model_name] = importance
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Permutation importance of the factors behind IHP amount.")
+    parser.add_argument("csv_paths", nargs="+", help="Incident files, e.g. Fire.csv Other.csv")
+    parser.add_argument("--models", nargs="+", choices=MODELS, default=MODELS)
+    parser.add_argument("--repeats", type=int, default=5, help="Shuffles per factor")
+    parser.add_argument("--jobs", type=int, default=-1, help="Worker processes (-1 = all cores)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--top", type=int, default=20, help="Factors shown in the chart")
+    args = parser.parse_args()
+
+    model_store = ModelStore()
+    for csv_path in args.csv_paths:
+        factor_importance(csv_path, args.models, args.repeats, args.jobs, args.seed, args.top, model_store)
+
+
+if __name__ == "__main__":
+    main()
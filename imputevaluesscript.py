@@ -1,4 +1,8 @@
 import pandas as pd
+from chunkio import ChunkWriter, read_chunks
+from cleaning import compute_categorical_modes, impute
+from instrumentation import RunLog
+from schema import dtypes_for
 
 # File paths
 input_file_path = "Cleaned IHPVR Disaster Summaries.csv"  # Update with actual file path
@@ -13,35 +17,42 @@ categorical_cols = ["applicantAge", "homeOwnersInsurance", "floodInsurance", "re
 # List of numerical columns where '0' might indicate missing values
 numerical_cols = ["floodDamageAmount", "foundationDamageAmount", "roofDamageAmount"]
 
-# First pass: Calculate the mode for categorical columns
-categorical_modes = {}
-
-for chunk in pd.read_csv(input_file_path, chunksize=chunk_size):
-    for col in categorical_cols:
-        if col in chunk.columns:
-            mode_value = chunk[col][chunk[col] != "Unknown"].mode()
-            if not mode_value.empty:
-                categorical_modes[col] = mode_value[0]  # Store mode
-
-# Second pass: Process dataset in chunks and apply transformations
-with pd.read_csv(input_file_path, chunksize=chunk_size) as reader:
-    for i, chunk in enumerate(reader):
-        # Replace 'Unknown' with precomputed most frequent category
-        for col in categorical_cols:
-            if col in chunk.columns and col in categorical_modes:
-                chunk[col] = chunk[col].replace("Unknown", categorical_modes[col])
-
-        # Replace 0 values in numerical columns with median values (computed per chunk)
-        for col in numerical_cols:
-            if col in chunk.columns:
-                median_value = chunk[col].median()
-                chunk[col] = chunk[col].replace(0, median_value)
-
-        # Save processed chunk (append after the first write)
-        chunk.to_csv(output_file_path, mode='a', header=(i == 0), index=False)
-
-# Display the first few rows of the cleaned dataset
-import ace_tools as tools
-tools.display_dataframe_to_user(name="Chunk Processed FEMA Dataset", dataframe=pd.read_csv(output_file_path, nrows=100))
-
-print(f"Download your cleaned dataset here: {output_file_path}")
+def impute_file(input_file_path=input_file_path, output_file_path=output_file_path, chunk_size=chunk_size,
+                categorical_cols=categorical_cols, numerical_cols=numerical_cols):
+    """Write input_file_path to output_file_path with the 'Unknown' and 0 values imputed."""
+    # Compact dtypes from the shared schema (flags may hold 'Unknown' in the cleaned file)
+    input_dtypes = dtypes_for(input_file_path, cleaned=True)
+
+    run_log = RunLog("imputevaluesscript")
+
+    # First pass: Calculate the mode for categorical columns over the whole file (only these columns are parsed)
+    mode_stage = run_log.stage("mode_prepass", input_path=input_file_path)
+    categorical_modes = compute_categorical_modes(input_file_path, chunk_size, categorical_cols, dtype=input_dtypes)
+    mode_stage.finish()
+
+    # Second pass: Process dataset in chunks and apply transformations
+    stage = run_log.stage("impute", input_path=input_file_path, output_path=output_file_path)
+    with ChunkWriter(output_file_path) as writer:
+        for chunk in stage.timed_chunks(read_chunks(input_file_path, chunk_size, dtype=input_dtypes)):
+            # Replace 'Unknown' with precomputed most frequent category and
+            # 0 values in numerical columns with median values (computed per chunk)
+            chunk = impute(chunk, categorical_modes, numerical_cols)
+            stage.lap("transform")
+
+            # Save processed chunk (written on the writer thread, header with the first chunk)
+            writer.write(chunk)
+            stage.lap("write")
+            stage.end_chunk(chunk)
+    stage.finish(writers=[writer])
+    run_log.save()
+    return output_file_path
+
+
+if __name__ == "__main__":
+    impute_file()
+
+    # Display the first few rows of the cleaned dataset
+    import ace_tools as tools
+    tools.display_dataframe_to_user(name="Chunk Processed FEMA Dataset", dataframe=pd.read_csv(output_file_path, nrows=100))
+
+    print(f"Download your cleaned dataset here: {output_file_path}")
@@ -0,0 +1,189 @@
+# Per-stage and per-chunk timing / memory instrumentation for the pipeline scripts.
+# A RunLog collects one StageStats per stage; each stage splits its time into parse (waiting on the
+# reader), transform, write and gc, and records rows/sec, bytes and peak RSS. save() writes the run
+# summary as JSON and the per-chunk rows as CSV under run_logs/ so runs can be compared.
+import csv
+import gc
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RUN_LOG_DIR = "run_logs"
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, or None if the platform can't tell us."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    memory = psutil.Process().memory_info()
+    return getattr(memory, "peak_wset", memory.rss)
+
+
+def current_rss_bytes():
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _file_size(path):
+    return os.path.getsize(path) if path and os.path.exists(path) else None
+
+
+class StageStats:
+    """Timing and memory for one pipeline stage, broken down per chunk."""
+
+    def __init__(self, name, input_path=None, output_path=None):
+        self.name = name
+        self.input_path = input_path
+        self.output_path = output_path
+        self.chunks = []
+        self.totals = {"parse": 0.0, "transform": 0.0, "write": 0.0, "gc": 0.0}
+        self.rows = 0
+        self.bytes_in_memory = 0
+        self.start_time = time.perf_counter()
+        self.elapsed = None
+        self.writer_seconds = None
+        self._current = self._new_chunk()
+        self._lap_start = time.perf_counter()
+
+    def _new_chunk(self):
+        return {"parse": 0.0, "transform": 0.0, "write": 0.0, "gc": 0.0}
+
+    def _add(self, phase, seconds):
+        self._current[phase] += seconds
+        self.totals[phase] += seconds
+
+    def timed_chunks(self, chunks):
+        """Wrap a chunk iterator; the time spent waiting for each chunk is recorded as parse time."""
+        iterator = iter(chunks)
+        while True:
+            started = time.perf_counter()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                self._add("parse", time.perf_counter() - started)
+                return
+            self._add("parse", time.perf_counter() - started)
+            self._lap_start = time.perf_counter()
+            yield chunk
+
+    @contextmanager
+    def phase(self, phase):
+        """Time a block as 'transform' or 'write' for the current chunk."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(phase, time.perf_counter() - started)
+
+    def lap(self, phase):
+        """Charge the time since the chunk arrived (or the previous lap) to phase."""
+        now = time.perf_counter()
+        self._add(phase, now - self._lap_start)
+        self._lap_start = now
+
+    def end_chunk(self, chunk, collect_garbage=False):
+        """Close the current chunk's record; optionally run (and time) gc.collect()."""
+        if collect_garbage:
+            started = time.perf_counter()
+            gc.collect()
+            self._add("gc", time.perf_counter() - started)
+
+        rows = len(chunk)
+        chunk_bytes = int(chunk.memory_usage(deep=False).sum())
+        self.rows += rows
+        self.bytes_in_memory += chunk_bytes
+        record = {"stage": self.name, "chunk": len(self.chunks) + 1, "rows": rows, "chunk_bytes": chunk_bytes}
+        record.update({f"{phase}_seconds": round(seconds, 6) for phase, seconds in self._current.items()})
+        record["rss_bytes"] = current_rss_bytes()
+        self.chunks.append(record)
+        self._current = self._new_chunk()
+        return record
+
+    def finish(self, writers=()):
+        """Stop the stage clock; writers are ChunkWriters whose background busy time is reported too."""
+        self.elapsed = time.perf_counter() - self.start_time
+        if writers:
+            self.writer_seconds = sum(writer.busy_seconds for writer in writers)
+        return self.summary()
+
+    def summary(self):
+        elapsed = self.elapsed if self.elapsed is not None else time.perf_counter() - self.start_time
+        return {
+            "stage": self.name,
+            "chunks": len(self.chunks),
+            "rows": self.rows,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(self.rows / elapsed, 1) if elapsed > 0 else None,
+            "bytes_read": _file_size(self.input_path),
+            "bytes_written": _file_size(self.output_path),
+            "bytes_in_memory": self.bytes_in_memory,
+            **{f"{phase}_seconds": round(seconds, 3) for phase, seconds in self.totals.items()},
+            "writer_thread_seconds": round(self.writer_seconds, 3) if self.writer_seconds is not None else None,
+            "peak_rss_bytes": peak_rss_bytes(),
+        }
+
+
+class RunLog:
+    """Collects the stages of one script run and writes them to run_logs/."""
+
+    def __init__(self, run_name, log_dir=RUN_LOG_DIR):
+        self.run_name = run_name
+        self.log_dir = log_dir
+        self.started_at = datetime.now()
+        self.stages = []
+
+    def stage(self, name, input_path=None, output_path=None):
+        stats = StageStats(name, input_path, output_path)
+        self.stages.append(stats)
+        return stats
+
+    def save(self):
+        """Write <run>_<timestamp>.json (summary) and .csv (per chunk); returns the JSON path."""
+        os.makedirs(self.log_dir, exist_ok=True)
+        base = os.path.join(self.log_dir, f"{self.run_name}_{self.started_at:%Y%m%d_%H%M%S}")
+
+        summary = {
+            "run": self.run_name,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "stages": [stats.summary() for stats in self.stages],
+        }
+        with open(base + ".json", "w") as f:
+            json.dump(summary, f, indent=2)
+
+        rows = [record for stats in self.stages for record in stats.chunks]
+        if rows:
+            with open(base + ".csv", "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+                writer.writeheader()
+                writer.writerows(rows)
+
+        for stage_summary in summary["stages"]:
+            print(f"[{self.run_name}] {stage_summary['stage']}: {stage_summary['rows']:,} rows in "
+                  f"{stage_summary['elapsed_seconds']}s ({stage_summary['rows_per_second']} rows/s); "
+                  f"parse {stage_summary['parse_seconds']}s, transform {stage_summary['transform_seconds']}s, "
+                  f"write {stage_summary['write_seconds']}s, gc {stage_summary['gc_seconds']}s")
+        print(f"Run log saved to {base}.json")
+        return base + ".json"
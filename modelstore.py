@@ -0,0 +1,123 @@
+# Cache of fitted models and their test-set predictions for zeroR.py and visualizeData.py.
+# An entry is keyed on the content hash of the training and test data, the feature schema (column
+# names and dtypes) and the estimator's class and hyperparameters, so a rerun on unchanged data
+# loads the fitted forest instead of retraining it. Entries are joblib files with zlib compression;
+# when the cache grows past max_bytes the least recently used entries are deleted.
+import hashlib
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+MODEL_DIR = "model_cache"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+COMPRESSION = 3  # joblib zlib level: forests shrink several times over at little load cost
+# Parameters that change how a model is fitted but not the fitted model itself
+_IGNORED_PARAMS = {"n_jobs", "verbose"}
+
+
+def data_hash(*frames):
+    """Hash of the values, index and column names of each DataFrame / Series / array."""
+    digest = hashlib.blake2b(digest_size=16)
+    for frame in frames:
+        if isinstance(frame, (pd.DataFrame, pd.Series)):
+            digest.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+            names = list(frame.columns) if isinstance(frame, pd.DataFrame) else [frame.name]
+            digest.update(json.dumps([str(name) for name in names]).encode())
+        else:
+            digest.update(np.ascontiguousarray(frame).tobytes())
+    return digest.hexdigest()
+
+
+def feature_schema(X):
+    return [[str(col), str(dtype)] for col, dtype in X.dtypes.items()]
+
+
+def model_params(estimator):
+    params = estimator.get_params(deep=True)
+    return {name: repr(value) for name, value in sorted(params.items()) if name not in _IGNORED_PARAMS}
+
+
+class ModelStore:
+    """Fitted estimators and their predictions on disk, evicted least-recently-used past max_bytes."""
+
+    def __init__(self, directory=MODEL_DIR, max_bytes=DEFAULT_MAX_BYTES, compress=COMPRESSION):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, estimator, X_train, y_train, X_test):
+        description = {
+            "estimator": f"{type(estimator).__module__}.{type(estimator).__qualname__}",
+            "params": model_params(estimator),
+            "schema": feature_schema(X_train),
+            "train": data_hash(X_train, y_train),
+            "test": data_hash(X_test),
+        }
+        return hashlib.blake2b(json.dumps(description, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.joblib")
+
+    def fit_predict(self, estimator, X_train, y_train, X_test):
+        """(fitted estimator, predictions on X_test), loaded from the cache or fitted and then cached."""
+        path = self._path(self.key(estimator, X_train, y_train, X_test))
+        if os.path.exists(path):
+            try:
+                entry = joblib.load(path)
+            except Exception as e:  # A truncated or incompatible entry is refitted below
+                print(f"Ignoring unreadable model cache entry {path}: {e}")
+            else:
+                os.utime(path)  # The modification time is the entry's last use
+                self.hits += 1
+                print(f"Loaded cached {type(estimator).__name__} from {path}")
+                return entry["model"], entry["predictions"]
+
+        self.misses += 1
+        start_time = time.time()
+        estimator.fit(X_train, y_train)
+        predictions = estimator.predict(X_test)
+        entry = {"model": estimator, "predictions": predictions,
+                 "fit_seconds": time.time() - start_time, "params": model_params(estimator)}
+        # Write to a temporary name first so a crash never leaves a half-written entry under the real key
+        temp_path = path + ".tmp"
+        joblib.dump(entry, temp_path, compress=self.compress)
+        os.replace(temp_path, path)
+        print(f"Cached {type(estimator).__name__} ({os.path.getsize(path) / 1e6:.1f} MB) in {path}")
+        self.evict()
+        return estimator, predictions
+
+    def entries(self):
+        """(path, bytes, last used) for every cached entry, least recently used first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".joblib"):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes; returns the bytes freed."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        # The newest entry is always kept, even if it alone is over the limit
+        for path, size, _ in entries[:-1]:
+            if total - freed <= self.max_bytes:
+                break
+            os.remove(path)
+            freed += size
+        if freed:
+            print(f"Evicted {freed / 1e6:.1f} MB from the model cache")
+        return freed
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            os.remove(path)
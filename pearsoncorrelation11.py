@@ -4,14 +4,26 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 from matplotlib.colors import LinearSegmentedColormap
 import os
+from bootstrap import bootstrap_file
+from rankcorr import rank_correlation
+from schema import dtypes_for
 
 # Set up the plotting style
 plt.style.use('ggplot')
 sns.set(font_scale=1.1)
 
+# 'pearson' loads the file; 'spearman' and 'kendall' stream it through rankcorr.py (rank correlations
+# suit the skewed amounts and the ordinal age / income columns better)
+correlation_method = 'pearson'
+# Poisson-bootstrap replicates behind the 95% interval printed under each Pearson heatmap cell (0 = none)
+bootstrap_replicates = 1000
+# Raw columns the streamed passes parse; preprocess_data() derives the numeric age and own/rent columns
+STREAM_USECOLS = ['applicantAge', 'ownRent', 'occupantsUnderTwo', 'grossIncome', 'ihpAmount', 'haAmount',
+                'onaAmount', 'personalPropertyAmount', 'rentalAssistanceAmount']
+
 def read_csv_in_chunks(file_path, chunk_size=10000):
     """Read a large CSV file in chunks"""
-    chunks = pd.read_csv(file_path, chunksize=chunk_size)
+    chunks = pd.read_csv(file_path, chunksize=chunk_size, dtype=dtypes_for(file_path, cleaned=True))
     return pd.concat(chunks)
 
 def preprocess_data(df):
@@ -26,10 +38,10 @@ def preprocess_data(df):
         '50-64': 57,
         '65+': 75
     }
-    processed_df['applicantAgeNumeric'] = processed_df['applicantAge'].map(age_mapping)
+    processed_df['applicantAgeNumeric'] = processed_df['applicantAge'].map(age_mapping).astype('float32')
     
     # Convert ownRent to binary (1 = Owner, 0 = Renter)
-    processed_df['ownRentNumeric'] = processed_df['ownRent'].apply(lambda x: 1 if x == 'Owner' else 0)
+    processed_df['ownRentNumeric'] = (processed_df['ownRent'] == 'Owner').astype('int8')
     
     return processed_df
 
@@ -37,10 +49,16 @@ def calculate_correlation_matrix(df, columns):
     """Calculate the Pearson correlation matrix"""
     return df[columns].corr(method='pearson')
 
-def create_correlation_heatmap(corr_matrix, output_dir, filename_base):
-    """Create and save a correlation heatmap"""
+def create_correlation_heatmap(corr_matrix, output_dir, filename_base, method='pearson', ci=None):
+    """Create and save a correlation heatmap; ci=(low, high) frames adds each cell's interval"""
     plt.figure(figsize=(10, 8))
     
+    annot, fmt = True, ".2f"
+    if ci is not None:
+        low, high = (bound.loc[corr_matrix.index, corr_matrix.columns].to_numpy() for bound in ci)
+        annot = np.vectorize(lambda r, lo, hi: f"{r:.2f}\n[{lo:.2f}, {hi:.2f}]")(corr_matrix.to_numpy(), low, high)
+        fmt = ""
+    
     # Create a custom colormap (blue to white to red)
     colors = ["#4575b4", "#91bfdb", "#e0f3f8", "#ffffbf", "#fee090", "#fc8d59", "#d73027"]
     cmap = LinearSegmentedColormap.from_list("custom_cmap", colors, N=100)
@@ -49,7 +67,8 @@ def create_correlation_heatmap(corr_matrix, output_dir, filename_base):
     mask = np.triu(np.ones_like(corr_matrix, dtype=bool), k=1)
     heatmap = sns.heatmap(
         corr_matrix, 
-        annot=True,
+        annot=annot,
+        annot_kws={"size": 7} if ci is not None else None,
         cmap=cmap,
         vmin=-1, 
         vmax=1, 
@@ -57,12 +76,12 @@ def create_correlation_heatmap(corr_matrix, output_dir, filename_base):
         square=True, 
         linewidths=.5,
         cbar_kws={"shrink": .8},
-        fmt=".2f",
+        fmt=fmt,
         mask=mask
     )
     
     # Add title and labels
-    plt.title('Pearson Correlation Matrix', fontsize=16, pad=20)
+    plt.title(f'{method.capitalize()} Correlation Matrix', fontsize=16, pad=20)
     plt.tight_layout()
     
     # Save as PNG
@@ -77,14 +96,44 @@ def create_correlation_heatmap(corr_matrix, output_dir, filename_base):
     
     return png_path, pdf_path
 
-def main():
+def main(file_path='Fire.csv', method=correlation_method, output_dir='output', replicates=bootstrap_replicates):
     # Set up output directory
-    output_dir = 'output'
     os.makedirs(output_dir, exist_ok=True)
     
+    basic_cols = ['applicantAgeNumeric', 'occupantsUnderTwo', 'grossIncome', 'ownRentNumeric']
+    basic_labels = ['Applicant Age', 'Occupants Under Two', 'Gross Income', 'Own/Rent']
+    extended_cols = [
+        'applicantAgeNumeric', 'occupantsUnderTwo', 'grossIncome', 'ownRentNumeric',
+        'ihpAmount', 'haAmount', 'onaAmount', 'personalPropertyAmount', 'rentalAssistanceAmount'
+    ]
+    extended_labels = [
+        'Applicant Age', 'Occupants Under Two', 'Gross Income', 'Own/Rent',
+        'IHP Amount', 'HA Amount', 'ONA Amount', 'Personal Property', 'Rental Assistance'
+    ]
+
+    if method != 'pearson':
+        # Both matrices are slices of one streamed matrix over every available column
+        header = list(pd.read_csv(file_path, nrows=0).columns)
+        usecols = [col for col in STREAM_USECOLS if col in header]
+        available_cols = [col for col in extended_cols
+                          if col in header or col in ('applicantAgeNumeric', 'ownRentNumeric')]
+        print(f"Streaming {method} rank correlations over {file_path}...")
+        matrix = rank_correlation(file_path, available_cols, method, prepare=preprocess_data, usecols=usecols)
+        labels = dict(zip(extended_cols, extended_labels))
+        matrix = matrix.rename(index=labels, columns=labels)
+        png_path, pdf_path = create_correlation_heatmap(
+            matrix.loc[basic_labels, basic_labels], output_dir, f'{method}_correlation_matrix', method)
+        print(f"Saved heatmap to {png_path} and {pdf_path}")
+        if len(available_cols) > 4:
+            ext_png_path, ext_pdf_path = create_correlation_heatmap(
+                matrix, output_dir, f'extended_{method}_correlation_matrix', method)
+            print(f"Saved extended heatmap to {ext_png_path} and {ext_pdf_path}")
+        print("Analysis complete!")
+        return
+
     # Read the data
     print("Reading and processing the CSV file...")
-    df = read_csv_in_chunks('Fire.csv')
+    df = read_csv_in_chunks(file_path)
     
     # Preprocess the data
     print("Preprocessing data...")
@@ -92,8 +141,6 @@ def main():
     
     # Calculate required correlation matrix
     print("Calculating basic correlation matrix...")
-    basic_cols = ['applicantAgeNumeric', 'occupantsUnderTwo', 'grossIncome', 'ownRentNumeric']
-    basic_labels = ['Applicant Age', 'Occupants Under Two', 'Gross Income', 'Own/Rent']
     
     # Rename columns for better display
     corr_df = processed_df[basic_cols].copy()
@@ -101,26 +148,31 @@ def main():
     
     basic_corr = corr_df.corr(method='pearson')
     
+    ci = None
+    if replicates:
+        # One streamed bootstrap covers every cell of both heatmaps
+        print(f"Bootstrapping {replicates} replicates of the correlations...")
+        header = list(pd.read_csv(file_path, nrows=0).columns)
+        boot_cols = [col for col in extended_cols if col in processed_df.columns]
+        boot = bootstrap_file(file_path, boot_cols, prepare=preprocess_data,
+                              usecols=[col for col in STREAM_USECOLS if col in header],
+                              replicates=replicates)
+        labels = dict(zip(extended_cols, extended_labels))
+        ci = tuple(bound.rename(index=labels, columns=labels)
+                   for bound in (boot.correlation_low, boot.correlation_high))
+    
     # Create and save the correlation heatmap
     print("Creating correlation heatmap...")
     png_path, pdf_path = create_correlation_heatmap(
         basic_corr, 
         output_dir, 
-        'pearson_correlation_matrix'
+        'pearson_correlation_matrix',
+        ci=ci
     )
     print(f"Saved heatmap to {png_path} and {pdf_path}")
     
     # Calculate extended correlation matrix with additional variables
     print("Calculating extended correlation matrix...")
-    extended_cols = [
-        'applicantAgeNumeric', 'occupantsUnderTwo', 'grossIncome', 'ownRentNumeric',
-        'ihpAmount', 'haAmount', 'onaAmount', 'personalPropertyAmount', 'rentalAssistanceAmount'
-    ]
-    extended_labels = [
-        'Applicant Age', 'Occupants Under Two', 'Gross Income', 'Own/Rent',
-        'IHP Amount', 'HA Amount', 'ONA Amount', 'Personal Property', 'Rental Assistance'
-    ]
-    
     # Select only numeric columns that exist
     available_cols = [col for col in extended_cols if col in processed_df.columns]
     available_labels = [extended_labels[extended_cols.index(col)] for col in available_cols]
@@ -136,7 +188,8 @@ def main():
         ext_png_path, ext_pdf_path = create_correlation_heatmap(
             extended_corr, 
             output_dir, 
-            'extended_pearson_correlation_matrix'
+            'extended_pearson_correlation_matrix',
+            ci=ci
         )
         print(f"Saved extended heatmap to {ext_png_path} and {ext_pdf_path}")
     
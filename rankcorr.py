@@ -0,0 +1,236 @@
+# Out-of-core rank correlations (Spearman and Kendall) for the correlation scripts.
+# Spearman: a first pass learns each column's value distribution, a second pass turns every value into
+# its mid-rank and accumulates pairwise sums, and the Pearson correlation of the ranks comes from the
+# sums. Each column is ranked once over all of its non-null rows; pandas re-ranks every pair over the
+# rows where both are present, so with missing values the two can differ slightly. Columns with up to max_distinct distinct values (age buckets, flags, counts, rounded amounts)
+# are ranked exactly from their value counts; the rest get approximate ranks from a KLL quantile
+# sketch (error within the sketch's rank error). Kendall: a uniform sample of rows is kept while
+# streaming and split into blocks; tau-b of each block comes from Knight's O(n log n) merge-sort
+# algorithm and the blocks are averaged.
+import numpy as np
+import pandas as pd
+
+from chunkio import read_chunks
+from factorstats import as_numeric
+from instrumentation import RunLog
+from schema import dtypes_for
+from sketches import QuantileSketch
+
+METHODS = ["pearson", "spearman", "kendall"]
+MAX_EXACT_DISTINCT = 10000  # Columns with more distinct values are ranked from a quantile sketch
+KENDALL_SAMPLE_ROWS = 50000
+KENDALL_BLOCK_ROWS = 10000
+
+
+class ColumnRanker:
+    """Mid-ranks of one column: exact from its value counts while they stay small, otherwise from a KLL sketch."""
+
+    def __init__(self, max_distinct=MAX_EXACT_DISTINCT):
+        self.max_distinct = max_distinct
+        self.counts = pd.Series(dtype="float64")  # value -> rows; None once the column has too many values
+        self.sketch = QuantileSketch()
+        self._values = self._mid_ranks = None
+
+    @property
+    def exact(self):
+        return self.counts is not None
+
+    @property
+    def n(self):
+        return self.sketch.n
+
+    def update(self, values):
+        self.sketch.update(values)
+        if self.exact:
+            counts = pd.Series(values[~np.isnan(values)]).value_counts()
+            self.counts = self.counts.add(counts, fill_value=0)
+            if len(self.counts) > self.max_distinct:
+                self.counts = None
+        return self
+
+    def ranks(self, values):
+        """Mid-rank (1-based, ties share their average rank) of each value; NaN stays NaN."""
+        if self.exact:
+            if self._values is None:
+                counts = self.counts.sort_index()
+                self._values = counts.index.to_numpy(dtype=np.float64)
+                self._mid_ranks = np.cumsum(counts.to_numpy()) - (counts.to_numpy() - 1) / 2
+            positions = np.searchsorted(self._values, values).clip(max=max(len(self._values) - 1, 0))
+            ranks = self._mid_ranks[positions] if len(self._values) else np.full(len(values), np.nan)
+        else:
+            ranks = self.n * (self.sketch.cdf(values, strict=True) + self.sketch.cdf(values)) / 2 + 0.5
+        return np.where(np.isnan(values), np.nan, ranks)
+
+
+class PairwiseSums:
+    """Pairwise-complete sums for the correlation matrix of a stream of (rows x columns) arrays."""
+
+    def __init__(self, n_columns):
+        shape = (n_columns, n_columns)
+        self.n, self.sum_x, self.sum_xx, self.sum_xy = (np.zeros(shape) for _ in range(4))
+
+    def update(self, values):
+        present = (~np.isnan(values)).astype(np.float64)
+        filled = np.where(np.isnan(values), 0.0, values)
+        self.n += present.T @ present
+        self.sum_x += filled.T @ present     # [i, j]: sum of column i over rows where j is present
+        self.sum_xx += (filled * filled).T @ present
+        self.sum_xy += filled.T @ filled
+        return self
+
+    def correlations(self):
+        covariance = self.n * self.sum_xy - self.sum_x * self.sum_x.T
+        variance = self.n * self.sum_xx - self.sum_x * self.sum_x
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return covariance / np.sqrt(variance * variance.T)
+
+
+def _numeric_matrix(chunk, columns):
+    return np.column_stack([as_numeric(chunk[col]).to_numpy(dtype=np.float64) for col in columns])
+
+
+def _inversions(values):
+    """Pairs i < j with values[i] > values[j] for non-negative integers, by a bottom-up merge sort.
+
+    Each level handles all pairs of adjacent runs at once: offsetting the values by their pair number
+    keeps every pair's runs apart, so one searchsorted counts the inversions and one sort merges the runs.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    n = len(values)
+    span = int(values.max()) + 1 if n else 1
+    index = np.arange(n)
+    inversions = 0
+    width = 1
+    while width < n:
+        run = index // width
+        pair = run // 2
+        keyed = pair * span + values
+        right = (run % 2).astype(bool)
+        left = keyed[~right]  # Sorted: each run is sorted and the pair offsets increase
+        inversions += int(np.sum(np.searchsorted(left, (pair[right] + 1) * span, side="left")
+                                 - np.searchsorted(left, keyed[right], side="right")))
+        values = np.sort(keyed, kind="stable") - pair * span
+        width *= 2
+    return inversions
+
+
+def _tied_pairs(counts):
+    return float(np.sum(counts * (counts - 1) / 2))
+
+
+def kendall_tau_b(x, y):
+    """Kendall's tau-b of two arrays (pairwise complete), by Knight's O(n log n) algorithm."""
+    keep = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[keep], y[keep]
+    n = len(x)
+    if n < 2:
+        return np.nan
+    order = np.lexsort((y, x))
+    x, y = x[order], y[order]
+    total = n * (n - 1) / 2
+    x_ties = _tied_pairs(np.unique(x, return_counts=True)[1])
+    y_values, y_ranks, y_counts = np.unique(y, return_inverse=True, return_counts=True)
+    y_ties = _tied_pairs(y_counts)
+    # Sorted by (x, y), so rows tied on both are consecutive
+    starts = np.flatnonzero(np.r_[True, (x[1:] != x[:-1]) | (y[1:] != y[:-1])])
+    joint_ties = _tied_pairs(np.diff(np.r_[starts, n]))
+    # Within tied x the y values are ascending, so every inversion of y is a discordant pair
+    discordant = _inversions(y_ranks)
+    denominator = np.sqrt((total - x_ties) * (total - y_ties))
+    if denominator == 0:
+        return np.nan
+    return (total - x_ties - y_ties + joint_ties - 2 * discordant) / denominator
+
+
+def kendall_matrix(values, columns, block_rows=KENDALL_BLOCK_ROWS):
+    """Kendall tau-b matrix averaged over blocks of block_rows rows; attrs['std_err'] has the block standard errors."""
+    n_blocks = max(1, int(np.ceil(len(values) / block_rows)))
+    k = len(columns)
+    taus = np.full((n_blocks, k, k), np.nan)
+    for b, block in enumerate(np.array_split(values, n_blocks)):
+        for i in range(k):
+            taus[b, i, i] = 1.0
+            for j in range(i + 1, k):
+                taus[b, i, j] = taus[b, j, i] = kendall_tau_b(block[:, i], block[:, j])
+    with np.errstate(invalid="ignore"):
+        matrix = pd.DataFrame(np.nanmean(taus, axis=0), index=columns, columns=columns)
+        std_err = np.nanstd(taus, axis=0) / np.sqrt(n_blocks) if n_blocks > 1 else np.zeros((k, k))
+    matrix.attrs["std_err"] = pd.DataFrame(std_err, index=columns, columns=columns)
+    return matrix
+
+
+def rank_correlation(file_path, columns, method="spearman", prepare=None, usecols=None, chunk_size=100000,
+                     max_distinct=MAX_EXACT_DISTINCT, sample_rows=KENDALL_SAMPLE_ROWS,
+                     block_rows=KENDALL_BLOCK_ROWS, seed=42):
+    """Spearman or Kendall correlation matrix of columns over file_path without loading the file.
+
+    prepare, if given, turns each parsed chunk into the frame the columns are taken from (e.g. mapping
+    age buckets to numbers); usecols limits the columns parsed.
+    """
+    if method not in ("spearman", "kendall"):
+        raise ValueError(f"Unknown rank correlation method '{method}'; expected 'spearman' or 'kendall'")
+    dtype = dtypes_for(file_path, usecols=usecols, cleaned=True)
+    run_log = RunLog(f"{method}_correlation")
+
+    def numeric_chunks(stage):
+        for chunk in stage.timed_chunks(read_chunks(file_path, chunk_size, dtype=dtype, usecols=usecols)):
+            if prepare is not None:
+                chunk = prepare(chunk)
+            yield chunk, _numeric_matrix(chunk, columns)
+
+    if method == "kendall":
+        # Bottom-k sample: the sample_rows rows with the smallest random keys are a uniform sample
+        rng = np.random.default_rng(seed)
+        sample, keys = np.empty((0, len(columns))), np.empty(0)
+        stage = run_log.stage("kendall_sample", input_path=file_path)
+        for chunk, values in numeric_chunks(stage):
+            sample = np.concatenate([sample, values])
+            keys = np.concatenate([keys, rng.random(len(values))])
+            if len(keys) > sample_rows:
+                keep = np.argpartition(keys, sample_rows - 1)[:sample_rows]
+                sample, keys = sample[keep], keys[keep]
+            stage.lap("transform")
+            stage.end_chunk(chunk)
+        with stage.phase("transform"):
+            # Random key order, so every block is itself a uniform sample
+            matrix = kendall_matrix(sample[np.argsort(keys)], columns, block_rows)
+        stage.finish()
+        run_log.save()
+        print(f"Kendall tau-b over {len(keys):,} sampled rows in blocks of {block_rows:,}; "
+              f"largest block standard error {np.nanmax(matrix.attrs['std_err'].to_numpy()):.4f}")
+        return matrix
+
+    rankers = [ColumnRanker(max_distinct) for _ in columns]
+    stage = run_log.stage("rank_prepass", input_path=file_path)
+    for chunk, values in numeric_chunks(stage):
+        for i, ranker in enumerate(rankers):
+            ranker.update(values[:, i])
+        stage.lap("transform")
+        stage.end_chunk(chunk)
+    stage.finish()
+    approximate = [col for col, ranker in zip(columns, rankers) if not ranker.exact]
+    if approximate:
+        print(f"Approximate ranks (±{rankers[0].sketch.rank_error():.1%}) for: {', '.join(approximate)}")
+
+    sums = PairwiseSums(len(columns))
+    stage = run_log.stage("spearman", input_path=file_path)
+    for chunk, values in numeric_chunks(stage):
+        # Ranks are centred on the middle rank so the running sums stay small
+        ranks = np.column_stack([ranker.ranks(values[:, i]) - (ranker.n + 1) / 2
+                                 for i, ranker in enumerate(rankers)])
+        sums.update(ranks)
+        stage.lap("transform")
+        stage.end_chunk(chunk)
+    stage.finish()
+    run_log.save()
+    return pd.DataFrame(sums.correlations(), index=columns, columns=columns)
+
+
+def frame_correlation(df, method="pearson"):
+    """df.corr(method) for a frame already in memory, with Kendall from the O(n log n) tau-b instead of O(n^2)."""
+    if method != "kendall":
+        return df.corr(method=method)
+    numeric = df.select_dtypes(include=[np.number, "bool"])
+    values = np.column_stack([as_numeric(numeric[col]).to_numpy(dtype=np.float64) for col in numeric.columns])
+    # One block over every row: tau-b of the full columns, pairwise complete like pandas
+    return kendall_matrix(values, list(numeric.columns), block_rows=max(len(values), 1))
@@ -0,0 +1,205 @@
+# Hierarchical disaster -> state -> county rollups of the key amounts and eligibility counts.
+# One pass per data refresh accumulates, per (incidentType, disasterNumber, state, county), the count,
+# sum and sum of squares of each amount plus the eligible / received counts graphs.py charts, and
+# the applicantAge x ownRent counts behind the Fire visualizer's crosstab. Every statistic is a sum,
+# so the state and disaster tables are sums of the county table and any slice (an incident type,
+# a set of disasters) can be summed again; means, standard errors and rates come from the sums.
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from chunkio import read_chunks
+from factorstats import ELIGIBILITY_FACTORS, as_numeric
+from ihpquery import STATE_COLUMNS
+from instrumentation import RunLog
+from schema import dtypes_for
+
+AMOUNT_COLUMNS = [
+    "ihpAmount", "haAmount", "onaAmount", "repairAmount", "rentalAssistanceAmount", "personalPropertyAmount"
+]
+RECEIVED_COLUMN = "ihpAmount"  # "Received IHP" means ihpAmount > 0, as in graphs.py
+CROSSTAB_COLUMNS = ["applicantAge", "ownRent"]
+
+DEFAULT_INPUT = "cleaned_fema_filtered.csv"
+ROLLUP_DIR = "rollups"
+# incidentType is fixed by disasterNumber, so it rides along as a key at every level
+LEVELS = {
+    "disaster": ["incidentType", "disasterNumber"],
+    "state": ["incidentType", "disasterNumber", "state"],
+    "county": ["incidentType", "disasterNumber", "state", "county"],
+}
+CROSSTAB_TABLE = "county_crosstab"
+MISSING_KEY = "Unknown"
+
+
+def rollup_path(table, rollup_dir=ROLLUP_DIR):
+    return os.path.join(rollup_dir, f"{table}.csv")
+
+
+def _keys(chunk, columns):
+    keys = []
+    for col in columns:
+        values = chunk[col].to_numpy(dtype=object)
+        values[pd.isna(values)] = MISSING_KEY
+        keys.append(values)
+    return keys
+
+
+class RollupAccumulator:
+    """Running county-level sums; the coarser levels are derived from them in tables()."""
+
+    def __init__(self, amounts=AMOUNT_COLUMNS, eligibility_factors=ELIGIBILITY_FACTORS):
+        self.amounts = list(amounts)
+        self.eligibility_factors = list(eligibility_factors)
+        self.totals = None
+        self.crosstab = None
+        self.rows = 0
+
+    def columns(self, header):
+        """Columns update() reads, given the input file's header."""
+        state_column = next((col for col in STATE_COLUMNS if col in header), None)
+        if state_column is None:
+            raise ValueError(f"No state column; expected one of {STATE_COLUMNS}")
+        needed = ["incidentType", "disasterNumber", state_column, "county"] + self.amounts \
+            + self.eligibility_factors + CROSSTAB_COLUMNS + [RECEIVED_COLUMN]
+        return [col for col in dict.fromkeys(needed) if col in header]
+
+    def update(self, chunk):
+        if "state" not in chunk.columns:
+            chunk = chunk.rename(columns={next(col for col in STATE_COLUMNS if col in chunk.columns): "state"})
+        keys = _keys(chunk, LEVELS["county"])
+
+        sums = {"rows": np.ones(len(chunk), dtype=np.int64)}
+        for col in self.amounts:
+            if col not in chunk.columns:
+                continue
+            values = as_numeric(chunk[col])
+            present = values.notna()
+            values = values.fillna(0.0)
+            sums[f"{col}_count"] = present.astype("int64")
+            sums[f"{col}_sum"] = values
+            sums[f"{col}_sumsq"] = values * values
+
+        received = as_numeric(chunk[RECEIVED_COLUMN]) > 0
+        for factor in self.eligibility_factors:
+            if factor not in chunk.columns:
+                continue
+            values = as_numeric(chunk[factor])
+            eligible = values == 1
+            non_eligible = values == 0
+            sums[f"{factor}_eligible"] = eligible.astype("int64")
+            sums[f"{factor}_eligible_received"] = (eligible & received).astype("int64")
+            sums[f"{factor}_non_eligible"] = non_eligible.astype("int64")
+            sums[f"{factor}_non_eligible_received"] = (non_eligible & received).astype("int64")
+
+        chunk_totals = pd.DataFrame(sums, index=chunk.index).groupby(keys, sort=False).sum()
+        self.totals = chunk_totals if self.totals is None else self.totals.add(chunk_totals, fill_value=0)
+
+        if all(col in chunk.columns for col in CROSSTAB_COLUMNS):
+            counts = pd.Series(1, index=chunk.index, dtype="int64").groupby(
+                keys + _keys(chunk, CROSSTAB_COLUMNS), sort=False).sum()
+            self.crosstab = counts if self.crosstab is None else self.crosstab.add(counts, fill_value=0)
+        self.rows += len(chunk)
+        return self
+
+    def tables(self):
+        """{table name: DataFrame} for every level plus the county crosstab, sorted by their keys."""
+        county = self.totals.copy()
+        county.index.names = LEVELS["county"]
+        # add(fill_value=0) turns the integer counts into floats; every column but the sums is a count
+        counts = [col for col in county.columns if not col.endswith(("_sum", "_sumsq"))]
+        county[counts] = county[counts].astype("int64")
+        tables = {level: county.groupby(level=keys).sum().reset_index() for level, keys in LEVELS.items()}
+        if self.crosstab is not None:
+            crosstab = self.crosstab.astype("int64").rename("rows")
+            crosstab.index.names = LEVELS["county"] + CROSSTAB_COLUMNS
+            tables[CROSSTAB_TABLE] = crosstab.sort_index().reset_index()
+        return tables
+
+
+def build_rollups(file_path=DEFAULT_INPUT, rollup_dir=ROLLUP_DIR, chunk_size=100000):
+    """Roll file_path up in one streaming pass and write one CSV per table to rollup_dir."""
+    accumulator = RollupAccumulator()
+    usecols = accumulator.columns(list(pd.read_csv(file_path, nrows=0).columns))
+
+    run_log = RunLog("rollup")
+    stage = run_log.stage("rollup", input_path=file_path)
+    chunks = stage.timed_chunks(read_chunks(file_path, chunk_size, usecols=usecols,
+                                            dtype=dtypes_for(file_path, usecols=usecols, cleaned=True)))
+    for chunk in chunks:
+        accumulator.update(chunk)
+        stage.lap("transform")
+        stage.end_chunk(chunk)
+        print(f"Rolled up {accumulator.rows:,} rows", end="\r")
+    print()
+
+    os.makedirs(rollup_dir, exist_ok=True)
+    with stage.phase("write"):
+        for table, df in accumulator.tables().items():
+            df.to_csv(rollup_path(table, rollup_dir), index=False)
+            print(f"Saved {len(df):,} rows to {rollup_path(table, rollup_dir)}")
+    stage.finish()
+    run_log.save()
+    return accumulator
+
+
+def load_rollup(table="county", rollup_dir=ROLLUP_DIR, incident_type=None):
+    """One rollup table, optionally limited to one incident type; None if the rollups have not been built."""
+    path = rollup_path(table, rollup_dir)
+    if not os.path.exists(path):
+        return None
+    df = pd.read_csv(path, dtype={"incidentType": str, "state": str, "county": str}, keep_default_na=False)
+    if incident_type is not None:
+        df = df[df["incidentType"] == incident_type]
+    return df
+
+
+def amount_summary(rollup, amounts=AMOUNT_COLUMNS):
+    """Count, mean, std (ddof=0), standard error and std/mean of each amount over all rows of rollup."""
+    rows = {}
+    for col in amounts:
+        if f"{col}_count" not in rollup.columns:
+            continue
+        n = rollup[f"{col}_count"].sum()
+        total, total_sq = rollup[f"{col}_sum"].sum(), rollup[f"{col}_sumsq"].sum()
+        mean = total / n if n else np.nan
+        std = np.sqrt(max(total_sq / n - mean * mean, 0.0)) if n else np.nan
+        rows[col] = {"count": n, "mean": mean, "std": std, "std_err": std / np.sqrt(n) if n else np.nan,
+                     "rel_error": std / mean if n and mean != 0 else 0}
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+def eligibility_rates(rollup, eligibility_factors=ELIGIBILITY_FACTORS):
+    """Percent receiving IHP among eligible / non-eligible applicants, like FactorAccumulator.eligibility_rates()."""
+    totals = rollup.sum(numeric_only=True)
+    rows = []
+    for factor in eligibility_factors:
+        if f"{factor}_eligible" not in totals:
+            continue
+        eligible = totals[f"{factor}_eligible"]
+        non_eligible = totals[f"{factor}_non_eligible"]
+        percentage_eligible = 100 * totals[f"{factor}_eligible_received"] / eligible if eligible > 0 else 0
+        percentage_non_eligible = (100 * totals[f"{factor}_non_eligible_received"] / non_eligible
+                                   if non_eligible > 0 else 0)
+        rows.append([factor, percentage_eligible, percentage_non_eligible])
+    return pd.DataFrame(rows, columns=["Factor", "Eligible", "Non-Eligible"])
+
+
+def crosstab(rollup, index="applicantAge", columns="ownRent"):
+    """pd.crosstab() of two crosstab columns from the county_crosstab table (any slice of it)."""
+    return rollup.pivot_table(index=index, columns=columns, values="rows", aggfunc="sum", fill_value=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the disaster / state / county rollup tables.")
+    parser.add_argument("input", nargs="?", default=DEFAULT_INPUT, help="Cleaned or enriched IHP-VR CSV")
+    parser.add_argument("--output-dir", default=ROLLUP_DIR)
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    args = parser.parse_args()
+    build_rollups(args.input, args.output_dir, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# Central dtype schema for the IHP-VR and Disaster Declarations Summaries columns.
+# Every loader in the repo reads through dtypes_for() so the same column always gets the
+# same compact type instead of object strings.
+import pandas as pd
+
+# Flags are nullable booleans in the raw OpenFEMA files. After databasecreation.py has
+# filled missing values they can hold 'Unknown' / 'N', so cleaned files read them as category.
+FLAG_COLUMNS = [
+    "ihpReferral", "ihpEligible", "haReferral", "haEligible", "onaReferral", "onaEligible",
+    "primaryResidence", "homeOwnersInsurance", "floodInsurance", "utilitiesOut", "homeDamage",
+    "autoDamage", "emergencyNeeds", "foodNeed", "shelterNeed", "accessFunctionalNeeds",
+    "sbaEligible", "sbaApproved", "inspnIssued", "inspnReturned", "habitabilityRepairsRequired",
+    "destroyed", "floodDamage", "foundationDamage", "roofDamage", "tsaEligible", "tsaCheckedIn",
+    "rentalAssistanceEligible", "repairAssistanceEligible", "replacementAssistanceEligible",
+    "personalPropertyEligible", "ihpMax", "haMax", "onaMax",
+]
+
+IHP_VR_DTYPES = {
+    # Ids and counts
+    "disasterNumber": "int32",
+    "occupantsUnderTwo": "Int16",
+    "occupants2to5": "Int16",
+    "occupants6to18": "Int16",
+    "occupants19to64": "Int16",
+    "occupants65andOver": "Int16",
+    "householdComposition": "Int16",
+    # Amounts
+    "grossIncome": "float32",
+    "ihpAmount": "float32",
+    "fipAmount": "float32",
+    "haAmount": "float32",
+    "onaAmount": "float32",
+    "rpfvl": "float32",
+    "ppfvl": "float32",
+    "waterLevel": "float32",
+    "floodDamageAmount": "float32",
+    "foundationDamageAmount": "float32",
+    "roofDamageAmount": "float32",
+    "rentalAssistanceAmount": "float32",
+    "repairAmount": "float32",
+    "replacementAmount": "float32",
+    "personalPropertyAmount": "float32",
+    # Categoricals
+    "incidentType": "category",
+    "declarationType": "category",
+    "declarationTitle": "category",
+    "damagedStateAbbreviation": "category",
+    "county": "category",
+    "damagedCity": "category",
+    "damageCity": "category",
+    "damagedZipCode": "category",
+    "ownRent": "category",
+    "applicantAge": "category",
+    "residenceType": "category",
+    "registrationMethod": "category",
+    "haStatus": "category",
+    "renterDamageLevel": "category",
+    "highWaterLocation": "category",
+}
+IHP_VR_DTYPES.update({col: "boolean" for col in FLAG_COLUMNS})
+
+DECLARATIONS_DTYPES = {
+    "disasterNumber": "int32",
+    "fyDeclared": "int16",
+    "fipsStateCode": "int16",
+    "fipsCountyCode": "int16",
+    "placeCode": "int32",
+    "state": "category",
+    "declarationType": "category",
+    "declarationTitle": "category",
+    "incidentType": "category",
+    "designatedArea": "category",
+    "region": "int16",
+    "ihProgramDeclared": "boolean",
+    "iaProgramDeclared": "boolean",
+    "paProgramDeclared": "boolean",
+    "hmProgramDeclared": "boolean",
+}
+
+
+def is_parquet(file_path):
+    return str(file_path).endswith((".parquet", ".pq"))
+
+
+def read_header(file_path):
+    """Return the column names of a CSV (or Parquet file) without parsing any rows."""
+    if is_parquet(file_path):
+        import pyarrow.parquet as pq
+
+        return list(pq.read_schema(file_path).names)
+    return list(pd.read_csv(file_path, nrows=0).columns)
+
+
+def dtypes_for(file_path, schema=IHP_VR_DTYPES, usecols=None, cleaned=False):
+    """Build the read_csv dtype mapping for the columns actually present in file_path.
+
+    With cleaned=True the flag columns are read as category, since the cleaning stages
+    fill them with string placeholders that a boolean dtype would reject.
+    """
+    columns = read_header(file_path) if usecols is None else list(usecols)
+    dtypes = {}
+    for col in columns:
+        if col not in schema:
+            continue
+        dtype = schema[col]
+        if cleaned and dtype == "boolean":
+            dtype = "category"
+        dtypes[col] = dtype
+    return dtypes
+
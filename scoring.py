@@ -0,0 +1,221 @@
+# Batch scoring of new registrations with a trained IHP model bundle.
+# train_scoring_model() fits an ihpAmount regressor and an ihpEligible classifier on an incident file
+# and saves them, together with the feature schema they were trained on, as <name>.scoring.joblib.
+# score_file() streams a CSV or Parquet file through read_chunks(), turns each chunk into the
+# schema's float32 feature matrix with vectorized transforms, predicts chunks in parallel on a
+# thread pool (tree predictions release the GIL) and writes predictions in input order through
+# ChunkWriter, so parsing, predicting and writing all overlap.
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.metrics import accuracy_score, mean_absolute_error
+from sklearn.model_selection import train_test_split
+
+from chunkio import ChunkWriter, read_chunks
+from factorstats import as_numeric
+from instrumentation import RunLog
+from modelstore import COMPRESSION
+from schema import dtypes_for, read_header
+from tuning import load_best_params
+
+TARGET = "ihpAmount"
+ELIGIBLE = "ihpEligible"
+ID_COLUMN = "id"
+PREDICTED_AMOUNT = "predictedIhpAmount"
+PREDICTED_ELIGIBLE = "predictedIhpEligible"
+
+MAX_CATEGORIES = 50  # Most frequent values one-hot encoded per categorical column; the rest encode as all zeros
+# Identifiers and dates say nothing about a new registration
+EXCLUDED_COLUMNS = {ID_COLUMN, "disasterNumber", "declarationDate", "declarationTitle"}
+# Award decisions and referrals are only known after the fact, so they are never features
+OUTCOME_COLUMNS = {"haStatus", "sbaApproved", "tsaCheckedIn", "ihpReferral", "haReferral", "onaReferral"}
+OUTCOME_SUFFIXES = ("Amount", "Eligible", "Max")
+# Filled in by the FEMA inspection after registration (verified losses, damage findings); a new
+# registration has none of them, and they would leak the award into the holdout score
+INSPECTION_COLUMNS = {
+    "rpfvl", "ppfvl", "inspnIssued", "inspnReturned", "habitabilityRepairsRequired", "destroyed",
+    "waterLevel", "highWaterLocation", "floodDamage", "foundationDamage", "roofDamage", "renterDamageLevel",
+}
+
+
+def model_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".scoring.joblib"
+
+
+def is_feature(col):
+    """Whether col is known when a registration comes in (not an identifier, outcome or inspection field)."""
+    return (col not in EXCLUDED_COLUMNS and col not in OUTCOME_COLUMNS and col not in INSPECTION_COLUMNS
+            and not col.endswith(OUTCOME_SUFFIXES))
+
+
+def build_feature_schema(df):
+    """Numeric columns as-is plus the top MAX_CATEGORIES values of each categorical column."""
+    numeric, categorical = [], {}
+    for col in df.columns:
+        if not is_feature(col):
+            continue
+        values = df[col]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            numeric.append(col)
+        else:
+            counts = values.astype("string").value_counts()
+            categorical[col] = counts.index[:MAX_CATEGORIES].tolist()
+    return {"numeric": numeric, "categorical": categorical}
+
+
+def schema_columns(schema):
+    return schema["numeric"] + list(schema["categorical"])
+
+
+def feature_names(schema):
+    return schema["numeric"] + [f"{col}={value}" for col, values in schema["categorical"].items() for value in values]
+
+
+def _category_codes(values, categories):
+    """Position of each value in categories (-1 if absent), compared as text so True matches 'True'."""
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype("category")
+    # Only the distinct values are looked up; rows map through their category codes
+    lookup = pd.Index(categories).get_indexer(values.cat.categories.astype(str))
+    row_codes = values.cat.codes.to_numpy()
+    return np.where(row_codes >= 0, lookup[row_codes], -1)
+
+
+def transform(schema, chunk):
+    """float32 feature matrix for chunk; missing numeric values stay NaN (the forests handle them)."""
+    n_features = len(schema["numeric"]) + sum(len(values) for values in schema["categorical"].values())
+    X = np.zeros((len(chunk), n_features), dtype=np.float32)
+    for i, col in enumerate(schema["numeric"]):
+        if col in chunk.columns:
+            X[:, i] = pd.to_numeric(chunk[col], errors="coerce").to_numpy(dtype=np.float32, na_value=np.nan)
+        else:
+            X[:, i] = np.nan
+    offset = len(schema["numeric"])
+    for col, categories in schema["categorical"].items():
+        if col in chunk.columns:
+            codes = _category_codes(chunk[col], categories)
+            rows = np.flatnonzero(codes >= 0)
+            X[rows, offset + codes[rows]] = 1.0
+        offset += len(categories)
+    return X
+
+
+def train_scoring_model(csv_path, output_path=None, max_rows=None, n_estimators=100, n_jobs=-1):
+    """Fit the ihpAmount and ihpEligible forests on csv_path and save the bundle; returns its path."""
+    output_path = output_path or model_path(csv_path)
+    df = pd.read_csv(csv_path, dtype=dtypes_for(csv_path, cleaned=True))
+    if max_rows and len(df) > max_rows:
+        df = df.sample(max_rows, random_state=42)
+    schema = build_feature_schema(df)
+    X = transform(schema, df)
+    y_amount = as_numeric(df[TARGET]).to_numpy()
+    y_eligible = as_numeric(df[ELIGIBLE]).to_numpy()
+    print(f"Training on {len(df):,} rows of {csv_path} with {X.shape[1]} features")
+
+    # Hyperparameters saved by tuning.py apply to the regressor when present
+    forest_params = {"n_estimators": n_estimators, **load_best_params(csv_path, "Random Forest")}
+    metrics = {}
+
+    known = ~np.isnan(y_amount)
+    X_train, X_test, y_train, y_test = train_test_split(X[known], y_amount[known], test_size=0.2, random_state=42)
+    amount_model = RandomForestRegressor(random_state=42, n_jobs=n_jobs, **forest_params).fit(X_train, y_train)
+    metrics["amount_mae"] = float(mean_absolute_error(y_test, amount_model.predict(X_test)))
+
+    known = ~np.isnan(y_eligible)
+    X_train, X_test, y_train, y_test = train_test_split(X[known], y_eligible[known] == 1, test_size=0.2,
+                                                        random_state=42)
+    eligible_model = RandomForestClassifier(n_estimators=n_estimators, random_state=42, n_jobs=n_jobs)
+    eligible_model.fit(X_train, y_train)
+    metrics["eligible_accuracy"] = float(accuracy_score(y_test, eligible_model.predict(X_test)))
+    print(f"Holdout: ihpAmount MAE {metrics['amount_mae']:.2f}, ihpEligible accuracy {metrics['eligible_accuracy']:.2%}")
+
+    bundle = {"schema": schema, "amount_model": amount_model, "eligible_model": eligible_model,
+              "trained_on": os.path.basename(csv_path), "rows": len(df), "metrics": metrics}
+    joblib.dump(bundle, output_path, compress=COMPRESSION)
+    print(f"Scoring model saved to {output_path}")
+    return output_path
+
+
+def load_scoring_model(path):
+    bundle = joblib.load(path)
+    # Chunks are already predicted in parallel, so each prediction runs on one thread
+    for name in ("amount_model", "eligible_model"):
+        bundle[name].set_params(n_jobs=1)
+    return bundle
+
+
+def score_chunk(bundle, chunk):
+    """Predictions for one chunk, keyed by id when the input has one."""
+    X = transform(bundle["schema"], chunk)
+    result = pd.DataFrame(index=chunk.index)
+    if ID_COLUMN in chunk.columns:
+        result[ID_COLUMN] = chunk[ID_COLUMN].to_numpy()
+    result[PREDICTED_AMOUNT] = np.maximum(bundle["amount_model"].predict(X), 0.0).round(2)
+    result[PREDICTED_ELIGIBLE] = bundle["eligible_model"].predict(X).astype(bool)
+    return result
+
+
+def score_file(input_path, model_file, output_path, chunk_size=100000, workers=None):
+    """Stream input_path (CSV or Parquet) through the saved model and write one prediction row per input row."""
+    bundle = load_scoring_model(model_file)
+    header = read_header(input_path)
+    usecols = [col for col in [ID_COLUMN] + schema_columns(bundle["schema"]) if col in header]
+    dtypes = dtypes_for(input_path, usecols=usecols, cleaned=True)
+    if ID_COLUMN in usecols:
+        dtypes[ID_COLUMN] = str
+    workers = workers or os.cpu_count() or 1
+
+    run_log = RunLog("scoring")
+    stage = run_log.stage("score", input_path=input_path, output_path=output_path)
+    start_time = time.time()
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool, ChunkWriter(output_path) as writer:
+        for chunk in stage.timed_chunks(read_chunks(input_path, chunk_size, dtype=dtypes, usecols=usecols)):
+            pending.append(pool.submit(score_chunk, bundle, chunk))
+            stage.lap("transform")
+            # At most `workers` chunks in flight; results are written in input order
+            while len(pending) > workers:
+                writer.write(pending.popleft().result())
+            stage.lap("write")
+            stage.end_chunk(chunk)
+        while pending:
+            writer.write(pending.popleft().result())
+    stage.finish(writers=[writer])
+    run_log.save()
+    print(f"Scored {writer.rows_written:,} rows in {time.time() - start_time:.2f}s → {output_path}")
+    return writer.rows_written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train IHP scoring models and score new registrations in batch.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train = subparsers.add_parser("train", help="Fit the ihpAmount / ihpEligible models on an incident file")
+    train.add_argument("csv_path")
+    train.add_argument("--output", help="Model bundle path (default: <name>.scoring.joblib)")
+    train.add_argument("--max-rows", type=int, help="Train on a random sample of this many rows")
+    train.add_argument("--n-estimators", type=int, default=100)
+
+    score = subparsers.add_parser("score", help="Write predictions for a CSV or Parquet file of registrations")
+    score.add_argument("input_path")
+    score.add_argument("--model", required=True, help="Bundle written by 'train'")
+    score.add_argument("--output", required=True)
+    score.add_argument("--chunk-size", type=int, default=100000)
+    score.add_argument("--workers", type=int, help="Chunks predicted in parallel (default: all cores)")
+
+    args = parser.parse_args()
+    if args.command == "train":
+        train_scoring_model(args.csv_path, args.output, args.max_rows, args.n_estimators)
+    else:
+        score_file(args.input_path, args.model, args.output, args.chunk_size, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,508 @@
+# Mergeable sketches for approximate exploratory statistics over the incident files.
+# One streaming pass builds, per column, a KLL quantile sketch (amounts), a HyperLogLog distinct
+# counter (ids, cities, zip codes) and a count-min table with a heavy-hitter candidate list
+# (categories such as damagedCity). The sketches for one incident file are saved next to it as
+# <name>.sketches.npz, so quantile tables, boxplots, histograms and top-k charts can be drawn
+# without rescanning the CSV. Every estimate comes with its error bound.
+# Apache DataSketches / tdigest are not dependencies here, so the three sketches are small numpy
+# implementations of the standard algorithms.
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from chunkio import read_chunks
+from instrumentation import RunLog
+from schema import dtypes_for
+
+QUANTILE_COLUMNS = [
+    "ihpAmount", "haAmount", "onaAmount", "repairAmount", "rentalAssistanceAmount",
+    "personalPropertyAmount", "grossIncome"
+]
+DISTINCT_COLUMNS = ["disasterNumber", "county", "damagedCity", "damageCity", "damagedZipCode"]
+FREQUENCY_COLUMNS = [
+    "damagedCity", "damageCity", "county", "damagedStateAbbreviation", "applicantAge", "ownRent",
+    "residenceType"
+]
+
+DEFAULT_K = 200  # KLL accuracy parameter: about 1.3% rank error at 99% confidence
+DEFAULT_PRECISION = 12  # HyperLogLog registers = 2**12, about 1.6% standard error
+DEFAULT_WIDTH = 2048  # Count-min columns: overcount <= e/2048 (0.13%) of the rows ...
+DEFAULT_DEPTH = 4  # ... with probability 1 - e**-4 (98%)
+DEFAULT_CANDIDATES = 100  # Heavy-hitter keys kept per frequency sketch
+
+_MIN_CAPACITY = 8
+_LOW_32 = np.uint64(0xFFFFFFFF)
+
+
+def sketch_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".sketches.npz"
+
+
+def _hash(values):
+    """64-bit hashes of the values' text, so 12 and '12' (or a category and its string) hash alike."""
+    return pd.util.hash_array(np.asarray(values, dtype=object).astype(str).astype(object))
+
+
+def _bit_length(values):
+    """Vectorized int.bit_length() for uint64 values."""
+    values = values.copy()
+    length = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = values >= np.uint64(1 << shift)
+        length[big] += shift
+        values[big] >>= np.uint64(shift)
+    return length + (values > 0)
+
+
+class QuantileSketch:
+    """KLL sketch of a numeric column, plus its exact count, min, max, sum and sum of squares.
+
+    Level h holds items that each stand for 2**h values. A level over capacity is sorted and every
+    other item (random offset) is promoted to the next level, which keeps the total size about 3k.
+    """
+
+    def __init__(self, k=DEFAULT_K, seed=0):
+        self.k = k
+        self.n = 0
+        self.nulls = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(_MIN_CAPACITY, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        missing = np.isnan(values)
+        self.nulls += int(missing.sum())
+        values = values[~missing]
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.total += float(values.sum())
+        self.total_sq += float(np.dot(values, values))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays behind, so the promoted half always pairs up exactly
+                stay = len(items) % 2
+                promoted = items[stay + self._rng.integers(2)::2]
+                self.levels[level] = items[:stay]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def merge(self, other):
+        if other.k != self.k:
+            raise ValueError(f"Cannot merge KLL sketches with k={self.k} and k={other.k}")
+        self.n += other.n
+        self.nulls += other.nulls
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.total += other.total
+        self.total_sq += other.total_sq
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self._compress()
+        return self
+
+    def _sorted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        """Value at each quantile q in [0, 1]; q=0 and q=1 give the exact min and max."""
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if self.n == 0:
+            return np.full(len(q), np.nan)
+        items, cumulative = self._sorted()
+        index = np.searchsorted(cumulative, q * cumulative[-1], side="left").clip(0, len(items) - 1)
+        values = items[index]
+        values[q <= 0] = self.min
+        values[q >= 1] = self.max
+        return values
+
+    def cdf(self, points, strict=False):
+        """Estimated fraction of values <= each point (< each point with strict=True)."""
+        points = np.atleast_1d(np.asarray(points, dtype=np.float64))
+        if self.n == 0:
+            return np.full(len(points), np.nan)
+        items, cumulative = self._sorted()
+        index = np.searchsorted(items, points, side="left" if strict else "right")
+        below = np.where(index > 0, cumulative[np.maximum(index - 1, 0)], 0.0)
+        return below / cumulative[-1]
+
+    def rank_error(self):
+        """Normalized rank error at 99% confidence (the KLL bound published with DataSketches)."""
+        return 2.296 / self.k ** 0.9723
+
+    def mean(self):
+        return self.total / self.n if self.n else np.nan
+
+    def std(self):
+        if self.n < 2:
+            return np.nan
+        variance = (self.total_sq - self.total * self.total / self.n) / (self.n - 1)
+        return float(np.sqrt(max(variance, 0.0)))
+
+    def histogram(self, bins=30):
+        """(counts, edges) over [min, max]; each count is within 2 * rank_error() * n of the truth."""
+        edges = np.linspace(self.min, self.max, bins + 1)
+        cdf = self.cdf(edges)
+        cdf[0] = 0.0  # The first bin is closed on the left, like np.histogram
+        return np.diff(cdf) * self.n, edges
+
+    def box_stats(self, label=None):
+        """Matplotlib Axes.bxp() statistics with 1.5 IQR whiskers; outliers are not kept by the sketch."""
+        q1, med, q3 = self.quantile([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        return {
+            "label": label, "med": med, "q1": q1, "q3": q3, "mean": self.mean(),
+            "whislo": max(self.min, q1 - 1.5 * iqr), "whishi": min(self.max, q3 + 1.5 * iqr),
+            "fliers": [],
+        }
+
+    def state(self):
+        return {
+            "items": np.concatenate(self.levels),
+            "level_sizes": np.array([len(items) for items in self.levels], dtype=np.int64),
+            "stats": np.array([self.k, self.n, self.nulls, self.min, self.max, self.total, self.total_sq]),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        k, n, nulls, minimum, maximum, total, total_sq = state["stats"]
+        sketch = cls(k=int(k))
+        sketch.n, sketch.nulls = int(n), int(nulls)
+        sketch.min, sketch.max = float(minimum), float(maximum)
+        sketch.total, sketch.total_sq = float(total), float(total_sq)
+        sketch.levels = np.split(state["items"], np.cumsum(state["level_sizes"])[:-1])
+        return sketch
+
+
+class DistinctCounter:
+    """HyperLogLog distinct-value counter."""
+
+    def __init__(self, precision=DEFAULT_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values):
+        values = pd.Series(values).dropna()
+        if values.empty:
+            return self
+        hashes = _hash(values.unique())
+        suffix_bits = 64 - self.precision
+        register = (hashes >> np.uint64(suffix_bits)).astype(np.int64)
+        suffix = hashes & np.uint64((1 << suffix_bits) - 1)
+        # Position of the first 1 bit in the suffix; an all-zero suffix counts as suffix_bits + 1
+        rank = (suffix_bits - _bit_length(suffix) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, register, rank)
+        return self
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog sketches with precision {self.precision} and {other.precision}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and empty:
+            # Linear counting is more accurate while many registers are still empty
+            return m * np.log(m / empty)
+        return raw
+
+    def standard_error(self):
+        """Relative standard error of estimate()."""
+        return 1.04 / np.sqrt(len(self.registers))
+
+    def state(self):
+        return {"registers": self.registers}
+
+    @classmethod
+    def from_state(cls, state):
+        registers = state["registers"]
+        sketch = cls(precision=int(np.log2(len(registers))))
+        sketch.registers = registers.astype(np.uint8)
+        return sketch
+
+
+class FrequencySketch:
+    """Count-min table plus the candidate keys with the highest estimated counts (heavy hitters).
+
+    Estimates never undercount; they overcount by at most error_bound() with probability 1 - e**-depth.
+    """
+
+    def __init__(self, width=DEFAULT_WIDTH, depth=DEFAULT_DEPTH, capacity=DEFAULT_CANDIDATES):
+        self.capacity = capacity
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+        self.candidates = np.empty(0, dtype=object)
+
+    def _cells(self, keys):
+        # Double hashing: row i uses h1 + i * h2, all from one 64-bit hash
+        hashes = _hash(keys)
+        h1 = (hashes & _LOW_32).astype(np.int64)
+        h2 = (hashes >> np.uint64(32)).astype(np.int64) | 1
+        depth, width = self.table.shape
+        return [(h1 + row * h2) % width for row in range(depth)]
+
+    def update(self, values):
+        # Count each distinct value once per chunk, then add the counts to the table
+        counts = pd.Series(values).dropna().astype(str).value_counts(sort=False)
+        if counts.empty:
+            return self
+        keys = counts.index.to_numpy(dtype=object)
+        for row, cells in enumerate(self._cells(keys)):
+            np.add.at(self.table[row], cells, counts.to_numpy())
+        self.total += int(counts.sum())
+        self._refresh_candidates(keys)
+        return self
+
+    def _refresh_candidates(self, new_keys):
+        pool = pd.unique(np.concatenate([self.candidates, np.asarray(new_keys, dtype=object)]))
+        estimates = self.estimate(pool)
+        keep = np.argsort(-estimates, kind="stable")[:self.capacity]
+        self.candidates = pool[keep]
+
+    def merge(self, other):
+        if other.table.shape != self.table.shape:
+            raise ValueError(f"Cannot merge count-min tables of shape {self.table.shape} and {other.table.shape}")
+        self.table += other.table
+        self.total += other.total
+        self._refresh_candidates(other.candidates)
+        return self
+
+    def estimate(self, keys):
+        """Estimated count of each key."""
+        keys = np.asarray(keys, dtype=object).astype(str).astype(object)
+        if len(keys) == 0:
+            return np.empty(0, dtype=np.int64)
+        return np.min([self.table[row, cells] for row, cells in enumerate(self._cells(keys))], axis=0)
+
+    def error_bound(self):
+        """Maximum overcount of any estimate (with probability 1 - e**-depth)."""
+        return np.e / self.table.shape[1] * self.total
+
+    def top(self, n=10):
+        """The n heaviest candidate keys and their estimated counts, largest first."""
+        counts = pd.Series(self.estimate(self.candidates), index=self.candidates, dtype="int64")
+        return counts.sort_values(ascending=False, kind="stable").head(n)
+
+    def state(self):
+        return {
+            "table": self.table,
+            "candidates": np.asarray(self.candidates, dtype=str),
+            "meta": np.array([self.total, self.capacity], dtype=np.int64),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        total, capacity = state["meta"]
+        sketch = cls(width=state["table"].shape[1], depth=state["table"].shape[0], capacity=int(capacity))
+        sketch.table = state["table"].astype(np.int64)
+        sketch.total = int(total)
+        sketch.candidates = state["candidates"].astype(object)
+        return sketch
+
+
+_KINDS = {"quantile": QuantileSketch, "distinct": DistinctCounter, "frequency": FrequencySketch}
+
+
+class IncidentSketches:
+    """All sketches for one incident file: quantiles, distinct counts and frequencies by column."""
+
+    def __init__(self, quantile_columns=QUANTILE_COLUMNS, distinct_columns=DISTINCT_COLUMNS,
+                 frequency_columns=FREQUENCY_COLUMNS):
+        self.columns = {"quantile": list(quantile_columns), "distinct": list(distinct_columns),
+                        "frequency": list(frequency_columns)}
+        self.rows = 0
+        self.sketches = {kind: {} for kind in _KINDS}
+
+    @property
+    def quantiles(self):
+        return self.sketches["quantile"]
+
+    @property
+    def distinct(self):
+        return self.sketches["distinct"]
+
+    @property
+    def frequencies(self):
+        return self.sketches["frequency"]
+
+    def usecols(self, header):
+        """The sketched columns present in a file with this header."""
+        wanted = dict.fromkeys(col for columns in self.columns.values() for col in columns)
+        return [col for col in header if col in wanted]
+
+    def update(self, chunk):
+        for col in self.columns["quantile"]:
+            if col in chunk.columns:
+                values = pd.to_numeric(chunk[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+                self.quantiles.setdefault(col, QuantileSketch()).update(values)
+        for col in self.columns["distinct"]:
+            if col in chunk.columns:
+                self.distinct.setdefault(col, DistinctCounter()).update(chunk[col])
+        for col in self.columns["frequency"]:
+            if col in chunk.columns:
+                self.frequencies.setdefault(col, FrequencySketch()).update(chunk[col])
+        self.rows += len(chunk)
+        return self
+
+    def merge(self, other):
+        """Combine with the sketches of another file (e.g. to get statistics across incident types)."""
+        for kind, sketches in other.sketches.items():
+            for col, sketch in sketches.items():
+                if col in self.sketches[kind]:
+                    self.sketches[kind][col].merge(sketch)
+                else:
+                    self.sketches[kind][col] = _KINDS[kind].from_state(sketch.state())
+        self.rows += other.rows
+        return self
+
+    def describe(self):
+        """describe()-style table for the sketched numeric columns; quantiles are within ±rank_error."""
+        rows = {}
+        for col, sketch in self.quantiles.items():
+            q1, median, q3 = sketch.quantile([0.25, 0.5, 0.75])
+            rows[col] = {"count": sketch.n, "mean": sketch.mean(), "std": sketch.std(),
+                         "min": sketch.min if sketch.n else np.nan, "25%": q1, "50%": median, "75%": q3,
+                         "max": sketch.max if sketch.n else np.nan, "rank_error": sketch.rank_error()}
+        return pd.DataFrame.from_dict(rows, orient="index")
+
+    def distinct_counts(self):
+        return pd.DataFrame(
+            [[col, round(sketch.estimate()), sketch.standard_error()] for col, sketch in self.distinct.items()],
+            columns=["column", "distinct", "std_error"])
+
+    def top(self, col, n=10):
+        """Heaviest values of col as a DataFrame with their estimated counts and overcount bound."""
+        sketch = self.frequencies[col]
+        counts = sketch.top(n)
+        return pd.DataFrame({col: counts.index, "count": counts.to_numpy(),
+                             "max_overcount": round(sketch.error_bound())})
+
+    def save(self, file_path):
+        arrays = {"rows": np.array([self.rows], dtype=np.int64)}
+        for kind, sketches in self.sketches.items():
+            for col, sketch in sketches.items():
+                for name, array in sketch.state().items():
+                    arrays[f"{kind}|{col}|{name}"] = array
+        np.savez_compressed(file_path, **arrays)
+
+    @classmethod
+    def load(cls, file_path):
+        sketches = cls()
+        with np.load(file_path, allow_pickle=False) as arrays:
+            sketches.rows = int(arrays["rows"][0])
+            states = {}
+            for key in arrays.files:
+                if key == "rows":
+                    continue
+                kind, col, name = key.split("|")
+                states.setdefault((kind, col), {})[name] = arrays[key]
+        for (kind, col), state in states.items():
+            sketches.sketches[kind][col] = _KINDS[kind].from_state(state)
+        return sketches
+
+
+def load_sketches(csv_path):
+    """The sketches saved for csv_path, or None if they have not been built."""
+    path = sketch_path(csv_path)
+    return IncidentSketches.load(path) if os.path.exists(path) else None
+
+
+def build_sketches(file_path, chunk_size=100000, run_log=None):
+    """Sketch file_path in one streaming pass and save the result next to it."""
+    sketches = IncidentSketches()
+    usecols = sketches.usecols(list(pd.read_csv(file_path, nrows=0).columns))
+    owns_log = run_log is None
+    run_log = run_log or RunLog("sketches")
+    stage = run_log.stage(f"sketch:{os.path.basename(file_path)}", input_path=file_path,
+                          output_path=sketch_path(file_path))
+    chunks = stage.timed_chunks(read_chunks(file_path, chunk_size, usecols=usecols,
+                                            dtype=dtypes_for(file_path, usecols=usecols, cleaned=True)))
+    for chunk in chunks:
+        sketches.update(chunk)
+        stage.lap("transform")
+        stage.end_chunk(chunk)
+    with stage.phase("write"):
+        sketches.save(sketch_path(file_path))
+    stage.finish()
+    if owns_log:
+        run_log.save()
+    print(f"Sketched {sketches.rows:,} rows of {file_path} → {sketch_path(file_path)}")
+    return sketches
+
+
+def _load_or_fail(csv_path):
+    sketches = load_sketches(csv_path)
+    if sketches is None:
+        raise FileNotFoundError(f"No sketches for '{csv_path}'; run 'python sketches.py build {csv_path}' first")
+    return sketches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and read approximate-query sketches for the incident files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Sketch each CSV in one pass (saved as <name>.sketches.npz)")
+    build.add_argument("csv_paths", nargs="+")
+    build.add_argument("--chunk-size", type=int, default=100000)
+
+    describe = subparsers.add_parser("describe", help="Approximate describe() and distinct counts")
+    describe.add_argument("csv_paths", nargs="+", help="Several files are merged into one summary")
+
+    top = subparsers.add_parser("top", help="Heaviest values of a categorical column")
+    top.add_argument("csv_path")
+    top.add_argument("column")
+    top.add_argument("-n", type=int, default=10)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        run_log = RunLog("sketches")
+        for csv_path in args.csv_paths:
+            build_sketches(csv_path, args.chunk_size, run_log=run_log)
+        run_log.save()
+        return
+
+    if args.command == "top":
+        print(_load_or_fail(args.csv_path).top(args.column, args.n).to_string(index=False))
+        return
+
+    sketches = _load_or_fail(args.csv_paths[0])
+    for csv_path in args.csv_paths[1:]:
+        sketches.merge(_load_or_fail(csv_path))
+    print(f"{sketches.rows:,} rows")
+    print(sketches.describe().to_string())
+    print(sketches.distinct_counts().to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,74 @@
-import pandas as pd
 import os
 import re
+from chunkio import ChunkWriter, read_chunks
+from instrumentation import RunLog
+from schema import dtypes_for
+from sketches import IncidentSketches, load_sketches, sketch_path
 
 # Define input file path
 input_file_path = "cleaned_fema_filtered.csv"  # Update with actual file path
 
 # Define output directory
 output_dir = "split_by_incidentType"
-os.makedirs(output_dir, exist_ok=True)
 
 # Define chunk size for reading large datasets
 chunk_size = 50000  # Adjust based on available memory
 
+# Also build the approximate-query sketches (sketches.py) for each incident file in the same pass
+build_sketches = True
+
 # Function to create safe filenames
 def sanitize_filename(name):
     """Replace spaces and special characters to create a safe filename."""
     return re.sub(r'[^a-zA-Z0-9]', '_', name) + ".csv"
 
-# Dictionary to track open file handles
-file_handles = {}
+def split_by_incident_type(input_file_path=input_file_path, output_dir=output_dir, chunk_size=chunk_size,
+                           build_sketches=build_sketches):
+    """Append every row of input_file_path to <output_dir>/<incidentType>.csv; returns the files written."""
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Dictionary to track open writers, one per incidentType file
+    file_handles = {}
+    file_sketches = {}
+
+    run_log = RunLog("splitbyincidenttype")
+    stage = run_log.stage("split", input_path=input_file_path)
 
-# Read dataset in chunks and process
-with pd.read_csv(input_file_path, chunksize=chunk_size, dtype=str) as reader:
-    for chunk in reader:
+    # Read dataset in chunks and process
+    for chunk in stage.timed_chunks(read_chunks(input_file_path, chunk_size, dtype=dtypes_for(input_file_path, cleaned=True))):
         # Ensure incidentType column exists
         if "incidentType" not in chunk.columns:
             raise ValueError("Column 'incidentType' not found in dataset.")
 
         # Process each unique incidentType in the chunk
-        for incident_type, subset in chunk.groupby("incidentType"):
+        for incident_type, subset in chunk.groupby("incidentType", observed=True):
             # Generate a safe filename based on incidentType
             filename = sanitize_filename(incident_type)
             file_path = os.path.join(output_dir, filename)
 
-            # Append the subset to the corresponding file (write header only for first write)
-            subset.to_csv(file_path, mode="a", header=not os.path.exists(file_path), index=False)
+            # Append the subset to the corresponding file (header only if the file is new)
+            if file_path not in file_handles:
+                if build_sketches:
+                    # Rows appended to an existing file are added to its saved sketches (they are mergeable)
+                    previous = load_sketches(file_path) if os.path.exists(file_path) else None
+                    file_sketches[file_path] = previous or IncidentSketches()
+                file_handles[file_path] = ChunkWriter(file_path, mode="a")
+            file_handles[file_path].write(subset)
+            if build_sketches:
+                file_sketches[file_path].update(subset)
+        stage.lap("write")
+        stage.end_chunk(chunk)
+
+    # Flush and fsync every split file
+    for writer in file_handles.values():
+        writer.close()
+    for file_path, sketches in file_sketches.items():
+        sketches.save(sketch_path(file_path))
+    stage.finish(writers=file_handles.values())
+    run_log.save()
+    return list(file_handles)
+
 
-print(f"Splitting complete! Files are saved in '{output_dir}' directory.")
+if __name__ == "__main__":
+    split_by_incident_type()
+    print(f"Splitting complete! Files are saved in '{output_dir}' directory.")
@@ -0,0 +1,294 @@
+# Seeded synthetic IHP-VR and DisasterDeclarationsSummaries generator.
+# Produces files with the same column names and value shapes as the OpenFEMA downloads so the
+# pipeline scripts and benchmark.py can run at production scale (10M+ rows) without the real data.
+# Registrations are written chunk by chunk, so memory does not grow with the number of rows.
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from chunkio import ChunkWriter
+
+IHP_VR_FILE = "IndividualsAndHouseholdsProgramValidRegistrations.csv"
+DECLARATIONS_FILE = "DisasterDeclarationsSummaries.csv"
+
+# The nine incident types encoding.py expects after splitbyincidenttype.py, with rough frequencies
+INCIDENT_TYPES = ["Severe Storm", "Hurricane", "Flood", "Tornado", "Fire", "Severe Ice Storm",
+                  "Mud/Landslide", "Typhoon", "Other"]
+INCIDENT_WEIGHTS = [0.30, 0.30, 0.18, 0.08, 0.06, 0.03, 0.02, 0.01, 0.02]
+
+STATES = ["AL", "CA", "FL", "GA", "IA", "KY", "LA", "MO", "MS", "NC", "NJ", "NY", "OK", "PR", "SC",
+          "TN", "TX", "VA", "WA", "GU"]
+STATE_FIPS = [1, 6, 12, 13, 19, 21, 22, 29, 28, 37, 34, 36, 40, 72, 45, 47, 48, 51, 53, 66]
+
+AGE_GROUPS = ["19-34", "35-49", "50-64", "65+"]
+AGE_WEIGHTS = [0.27, 0.28, 0.27, 0.18]
+RESIDENCE_TYPES = ["House/Duplex", "Apartment", "Mobile Home", "Condo", "Townhouse", "Other"]
+RESIDENCE_WEIGHTS = [0.55, 0.22, 0.12, 0.04, 0.04, 0.03]
+HA_STATUSES = ["Approved", "Ineligible", "Pending", "Withdrawn"]
+RENTER_DAMAGE_LEVELS = ["Minor", "Moderate", "Major", "Destroyed"]
+
+IHP_MAX = 42500.0  # Statutory per-household IHP cap used for clipping amounts
+
+
+def _zipf_weights(n, exponent=1.1):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+class SyntheticFEMA:
+    """Disaster / geography layout shared by the declarations and the registrations.
+
+    Each disaster belongs to one state and designates a handful of that state's counties;
+    each county has cities_per_county cities and each city zips_per_city zip codes.
+    """
+
+    def __init__(self, n_disasters=500, n_counties=2000, cities_per_county=4, zips_per_city=3,
+                 max_counties_per_disaster=25, seed=42):
+        self.seed = seed
+        self.n_disasters = n_disasters
+        self.n_counties = n_counties
+        self.cities_per_county = cities_per_county
+        self.zips_per_city = zips_per_city
+        rng = np.random.default_rng(seed)
+
+        # Geography: counties spread over the states, cities and zips nested under counties
+        self.county_state = rng.integers(0, len(STATES), n_counties)
+        self.county_fips = np.zeros(n_counties, dtype=np.int16)
+        for state in range(len(STATES)):
+            in_state = np.flatnonzero(self.county_state == state)
+            self.county_fips[in_state] = 2 * np.arange(1, len(in_state) + 1) - 1
+        self.county_names = np.array([f"County{c:04d} (County)" for c in range(n_counties)], dtype=object)
+        n_cities = n_counties * cities_per_county
+        self.city_names = np.array([f"CITY {c:05d}" for c in range(n_cities)], dtype=object)
+        self.zip_codes = np.array([f"{z:05d}" for z in rng.choice(99999, n_cities * zips_per_city, replace=False)],
+                                  dtype=object)
+
+        # Disasters: numbers, incident type, state, declaration date and designated counties
+        self.disaster_numbers = np.sort(rng.choice(np.arange(1000, 5000), n_disasters, replace=False)).astype(np.int32)
+        self.disaster_incident = rng.choice(len(INCIDENT_TYPES), n_disasters, p=INCIDENT_WEIGHTS)
+        # Every incident type gets at least one disaster, so each per-incident file exists downstream
+        self.disaster_incident[rng.permutation(n_disasters)[:len(INCIDENT_TYPES)]] = np.arange(len(INCIDENT_TYPES))
+        self.disaster_state = rng.integers(0, len(STATES), n_disasters)
+        start = np.datetime64("2003-01-01")
+        days = (np.datetime64("2024-12-31") - start).astype(int)
+        self.disaster_date = start + np.sort(rng.integers(0, days, n_disasters)).astype("timedelta64[D]")
+        self.disaster_type = rng.choice(["DR", "EM", "FM"], n_disasters, p=[0.8, 0.12, 0.08])
+
+        counties = []
+        for d in range(n_disasters):
+            in_state = np.flatnonzero(self.county_state == self.disaster_state[d])
+            if len(in_state) == 0:
+                in_state = np.array([rng.integers(0, n_counties)])
+            size = rng.integers(1, min(max_counties_per_disaster, len(in_state)) + 1)
+            counties.append(np.sort(rng.choice(in_state, size, replace=False)))
+        self.disaster_counties = counties
+        self.county_offsets = np.concatenate([[0], np.cumsum([len(c) for c in counties])])
+        self.county_flat = np.concatenate(counties)
+
+        # A few large disasters account for most registrations, as in the real data; the uniform
+        # share keeps every disaster (and so every incident type) from being empty at small scales
+        self.disaster_weights = 0.9 * rng.permutation(_zipf_weights(n_disasters)) + 0.1 / n_disasters
+
+    def declarations(self):
+        """One row per (disaster, designated county), like DisasterDeclarationsSummaries."""
+        rng = np.random.default_rng(self.seed + 1)
+        rows = []
+        for d, counties in enumerate(self.disaster_counties):
+            incident = INCIDENT_TYPES[self.disaster_incident[d]]
+            state = STATES[self.disaster_state[d]]
+            date = pd.Timestamp(self.disaster_date[d])
+            begin = date - pd.Timedelta(days=int(rng.integers(0, 30)))
+            end = begin + pd.Timedelta(days=int(rng.integers(0, 60)))
+            ih_declared = int(rng.random() < 0.7)
+            for county in counties:
+                rows.append({
+                    "femaDeclarationString": f"{self.disaster_type[d]}-{self.disaster_numbers[d]}-{state}",
+                    "disasterNumber": self.disaster_numbers[d],
+                    "state": state,
+                    "declarationType": self.disaster_type[d],
+                    "declarationDate": date.strftime("%Y-%m-%dT00:00:00.000Z"),
+                    "fyDeclared": date.year + (1 if date.month >= 10 else 0),
+                    "incidentType": incident,
+                    "declarationTitle": f"{state} {incident.upper()} {date.year}",
+                    "ihProgramDeclared": ih_declared,
+                    "iaProgramDeclared": int(rng.random() < 0.3),
+                    "paProgramDeclared": int(rng.random() < 0.9),
+                    "hmProgramDeclared": int(rng.random() < 0.8),
+                    "incidentBeginDate": begin.strftime("%Y-%m-%dT00:00:00.000Z"),
+                    "incidentEndDate": end.strftime("%Y-%m-%dT00:00:00.000Z"),
+                    "fipsStateCode": STATE_FIPS[self.county_state[county]],
+                    "fipsCountyCode": int(self.county_fips[county]),
+                    "placeCode": 99000 + int(self.county_fips[county]),
+                    "designatedArea": self.county_names[county],
+                    "region": int(self.disaster_state[d] % 10) + 1,
+                })
+        return pd.DataFrame(rows)
+
+    def registrations(self, n_rows, chunk_index=0, missing_rate=0.02):
+        """One chunk of IHP-VR registrations; chunk_index seeds the chunk so output is reproducible."""
+        rng = np.random.default_rng([self.seed, chunk_index])
+        n = n_rows
+
+        disaster = rng.choice(self.n_disasters, n, p=self.disaster_weights)
+        sizes = self.county_offsets[disaster + 1] - self.county_offsets[disaster]
+        county = self.county_flat[self.county_offsets[disaster] + (rng.random(n) * sizes).astype(np.int64)]
+        city = county * self.cities_per_county + rng.integers(0, self.cities_per_county, n)
+        zip_index = city * self.zips_per_city + rng.integers(0, self.zips_per_city, n)
+
+        owner = rng.random(n) < 0.55
+        age = rng.choice(len(AGE_GROUPS), n, p=AGE_WEIGHTS)
+        destroyed = rng.random(n) < 0.03
+        damage = rng.random(n) < 0.6
+        ihp_eligible = damage & (rng.random(n) < 0.55) | destroyed
+
+        def amount(eligible, mean, sigma, cap=IHP_MAX):
+            values = np.minimum(rng.lognormal(mean, sigma, n), cap)
+            return np.round(np.where(eligible, values, 0.0), 2)
+
+        repair_eligible = ihp_eligible & owner & (rng.random(n) < 0.6)
+        replacement_eligible = destroyed & owner
+        rental_eligible = ihp_eligible & (rng.random(n) < 0.7)
+        personal_eligible = ihp_eligible & (rng.random(n) < 0.4)
+        repair_amount = amount(repair_eligible, 8.3, 1.1)
+        replacement_amount = amount(replacement_eligible, 9.8, 0.5)
+        rental_amount = amount(rental_eligible, 7.6, 0.6)
+        personal_amount = amount(personal_eligible, 7.5, 1.0)
+        ha_amount = np.minimum(repair_amount + replacement_amount + rental_amount, IHP_MAX)
+        ona_amount = np.minimum(personal_amount, IHP_MAX - ha_amount)
+        ihp_amount = np.round(ha_amount + ona_amount, 2)
+
+        rpfvl = np.round(np.where(owner & damage, rng.lognormal(8.5, 1.3, n), 0.0), 2)
+        ppfvl = np.round(np.where(damage, rng.lognormal(7.2, 1.2, n), 0.0), 2)
+        flood_damage = rng.random(n) < np.where(self.disaster_incident[disaster] == 2, 0.7, 0.1)
+
+        chunk = pd.DataFrame({
+            "incidentType": np.array(INCIDENT_TYPES, dtype=object)[self.disaster_incident[disaster]],
+            "declarationDate": pd.to_datetime(self.disaster_date[disaster]).strftime("%Y-%m-%dT00:00:00.000Z"),
+            "disasterNumber": self.disaster_numbers[disaster],
+            "county": self.county_names[county],
+            "damagedStateAbbreviation": np.array(STATES, dtype=object)[self.county_state[county]],
+            "damagedCity": self.city_names[city],
+            "damagedZipCode": self.zip_codes[zip_index],
+            "applicantAge": np.array(AGE_GROUPS, dtype=object)[age],
+            "householdComposition": rng.integers(1, 7, n),
+            "occupantsUnderTwo": rng.poisson(0.1, n),
+            "occupants2to5": rng.poisson(0.3, n),
+            "occupants6to18": rng.poisson(0.6, n),
+            "occupants19to64": rng.poisson(1.4, n),
+            "occupants65andOver": rng.poisson(0.3, n),
+            "grossIncome": np.round(rng.lognormal(10.4, 0.9, n), 0),
+            "ownRent": np.where(owner, "Owner", "Renter").astype(object),
+            "primaryResidence": (rng.random(n) < 0.97).astype(int),
+            "residenceType": rng.choice(RESIDENCE_TYPES, n, p=RESIDENCE_WEIGHTS).astype(object),
+            "homeOwnersInsurance": (owner & (rng.random(n) < 0.5)).astype(int),
+            "floodInsurance": (rng.random(n) < 0.08).astype(int),
+            "registrationMethod": rng.choice(["Internet", "Phone", "Disaster Recovery Center"], n).astype(object),
+            "ihpReferral": np.ones(n, dtype=int),
+            "ihpEligible": ihp_eligible.astype(int),
+            "ihpAmount": ihp_amount,
+            "fipAmount": 0.0,
+            "haReferral": damage.astype(int),
+            "haEligible": (ha_amount > 0).astype(int),
+            "haAmount": ha_amount,
+            "haStatus": np.where(ha_amount > 0, "Approved",
+                                 rng.choice(HA_STATUSES[1:], n)).astype(object),
+            "onaReferral": (rng.random(n) < 0.5).astype(int),
+            "onaEligible": (ona_amount > 0).astype(int),
+            "onaAmount": ona_amount,
+            "utilitiesOut": (rng.random(n) < 0.3).astype(int),
+            "homeDamage": damage.astype(int),
+            "autoDamage": (rng.random(n) < 0.1).astype(int),
+            "emergencyNeeds": (rng.random(n) < 0.2).astype(int),
+            "foodNeed": (rng.random(n) < 0.15).astype(int),
+            "shelterNeed": (rng.random(n) < 0.1).astype(int),
+            "accessFunctionalNeeds": (rng.random(n) < 0.05).astype(int),
+            "sbaEligible": (rng.random(n) < 0.2).astype(int),
+            "sbaApproved": (rng.random(n) < 0.05).astype(int),
+            "inspnIssued": damage.astype(int),
+            "inspnReturned": (damage & (rng.random(n) < 0.9)).astype(int),
+            "habitabilityRepairsRequired": (repair_amount > 0).astype(int),
+            "rpfvl": rpfvl,
+            "ppfvl": ppfvl,
+            "renterDamageLevel": np.where(owner, None,
+                                          rng.choice(RENTER_DAMAGE_LEVELS, n, p=[0.5, 0.3, 0.15, 0.05])).astype(object),
+            "destroyed": destroyed.astype(int),
+            "waterLevel": np.round(np.where(flood_damage, rng.gamma(2.0, 12.0, n), 0.0), 1),
+            "highWaterLocation": np.where(flood_damage, rng.choice(["Basement", "Main Living Area", "Crawlspace"], n), None).astype(object),
+            "floodDamage": flood_damage.astype(int),
+            "floodDamageAmount": np.round(np.where(flood_damage, rng.lognormal(8.0, 1.0, n), 0.0), 2),
+            "foundationDamage": (rng.random(n) < 0.05).astype(int),
+            "foundationDamageAmount": np.round(np.where(rng.random(n) < 0.05, rng.lognormal(7.5, 1.0, n), 0.0), 2),
+            "roofDamage": (rng.random(n) < 0.2).astype(int),
+            "roofDamageAmount": np.round(np.where(rng.random(n) < 0.2, rng.lognormal(7.8, 1.0, n), 0.0), 2),
+            "tsaEligible": (rng.random(n) < 0.1).astype(int),
+            "tsaCheckedIn": (rng.random(n) < 0.03).astype(int),
+            "rentalAssistanceEligible": rental_eligible.astype(int),
+            "rentalAssistanceAmount": rental_amount,
+            "repairAssistanceEligible": repair_eligible.astype(int),
+            "repairAmount": repair_amount,
+            "replacementAssistanceEligible": replacement_eligible.astype(int),
+            "replacementAmount": replacement_amount,
+            "personalPropertyEligible": personal_eligible.astype(int),
+            "personalPropertyAmount": personal_amount,
+            "ihpMax": (ihp_amount >= IHP_MAX).astype(int),
+            "haMax": (ha_amount >= IHP_MAX).astype(int),
+            "onaMax": (ona_amount >= IHP_MAX).astype(int),
+        })
+        chunk.insert(0, "id", [f"{chunk_index:06d}-{i:08d}" for i in range(n)])
+
+        # Blank out a share of the fields that are often missing in the real file
+        if missing_rate > 0:
+            for col in ["applicantAge", "ownRent", "residenceType", "county", "damagedCity", "grossIncome",
+                        "homeOwnersInsurance", "floodInsurance", "ihpEligible"]:
+                mask = rng.random(n) < missing_rate
+                if chunk[col].dtype == object:
+                    chunk.loc[mask, col] = None
+                else:
+                    chunk[col] = chunk[col].astype("float64").where(~mask)
+                    if col in ("homeOwnersInsurance", "floodInsurance", "ihpEligible"):
+                        chunk[col] = chunk[col].astype("Int8")
+        return chunk
+
+
+def generate(out_dir=".", rows=1_000_000, chunk_size=500_000, n_disasters=500, n_counties=2000,
+             cities_per_county=4, zips_per_city=3, missing_rate=0.02, seed=42):
+    """Write DisasterDeclarationsSummaries.csv and the IHP-VR file into out_dir; returns their paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    layout = SyntheticFEMA(n_disasters=n_disasters, n_counties=n_counties, cities_per_county=cities_per_county,
+                           zips_per_city=zips_per_city, seed=seed)
+
+    declarations_path = os.path.join(out_dir, DECLARATIONS_FILE)
+    layout.declarations().to_csv(declarations_path, index=False)
+
+    ihp_vr_path = os.path.join(out_dir, IHP_VR_FILE)
+    with ChunkWriter(ihp_vr_path) as writer:
+        for chunk_index, start in enumerate(range(0, rows, chunk_size)):
+            writer.write(layout.registrations(min(chunk_size, rows - start), chunk_index, missing_rate))
+            print(f"Generated {min(start + chunk_size, rows):,}/{rows:,} registrations", flush=True)
+
+    return ihp_vr_path, declarations_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic IHP-VR and declarations CSVs.")
+    parser.add_argument("--out-dir", default="synthetic_data")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=500_000)
+    parser.add_argument("--disasters", type=int, default=500)
+    parser.add_argument("--counties", type=int, default=2000)
+    parser.add_argument("--cities-per-county", type=int, default=4)
+    parser.add_argument("--zips-per-city", type=int, default=3)
+    parser.add_argument("--missing-rate", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    ihp_vr_path, declarations_path = generate(args.out_dir, args.rows, args.chunk_size, args.disasters,
+                                              args.counties, args.cities_per_county, args.zips_per_city,
+                                              args.missing_rate, args.seed)
+    print(f"Saved {ihp_vr_path} and {declarations_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# Successive-halving hyperparameter search for the zeroR.py tree and forest baselines.
+# For each incident file, random candidates are scored (cross-validated MAE on ihpAmount) on a small
+# sample of the training rows; the best 1/factor of them move on to a sample factor times larger,
+# until the survivors are fitted on all training rows. Candidates are evaluated in parallel across
+# cores. The best configuration per model is saved next to the file as <name>.best_params.json,
+# and zeroR.py picks it up on later runs.
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables HalvingRandomSearchCV)
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import HalvingRandomSearchCV, train_test_split
+from sklearn.tree import DecisionTreeRegressor
+
+from encodingstore import read_csv_with_codes
+from schema import dtypes_for
+
+TARGET = "ihpAmount"
+SEARCH_SPACES = {
+    "Random Tree": (DecisionTreeRegressor, {
+        "max_depth": [None, 4, 8, 12, 16, 24],
+        "min_samples_split": [2, 5, 10, 20],
+        "min_samples_leaf": [1, 2, 5, 10, 20, 50],
+        "max_features": [None, "sqrt", 0.5],
+    }),
+    "Random Forest": (RandomForestRegressor, {
+        "n_estimators": [50, 100, 200, 400],
+        "max_depth": [None, 8, 16, 32],
+        "min_samples_leaf": [1, 2, 5, 10, 20],
+        "max_features": [1.0, "sqrt", 0.5],
+    }),
+}
+
+
+def best_params_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".best_params.json"
+
+
+def load_training_data(csv_path, target_column=TARGET):
+    """Features and target prepared the way zeroR.py prepares them, split 80/20 with the same seed."""
+    df = read_csv_with_codes(csv_path, dtype=dtypes_for(csv_path, cleaned=True)).dropna()
+    if target_column not in df.columns:
+        raise ValueError(f"Target column '{target_column}' not found in {csv_path}")
+    X = pd.get_dummies(df.drop(columns=[target_column]))
+    y = df[target_column]
+    return train_test_split(X, y, test_size=0.2, random_state=42)
+
+
+def search(model_name, X_train, y_train, n_candidates=32, factor=3, cv=3, n_jobs=-1, seed=42):
+    """Run successive halving for one model; returns the fitted HalvingRandomSearchCV."""
+    estimator_class, space = SEARCH_SPACES[model_name]
+    # The search spreads candidates over the cores, so each forest keeps its default single-threaded fit
+    estimator = estimator_class(random_state=42)
+    searcher = HalvingRandomSearchCV(
+        estimator, space, n_candidates=n_candidates, factor=factor, resource="n_samples",
+        min_resources="exhaust", cv=cv, scoring="neg_mean_absolute_error", refit=True,
+        n_jobs=n_jobs, random_state=seed)
+    searcher.fit(X_train, y_train)
+    return searcher
+
+
+def tune(csv_path, target_column=TARGET, models=tuple(SEARCH_SPACES), n_candidates=32, factor=3, cv=3,
+         n_jobs=-1, seed=42):
+    """Search each model's hyperparameters for csv_path and save the best configurations."""
+    X_train, X_test, y_train, y_test = load_training_data(csv_path, target_column)
+    print(f"Tuning {csv_path}: {len(X_train):,} training rows, {X_train.shape[1]} features")
+
+    results = {}
+    for model_name in models:
+        start_time = time.time()
+        searcher = search(model_name, X_train, y_train, n_candidates, factor, cv, n_jobs, seed)
+        for iteration, (resources, candidates) in enumerate(zip(searcher.n_resources_, searcher.n_candidates_)):
+            print(f"  {model_name} round {iteration + 1}: {candidates} candidates on {resources:,} rows")
+        test_mae = mean_absolute_error(y_test, searcher.best_estimator_.predict(X_test))
+        results[model_name] = {
+            "params": searcher.best_params_,
+            "cv_mae": -float(searcher.best_score_),
+            "test_mae": float(test_mae),
+            "rounds": [[int(r), int(c)] for r, c in zip(searcher.n_resources_, searcher.n_candidates_)],
+            "seconds": round(time.time() - start_time, 2),
+        }
+        print(f"  {model_name} best: {searcher.best_params_} (CV MAE {-searcher.best_score_:.2f}, "
+              f"test MAE {test_mae:.2f}, {results[model_name]['seconds']}s)")
+
+    saved = {"file": os.path.basename(csv_path), "target": target_column, "rows": len(X_train) + len(X_test),
+             "searched_at": datetime.now().isoformat(timespec="seconds"), "models": results}
+    with open(best_params_path(csv_path), "w") as f:
+        json.dump(saved, f, indent=2, default=_json_default)
+    print(f"Best configurations saved to {best_params_path(csv_path)}")
+    return saved
+
+
+def _json_default(value):
+    # best_params_ can hold numpy scalars
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def load_best_params(csv_path, model_name):
+    """Saved best hyperparameters for model_name on csv_path, or {} if it has not been tuned."""
+    path = best_params_path(csv_path)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)["models"].get(model_name, {}).get("params", {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Successive-halving search for the tree and forest baselines.")
+    parser.add_argument("csv_paths", nargs="+", help="Incident files, e.g. Fire.csv Other.csv")
+    parser.add_argument("--models", nargs="+", choices=list(SEARCH_SPACES), default=list(SEARCH_SPACES))
+    parser.add_argument("--candidates", type=int, default=32, help="Candidates in the first round")
+    parser.add_argument("--factor", type=int, default=3, help="Keep 1/factor of the candidates per round")
+    parser.add_argument("--cv", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=-1, help="Parallel workers (-1 = all cores)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for csv_path in args.csv_paths:
+        try:
+            tune(csv_path, models=args.models, n_candidates=args.candidates, factor=args.factor, cv=args.cv,
+                 n_jobs=args.jobs, seed=args.seed)
+        except ValueError as e:
+            # Too few rows for the cross-validation folds, or no target column
+            print(f"Skipping {csv_path}: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,9 @@ from sklearn.tree import DecisionTreeRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error
 import os
+from schema import dtypes_for
+from modelstore import ModelStore
+from sketches import load_sketches
 
 def visualize_data(df, target_column='ihpAmount'):
     # Display basic info about the dataset
@@ -24,7 +27,7 @@ def visualize_data(df, target_column='ihpAmount'):
 
     # Correlation heatmap
     plt.figure(figsize=(10, 6))
-    corr_matrix = df.corr()
+    corr_matrix = df.corr(numeric_only=True)
     sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', fmt='.2f', linewidths=0.5)
     plt.title("Correlation Heatmap")
     plt.tight_layout()
@@ -45,8 +48,54 @@ def visualize_data(df, target_column='ihpAmount'):
     plt.tight_layout()
     plt.show()
 
-def absolute_accuracy(csv_path, target_column='ihpAmount', chunksize=10000):
-    chunk_iter = pd.read_csv(csv_path, chunksize=chunksize)
+def visualize_sketches(csv_path, target_column='ihpAmount', top_column='damagedCity', bins=30):
+    # Approximate mode: the same summaries drawn from the saved sketches instead of a full scan
+    sketches = load_sketches(csv_path)
+    if sketches is None:
+        print(f"No sketches for {csv_path}; run 'python sketches.py build {csv_path}' first.")
+        return
+    print(f"{sketches.rows:,} rows (approximate)")
+    print(sketches.describe())
+    print(sketches.distinct_counts())
+
+    sketch = sketches.quantiles[target_column]
+    error = f"±{sketch.rank_error():.1%} rank error"
+
+    # Histogram of target column from the quantile sketch
+    counts, edges = sketch.histogram(bins)
+    plt.figure(figsize=(8, 6))
+    plt.bar(edges[:-1], counts, width=np.diff(edges), align='edge', color='blue', alpha=0.6)
+    plt.title(f"Distribution of {target_column} (approximate, {error})")
+    plt.xlabel(target_column)
+    plt.ylabel("Frequency")
+    plt.tight_layout()
+    plt.show()
+
+    # Boxplot of the target column; the sketch keeps no individual outliers
+    fig, ax = plt.subplots(figsize=(8, 6))
+    ax.bxp([sketch.box_stats(label=target_column)], vert=False, showfliers=False,
+           boxprops={'color': 'green'})
+    ax.set_title(f"Boxplot of {target_column} (approximate, {error})")
+    ax.set_xlabel(target_column)
+    plt.tight_layout()
+    plt.show()
+
+    # Top-k values of a categorical column from the count-min sketch
+    if top_column in sketches.frequencies and len(sketches.frequencies[top_column].candidates):
+        top = sketches.top(top_column, n=15)
+        plt.figure(figsize=(8, 6))
+        sns.barplot(x=top['count'], y=top[top_column].astype(str), color='skyblue')
+        plt.title(f"Top {top_column} values (counts overestimate by at most {top['max_overcount'].iloc[0]:,})")
+        plt.xlabel("Count")
+        plt.ylabel(top_column)
+        plt.tight_layout()
+        plt.show()
+
+def absolute_accuracy(csv_path, target_column='ihpAmount', chunksize=10000, model_store=None):
+    # Fitted models are reused while the data, features and hyperparameters are unchanged
+    # (the store, and its model_cache/ directory, is only created when a model is fitted)
+    model_store = model_store or ModelStore()
+    chunk_iter = pd.read_csv(csv_path, chunksize=chunksize, dtype=dtypes_for(csv_path, cleaned=True))
 
     # Initialize variables to accumulate results
     acc_zeroR_list = []
@@ -77,15 +126,12 @@ def absolute_accuracy(csv_path, target_column='ihpAmount', chunksize=10000):
         mae_zeroR = mean_absolute_error(y_test, y_pred_zeroR)
         
         # Random Tree
-        tree = DecisionTreeRegressor(random_state=42)
-        tree.fit(X_train, y_train)
-        y_pred_tree = tree.predict(X_test)
+        tree, y_pred_tree = model_store.fit_predict(DecisionTreeRegressor(random_state=42), X_train, y_train, X_test)
         mae_tree = mean_absolute_error(y_test, y_pred_tree)
 
         # Random Forest
-        forest = RandomForestRegressor(n_estimators=100, random_state=42)
-        forest.fit(X_train, y_train)
-        y_pred_forest = forest.predict(X_test)
+        forest, y_pred_forest = model_store.fit_predict(RandomForestRegressor(n_estimators=100, random_state=42),
+                                                       X_train, y_train, X_test)
         mae_forest = mean_absolute_error(y_test, y_pred_forest)
 
         # Absolute scale: compare to mean of true values
@@ -128,9 +174,9 @@ def absolute_accuracy(csv_path, target_column='ihpAmount', chunksize=10000):
         plt.text(bar.get_x() + bar.get_width()/2, yval + 1, f"{yval:.1f}%", ha='center', va='bottom')
 
     # Save the figure as a PDF in the current directory
-    current_directory = os.path.dirname(os.path.abspath(__file__))
+    current_directory = os.getcwd()
     file_name = f"model_accuracy_comparison_{os.path.basename(csv_path).replace('.csv', '')}.pdf"
-    #file_path = os.path.join(current_directory, file_name)
+    file_path = os.path.join(current_directory, file_name)
     plt.tight_layout()
     plt.savefig(file_path, format="pdf")
 
@@ -138,5 +184,6 @@ def absolute_accuracy(csv_path, target_column='ihpAmount', chunksize=10000):
     plt.show()
 
 # Run the function with your desired CSV file
-absolute_accuracy("other.csv")  # Change "other.csv" to your new file name
+if __name__ == "__main__":
+    absolute_accuracy("other.csv")  # Change "other.csv" to your new file name
  
\ No newline at end of file
@@ -3,6 +3,33 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 import sys
+from bootstrap import bootstrap_file
+from schema import dtypes_for
+from rollup import amount_summary, load_rollup
+
+# Directory written by rollup.py; when it exists the amount means and standard errors are
+# computed from its sums over every Fire row instead of from the rows read below
+rollup_dir = "rollups"
+# Poisson-bootstrap replicates behind the 95% intervals (percentiles of the replicate means, which
+# follow the skew of the amounts); 0 falls back to mean +- 1.96 standard errors
+bootstrap_replicates = 1000
+
+AGE_MAPPING = {
+    '19-34': 27,
+    '35-49': 42,
+    '50-64': 57,
+    '65+': 75
+}
+
+def add_numeric_columns(df):
+    # Convert age categories to numeric
+    if 'applicantAge' in df.columns:
+        df['applicantAgeNumeric'] = df['applicantAge'].map(AGE_MAPPING).astype('float32')
+    
+    # Convert ownership status to numeric
+    if 'ownRent' in df.columns:
+        df['ownRentNumeric'] = (df['ownRent'] == 'Owner').astype('int8')
+    return df
 
 def main():
     print("Starting Error Bars Visualization Script")
@@ -16,14 +43,14 @@ def main():
     print("Reading Fire.csv file...")
     try:
         # Try reading the full file first
-        df = pd.read_csv('Fire.csv')
+        df = pd.read_csv('Fire.csv', dtype=dtypes_for('Fire.csv', cleaned=True))
         print(f"Successfully read full dataset: {len(df)} rows")
     except:
         print("File too large for direct reading, trying with chunks...")
         try:
             # Read in chunks
             chunks = []
-            for chunk in pd.read_csv('Fire.csv', chunksize=10000):
+            for chunk in pd.read_csv('Fire.csv', chunksize=10000, dtype=dtypes_for('Fire.csv', cleaned=True)):
                 chunks.append(chunk)
                 print(f"Read chunk of {len(chunk)} rows")
                 if len(chunks) * 10000 >= 50000:  # Limit to ~50,000 rows for faster processing
@@ -48,7 +75,7 @@ def main():
                 with open('temp_sample.csv', 'w') as f:
                     f.writelines(lines)
                 
-                df = pd.read_csv('temp_sample.csv')
+                df = pd.read_csv('temp_sample.csv', dtype=dtypes_for('temp_sample.csv', cleaned=True))
                 print(f"Successfully read sample dataset: {len(df)} rows")
             except Exception as e:
                 print(f"Failed to read data: {e}")
@@ -57,20 +84,7 @@ def main():
     # Preprocess data
     print("Preprocessing data...")
     
-    # Convert age categories to numeric
-    age_mapping = {
-        '19-34': 27,
-        '35-49': 42,
-        '50-64': 57,
-        '65+': 75
-    }
-    
-    if 'applicantAge' in df.columns:
-        df['applicantAgeNumeric'] = df['applicantAge'].map(age_mapping)
-    
-    # Convert ownership status to numeric
-    if 'ownRent' in df.columns:
-        df['ownRentNumeric'] = df['ownRent'].apply(lambda x: 1 if x == 'Owner' else 0)
+    df = add_numeric_columns(df)
     
     # Define columns to analyze
     print("Identifying columns for analysis...")
@@ -113,22 +127,34 @@ def main():
     std_errs = []
     rel_errors = []
     labels = []
+    reported_columns = []
+    
+    rollup = load_rollup("disaster", rollup_dir, incident_type='Fire') if rollup_dir else None
+    rollup_summary = amount_summary(rollup) if rollup is not None else pd.DataFrame()
+    if rollup is not None:
+        print(f"Using rollup tables in {rollup_dir} for: {list(rollup_summary.index)}")
     
     for col in valid_columns:
-        # Get values, excluding NaN and null
-        values = df[col].dropna().values
+        if col in rollup_summary.index:
+            # Amounts: count, sum and sum of squares from the rollups
+            count, mean, std_err, rel_error = rollup_summary.loc[col, ['count', 'mean', 'std_err', 'rel_error']]
+        else:
+            # Get values, excluding NaN and null
+            values = df[col].dropna().values
+            count = len(values)
+            if count > 0:
+                mean = np.mean(values)
+                # Standard error of the mean
+                std_err = np.std(values) / np.sqrt(len(values))
+                # Relative error (coefficient of variation)
+                rel_error = np.std(values) / mean if mean != 0 else 0
         
-        if len(values) > 0:
-            mean = np.mean(values)
-            # Standard error of the mean
-            std_err = np.std(values) / np.sqrt(len(values))
-            # Relative error (coefficient of variation)
-            rel_error = np.std(values) / mean if mean != 0 else 0
-            
+        if count > 0:
             means.append(mean)
             std_errs.append(std_err)
             rel_errors.append(rel_error)
             labels.append(column_labels.get(col, col))
+            reported_columns.append(col)
             
             print(f"{column_labels.get(col, col)}:")
             print(f"  Mean: {mean}")
@@ -145,15 +171,30 @@ def main():
     # Calculate confidence interval (95%)
     ci_low = [m - 1.96 * se for m, se in zip(means, std_errs)]
     ci_high = [m + 1.96 * se for m, se in zip(means, std_errs)]
+    ci_name = '95% Confidence Interval'
+    if bootstrap_replicates:
+        # Percentile intervals from Poisson-bootstrap replicates over every row of Fire.csv; the bars
+        # show the same rows' means, since the rollup or a sample of df need not lie inside them
+        print(f"Bootstrapping {bootstrap_replicates} replicates of the means...")
+        boot = bootstrap_file('Fire.csv', reported_columns, prepare=add_numeric_columns,
+                              replicates=bootstrap_replicates, correlations=False)
+        means = list(boot.means['mean'])
+        ci_low = list(boot.means['ci_low'])
+        ci_high = list(boot.means['ci_high'])
+        ci_name = '95% Bootstrap Confidence Interval'
+        for col, low, high in zip(reported_columns, ci_low, ci_high):
+            print(f"  {column_labels.get(col, col)}: [{low:.3f}, {high:.3f}]")
+    # Percentile intervals are not symmetric around the mean and can, rarely, miss it: clip at 0 for errorbar
+    yerr = np.clip([np.array(means) - ci_low, np.array(ci_high) - means], 0, None)
     
     # Create bar plot
     bars = plt.bar(x_pos, means, align='center', alpha=0.7, color='skyblue', capsize=10)
-    plt.errorbar(x_pos, means, yerr=np.array([means - np.array(ci_low), np.array(ci_high) - means]), fmt='none', ecolor='black', capsize=5)
+    plt.errorbar(x_pos, means, yerr=yerr, fmt='none', ecolor='black', capsize=5)
     
     # Add labels
     plt.xlabel('Variables')
     plt.ylabel('Mean Value')
-    plt.title('Mean Values with 95% Confidence Interval Error Bars', fontsize=14)
+    plt.title(f'Mean Values with {ci_name} Error Bars', fontsize=14)
     plt.xticks(x_pos, labels, rotation=45, ha='right')
     plt.tight_layout()
     
@@ -193,8 +234,8 @@ def main():
     # Set up subplots
     plt.subplot(2, 1, 1)
     plt.bar(x_pos, means, align='center', alpha=0.7, color='skyblue', capsize=10)
-    plt.errorbar(x_pos, means, yerr=np.array([means - np.array(ci_low), np.array(ci_high) - means]), fmt='none', ecolor='black', capsize=5)
-    plt.title('Mean Values with 95% Confidence Interval Error Bars', fontsize=14)
+    plt.errorbar(x_pos, means, yerr=yerr, fmt='none', ecolor='black', capsize=5)
+    plt.title(f'Mean Values with {ci_name} Error Bars', fontsize=14)
     plt.xticks(x_pos, labels, rotation=45, ha='right')
     plt.ylabel('Mean Value')
     
@@ -227,7 +268,7 @@ def main():
             plt.axvline(means[i], color='red', linestyle='--', linewidth=2, label=f'Mean: {means[i]:.3f}')
             
             # Add confidence interval
-            plt.axvline(ci_low[i], color='black', linestyle=':', linewidth=1.5, label=f'95% CI: [{ci_low[i]:.3f}, {ci_high[i]:.3f}]')
+            plt.axvline(ci_low[i], color='black', linestyle=':', linewidth=1.5, label=f'{ci_name.replace("Confidence Interval", "CI")}: [{ci_low[i]:.3f}, {ci_high[i]:.3f}]')
             plt.axvline(ci_high[i], color='black', linestyle=':', linewidth=1.5)
             
             # Add labels
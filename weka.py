@@ -0,0 +1,95 @@
+# WEKA serialization for the encoded files.
+# Chunks stay typed (numeric dtypes, nullable Int32 codes, categoricals) with pandas' own null masks;
+# the '?' missing-value token only appears here, when a chunk is rendered as WEKA CSV or ARFF.
+import csv
+import os
+import shutil
+
+import pandas as pd
+
+from chunkio import ChunkWriter
+
+MISSING_TOKEN = '?'
+# Private quote / escape characters for to_csv, stripped from the rendered text: string values are
+# already ARFF-quoted, so the csv module must not add its own quoting around them
+_CSV_QUOTE = '\x02'
+_CSV_ESCAPE = '\x01'
+
+
+def weka_csv_writer(file_path, **kwargs):
+    """ChunkWriter that writes nulls as '?', the way WEKA's CSV loader expects them."""
+    return ChunkWriter(file_path, na_rep=MISSING_TOKEN, **kwargs)
+
+
+def _arff_quote(value):
+    escaped = str(value).replace('\\', '\\\\').replace("'", "\\'").replace('\n', '\\n').replace('\r', '\\r')
+    return "'" + escaped + "'"
+
+
+class ArffWriter:
+    """Stream chunks into an ARFF file.
+
+    Category and boolean columns become nominal attributes whose values are collected across all
+    chunks, so the data section goes to a temporary file and the header is written on close().
+    Other non-numeric columns are declared as string attributes.
+    """
+
+    def __init__(self, file_path, relation):
+        self.file_path = file_path
+        self.relation = relation
+        self.rows_written = 0
+        self.busy_seconds = 0.0  # Writes happen on the caller's thread, so there is no background time
+        self._columns = None
+        self._nominal_values = {}
+        self._data_path = file_path + ".data"
+        self._data = open(self._data_path, "w", newline="")
+
+    def write(self, chunk):
+        if self._columns is None:
+            self._columns = {col: chunk[col].dtype for col in chunk.columns}
+
+        rendered = {}
+        for col in chunk.columns:
+            values = chunk[col]
+            if pd.api.types.is_bool_dtype(values):
+                self._nominal_values.setdefault(col, dict.fromkeys(["False", "True"]))
+            elif not pd.api.types.is_numeric_dtype(values):
+                # Quote each distinct value once through the categories instead of once per row
+                values = values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype('category')
+                labels = values.cat.categories.astype(str)
+                if isinstance(self._columns[col], pd.CategoricalDtype):
+                    self._nominal_values.setdefault(col, {}).update(dict.fromkeys(labels))
+                rendered[col] = values.cat.rename_categories([_arff_quote(label) for label in labels])
+        if rendered:
+            chunk = chunk.assign(**rendered)
+
+        # Nulls are left to na_rep, so '?' is the only missing-value token in the data section
+        text = chunk.to_csv(header=False, index=False, na_rep=MISSING_TOKEN, quoting=csv.QUOTE_MINIMAL,
+                            quotechar=_CSV_QUOTE, escapechar=_CSV_ESCAPE, doublequote=False)
+        self._data.write(text.replace(_CSV_QUOTE, '').replace(_CSV_ESCAPE, ''))
+        self.rows_written += len(chunk)
+
+    def _attribute(self, col, dtype):
+        if col in self._nominal_values:
+            return "{" + ",".join(_arff_quote(value) for value in self._nominal_values[col]) + "}"
+        if pd.api.types.is_numeric_dtype(dtype):
+            return "numeric"
+        return "string"
+
+    def close(self):
+        self._data.close()
+        with open(self.file_path, "w", newline="") as arff:
+            arff.write(f"@relation {_arff_quote(self.relation)}\n\n")
+            for col, dtype in (self._columns or {}).items():
+                arff.write(f"@attribute {_arff_quote(col)} {self._attribute(col, dtype)}\n")
+            arff.write("\n@data\n")
+            with open(self._data_path) as data:
+                shutil.copyfileobj(data, arff)
+        os.remove(self._data_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
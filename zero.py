@@ -5,10 +5,11 @@ from collections import Counter
 from sklearn.dummy import DummyClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
+from schema import dtypes_for
 
 # ✅ STEP 1: Load Dataset
 file_path = "Fire.csv"  # Update with actual dataset path
-df = pd.read_csv(file_path)
+df = pd.read_csv(file_path, dtype=dtypes_for(file_path, cleaned=True))
 
 # ✅ STEP 2: Check Class Distribution
 target_variable = "ihpEligible"  # Replace with your actual target variable
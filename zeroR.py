@@ -6,9 +6,17 @@ from sklearn.tree import DecisionTreeRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error
 import os
+from encodingstore import read_csv_with_codes
+from schema import dtypes_for
+from modelstore import ModelStore
+from tuning import load_best_params
 
-def absolute_accuracy(csv_path, target_column='ihpAmount'):
-    df = pd.read_csv(csv_path).dropna()
+def absolute_accuracy(csv_path, target_column='ihpAmount', model_store=None):
+    # Fitted models are reused while the data, features and hyperparameters are unchanged
+    # (the store, and its model_cache/ directory, is only created when a model is fitted)
+    model_store = model_store or ModelStore()
+    # The encoded columns come from the code arrays of 'python encoding.py' when they are current
+    df = read_csv_with_codes(csv_path, dtype=dtypes_for(csv_path, cleaned=True)).dropna()
     if target_column not in df.columns:
         print(f"Target column '{target_column}' not found.")
         return
@@ -23,15 +31,16 @@ def absolute_accuracy(csv_path, target_column='ihpAmount'):
     mae_zeroR = mean_absolute_error(y_test, y_pred_zeroR)
 
     # Random Tree
-    tree = DecisionTreeRegressor(random_state=42)
-    tree.fit(X_train, y_train)
-    y_pred_tree = tree.predict(X_test)
+    # Hyperparameters found by 'python tuning.py <file>' are used when saved; otherwise the defaults
+    tree_params = load_best_params(csv_path, "Random Tree")
+    tree, y_pred_tree = model_store.fit_predict(DecisionTreeRegressor(random_state=42, **tree_params),
+                                                X_train, y_train, X_test)
     mae_tree = mean_absolute_error(y_test, y_pred_tree)
 
     # Random Forest
-    forest = RandomForestRegressor(n_estimators=100, random_state=42)
-    forest.fit(X_train, y_train)
-    y_pred_forest = forest.predict(X_test)
+    forest_params = {"n_estimators": 100, **load_best_params(csv_path, "Random Forest")}
+    forest, y_pred_forest = model_store.fit_predict(RandomForestRegressor(random_state=42, **forest_params),
+                                                   X_train, y_train, X_test)
     mae_forest = mean_absolute_error(y_test, y_pred_forest)
 
     # Absolute scale: compare to mean of true values
@@ -57,7 +66,7 @@ def absolute_accuracy(csv_path, target_column='ihpAmount'):
         plt.text(bar.get_x() + bar.get_width()/2, yval + 1, f"{yval:.1f}%", ha='center', va='bottom')
 
     # Save the figure as a PDF in the current directory
-    current_directory = os.path.dirname(os.path.abspath(__file__))
+    current_directory = os.getcwd()
     file_path = os.path.join(current_directory, "model_accuracy_comparison.pdf")
     plt.tight_layout()
     plt.savefig(file_path, format="pdf")
@@ -66,4 +75,5 @@ def absolute_accuracy(csv_path, target_column='ihpAmount'):
     plt.show()
 
 # Run the function
-absolute_accuracy("Other.csv")
+if __name__ == "__main__":
+    absolute_accuracy("Other.csv")
@@ -0,0 +1,179 @@
+# Date-clustered CSV output with per-block zone maps.
+# ClusteredWriter takes chunks in any order and writes a CSV sorted by declarationDate: each chunk's
+# rows are spilled to one file per distinct date, and close() concatenates the spill files in date
+# order. Rows sharing a date need no ordering among themselves, so nothing is sorted in memory.
+# The output is cut into blocks of about block_rows rows whose byte range and min/max date go to
+# <name>.zonemap.json; read_range() then reads only the blocks that overlap a date window.
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+DATE_COLUMN = "declarationDate"
+DEFAULT_BLOCK_ROWS = 100000
+
+
+def zone_map_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".zonemap.json"
+
+
+def _date_keys(values):
+    """The text each date is written as, so keys sort and compare like the CSV values ('' for missing)."""
+    keys = values.astype(str)
+    return keys.where(values.notna(), "")
+
+
+class ClusteredWriter:
+    """Write chunks to file_path clustered by date_column, plus a zone map.
+
+    Rows are only spilled while write() is called; the output and zone map are produced on close().
+    Spill files go to a new temporary directory next to file_path (or to spill_dir, emptied first), so
+    files left behind by a crashed run are never appended to.
+    """
+
+    def __init__(self, file_path, date_column=DATE_COLUMN, block_rows=DEFAULT_BLOCK_ROWS, spill_dir=None):
+        self.file_path = file_path
+        self.date_column = date_column
+        self.block_rows = block_rows
+        if spill_dir is None:
+            spill_dir = tempfile.mkdtemp(prefix=os.path.basename(file_path) + ".spill.",
+                                         dir=os.path.dirname(os.path.abspath(file_path)))
+        else:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+            os.makedirs(spill_dir)
+        self.spill_dir = spill_dir
+        self.rows_written = 0
+        self.busy_seconds = 0.0  # Time spent in close() assembling the clustered file
+        self._columns = None
+        self._spill_files = {}  # date key -> spill file path
+        self._segments = {}  # date key -> [(bytes, rows), ...], one entry per write()
+        self._closed = False
+
+    def write(self, chunk):
+        if self._closed:
+            raise ValueError(f"ClusteredWriter for {self.file_path} is already closed")
+        if self._columns is None:
+            self._columns = list(chunk.columns)
+        elif list(chunk.columns) != self._columns:
+            raise ValueError("Every chunk written to a ClusteredWriter must have the same columns")
+
+        keys = _date_keys(chunk[self.date_column])
+        for key, part in chunk.groupby(keys.to_numpy(), sort=False):
+            first_write = key not in self._spill_files
+            if first_write:
+                self._spill_files[key] = os.path.join(self.spill_dir, f"{len(self._spill_files):06d}.csv")
+                self._segments[key] = []
+            data = part.to_csv(header=False, index=False).encode("utf-8")
+            with open(self._spill_files[key], "wb" if first_write else "ab") as spill:
+                spill.write(data)
+            self._segments[key].append((len(data), len(part)))
+        self.rows_written += len(chunk)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        started = time.perf_counter()
+        header = pd.DataFrame(columns=self._columns or []).to_csv(index=False).encode("utf-8")
+
+        blocks = []
+        block = None
+        with open(self.file_path, "wb") as output:
+            output.write(header)
+            for key in sorted(self._spill_files):
+                with open(self._spill_files[key], "rb") as spill:
+                    for n_bytes, n_rows in self._segments[key]:
+                        if block is None:
+                            block = {"offset": output.tell(), "bytes": 0, "rows": 0, "min": key, "max": key}
+                        output.write(spill.read(n_bytes))
+                        block["bytes"] += n_bytes
+                        block["rows"] += n_rows
+                        block["max"] = key
+                        if block["rows"] >= self.block_rows:
+                            blocks.append(block)
+                            block = None
+            if block is not None:
+                blocks.append(block)
+            output.flush()
+            os.fsync(output.fileno())
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+        zone_map = {
+            "date_column": self.date_column,
+            "columns": self._columns or [],
+            "rows": self.rows_written,
+            "blocks": blocks,
+        }
+        with open(zone_map_path(self.file_path), "w") as f:
+            json.dump(zone_map, f, indent=2)
+        self.busy_seconds += time.perf_counter() - started
+        print(f"Clustered {self.rows_written:,} rows by {self.date_column} into {len(blocks)} blocks "
+              f"(zone map: {zone_map_path(self.file_path)})")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def load_zone_map(csv_path):
+    """The zone map written alongside csv_path, or None if the file was not written clustered."""
+    path = zone_map_path(csv_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_blocks(csv_path, start_date=None, end_date=None, year=None, usecols=None, dtype=None, zone_map=None):
+    """Yield the rows with start_date <= date < end_date, reading only the blocks whose min/max overlap the window.
+
+    Dates are compared as text ('2021-01-01' style bounds against the ISO values in the file);
+    the date column is returned as text too.
+    """
+    zone_map = zone_map or load_zone_map(csv_path)
+    if zone_map is None:
+        raise FileNotFoundError(f"No zone map for '{csv_path}'; it was not written by ClusteredWriter")
+    if year is not None:
+        start_date, end_date = f"{int(year)}-01-01", f"{int(year) + 1}-01-01"
+    date_column = zone_map["date_column"]
+    usecols = None if usecols is None else list(dict.fromkeys([date_column] + list(usecols)))
+    dtype = {**(dtype or {}), date_column: str}
+
+    with open(csv_path, "rb") as f:
+        for block in zone_map["blocks"]:
+            if start_date is not None and block["max"] < start_date:
+                continue
+            if end_date is not None and block["min"] >= end_date:
+                break  # Blocks are in date order, so nothing later can match
+            f.seek(block["offset"])
+            data = f.read(block["bytes"])
+            df = pd.read_csv(io.BytesIO(data), header=None, names=zone_map["columns"], usecols=usecols,
+                             dtype=dtype, keep_default_na=False, na_values=[""])
+            dates = df[date_column].fillna("")
+            mask = pd.Series(True, index=df.index)
+            if start_date is not None:
+                mask &= dates >= start_date
+            if end_date is not None:
+                mask &= dates < end_date
+            yield df[mask] if not mask.all() else df
+
+
+def read_range(csv_path, start_date=None, end_date=None, year=None, usecols=None, dtype=None, parse_dates=True):
+    """read_blocks() concatenated into one frame, already in date order."""
+    zone_map = load_zone_map(csv_path)
+    parts = list(read_blocks(csv_path, start_date, end_date, year, usecols, dtype, zone_map=zone_map))
+    if parts:
+        df = pd.concat(parts, ignore_index=True)
+    else:
+        df = pd.DataFrame(columns=usecols if usecols is not None else zone_map["columns"])
+    date_column = zone_map["date_column"]
+    if parse_dates:
+        df[date_column] = pd.to_datetime(df[date_column], utc=True, format="ISO8601", errors="coerce").dt.tz_localize(None)
+    return df